@@ -0,0 +1,104 @@
+"""
+Benchmarks each diff backend and checks that their results are identical.
+
+Usage:
+    python benchmarks/benchmark_diff_backends.py [repo_path ...]
+
+When no repository paths are given, synthetic repositories of several
+sizes are created. Profiles with rename detection are not compared, since
+libgit2 and git score inexact renames differently near the similarity threshold.
+"""
+
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from synthetic_repos import RepoShape, create_synthetic_repo
+from tabulate import tabulate
+
+from almanack.processing.diff_backends import DIFF_BACKENDS, get_diff_backend
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.repo_session import RepoSession
+
+# synthetic repository sizes as (number of files, number of commits)
+SYNTHETIC_SIZES = [(100, 20), (500, 50), (2000, 100)]
+
+
+def benchmark_diff_backends(
+    repo_path: pathlib.Path, diff_profile: str = "default", repeats: int = 3
+) -> list:
+    """
+    Times a first..HEAD diff with each diff backend.
+
+    Args:
+        repo_path (pathlib.Path): The path to the Git repository.
+        diff_profile (str): The name of the diff profile to use.
+        repeats (int): Number of timed runs per backend, reporting the fastest.
+
+    Returns:
+        list: Rows of repository, backend name, profile, seconds and files.
+    """
+    rows = []
+    results = {}
+    # Include sharded parallel diffs across every available core
+    workers = os.cpu_count() or 1
+    backends = {
+        **DIFF_BACKENDS,
+        f"git-cli ({workers} workers)": get_diff_backend("git-cli", workers=workers),
+    }
+    for name, backend in backends.items():
+        timings = []
+        for _ in range(repeats):
+            # Use a new session for each run so that no diffs are cached
+            with RepoSession(repo_path) as session:
+                start = time.perf_counter()
+                results[name] = session.get_diff_stats(
+                    session.get_first_commit(),
+                    session.get_head_commit(),
+                    DiffOptions(diff_profile=diff_profile, backend=backend),
+                )
+                timings.append(time.perf_counter() - start)
+        rows.append(
+            [
+                repo_path.name,
+                name,
+                diff_profile,
+                f"{min(timings):.4f}",
+                len(results[name]),
+            ]
+        )
+
+    # Every backend must produce the same statistics
+    mismatched = [name for name in results if results[name] != results["pygit2"]]
+    if mismatched:
+        raise AssertionError(f"Diff backends {mismatched} differ from pygit2.")
+    return rows
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as temp_dir:
+        repo_paths = (
+            [pathlib.Path(path) for path in sys.argv[1:]]
+            if len(sys.argv) > 1
+            else [
+                create_synthetic_repo(
+                    pathlib.Path(temp_dir) / f"synthetic_{files}x{commits}.git",
+                    RepoShape(number_of_files=files, number_of_commits=commits),
+                )
+                for files, commits in SYNTHETIC_SIZES
+            ]
+        )
+        print(
+            tabulate(
+                [
+                    row
+                    for repo_path in repo_paths
+                    for diff_profile in ["default", "ignore-whitespace"]
+                    for row in benchmark_diff_backends(repo_path, diff_profile)
+                ],
+                headers=["Repository", "Backend", "Profile", "Seconds", "Files"],
+                tablefmt="simple_grid",
+            )
+        )
@@ -0,0 +1,74 @@
+"""
+Benchmarks the cost of each built-in diff options profile.
+
+Usage:
+    python benchmarks/benchmark_diff_profiles.py [repo_path]
+
+When no repository path is given, a synthetic repository is created.
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+from synthetic_repos import create_synthetic_repo
+from tabulate import tabulate
+
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.diff_profiles import DIFF_PROFILES
+from almanack.processing.repo_session import RepoSession
+
+
+def benchmark_diff_profiles(repo_path: pathlib.Path, repeats: int = 3) -> list:
+    """
+    Times a first..HEAD diff with each diff profile.
+
+    Args:
+        repo_path (pathlib.Path): The path to the Git repository.
+        repeats (int): Number of timed runs per profile, reporting the fastest.
+
+    Returns:
+        list: Rows of profile name, seconds, files and changed lines.
+    """
+    rows = []
+    for name, profile in DIFF_PROFILES.items():
+        timings = []
+        for _ in range(repeats):
+            # Use a new session for each run so that no diffs are cached
+            with RepoSession(repo_path) as session:
+                start = time.perf_counter()
+                stats = session.get_diff_stats(
+                    session.get_first_commit(),
+                    session.get_head_commit(),
+                    DiffOptions(diff_profile=profile),
+                )
+                timings.append(time.perf_counter() - start)
+        rows.append(
+            [
+                name,
+                f"{min(timings):.4f}",
+                len(stats),
+                sum(
+                    file_stats["additions"] + file_stats["deletions"]
+                    for file_stats in stats.values()
+                ),
+            ]
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as temp_dir:
+        repo_path = (
+            pathlib.Path(sys.argv[1])
+            if len(sys.argv) > 1
+            else create_synthetic_repo(pathlib.Path(temp_dir) / "synthetic.git")
+        )
+        print(
+            tabulate(
+                benchmark_diff_profiles(repo_path),
+                headers=["Profile", "Seconds", "Files", "Lines Changed"],
+                tablefmt="simple_grid",
+            )
+        )
@@ -0,0 +1,114 @@
+"""
+Creates synthetic Git repositories used by the benchmarks
+"""
+
+import pathlib
+import random
+from typing import NamedTuple, Optional
+
+import pygit2
+
+
+class RepoShape(NamedTuple):
+    """
+    The size of a synthetic repository and of the changes in each commit.
+
+    Attributes:
+        number_of_files (int): Number of files in the first commit.
+        number_of_commits (int): Number of commits to create.
+        changes_per_commit (int): Number of files edited in each commit.
+        renames_per_commit (int): Number of files renamed in each commit.
+    """
+
+    number_of_files: int = 500
+    number_of_commits: int = 50
+    changes_per_commit: int = 20
+    renames_per_commit: int = 2
+
+
+def _write_tree(repo: pygit2.Repository, files: dict[str, bytes]) -> pygit2.Oid:
+    """
+    Writes nested trees for a mapping of file paths to content.
+    """
+    # Group files by their first path component
+    entries: dict[str, dict[str, bytes]] = {}
+    blobs: dict[str, bytes] = {}
+    for path, content in files.items():
+        head, _, tail = path.partition("/")
+        if tail:
+            entries.setdefault(head, {})[tail] = content
+        else:
+            blobs[head] = content
+
+    builder = repo.TreeBuilder()
+    for name, content in blobs.items():
+        builder.insert(name, repo.create_blob(content), pygit2.enums.FileMode.BLOB)
+    for name, subtree_files in entries.items():
+        builder.insert(
+            name, _write_tree(repo, subtree_files), pygit2.enums.FileMode.TREE
+        )
+    return builder.write()
+
+
+def create_synthetic_repo(
+    repo_path: pathlib.Path, shape: Optional[RepoShape] = None, seed: int = 0
+) -> pathlib.Path:
+    """
+    Creates a bare repository whose history edits, adds and renames files
+    across nested directories.
+
+    Args:
+        repo_path (pathlib.Path): Where to create the repository.
+        shape (Optional[RepoShape]): The number of files and commits and the
+            changes in each commit. Defaults to RepoShape().
+        seed (int): Seed for the random number generator.
+
+    Returns:
+        pathlib.Path: Path to the repository.
+    """
+    number_of_files, number_of_commits, changes_per_commit, renames_per_commit = (
+        shape or RepoShape()
+    )
+    rng = random.Random(seed)
+    repo = pygit2.init_repository(str(repo_path), bare=True)
+    signature = pygit2.Signature("Almanack Benchmark", "benchmark@example.com")
+
+    files = {
+        f"pkg_{number % 10}/sub_{number % 3}/module_{number}.py": "".join(
+            f"line_{line} = {rng.random()}\n" for line in range(rng.randint(10, 200))
+        ).encode()
+        for number in range(number_of_files)
+    }
+
+    parents = []
+    for commit_number in range(number_of_commits):
+        if commit_number:
+            paths = sorted(files)
+            # Edit files by rewriting some lines and appending new lines
+            for path in rng.sample(paths, min(changes_per_commit, len(paths))):
+                lines = files[path].decode().splitlines(keepends=True)
+                for _ in range(rng.randint(1, 10)):
+                    lines[rng.randrange(len(lines))] = f"edited = {rng.random()}\n"
+                lines.extend(
+                    f"added = {rng.random()}\n" for _ in range(rng.randint(0, 10))
+                )
+                files[path] = "".join(lines).encode()
+            # Rename files to a new directory with a small edit
+            for path in rng.sample(paths, min(renames_per_commit, len(paths))):
+                content = files.pop(path)
+                files[f"moved_{commit_number}/{pathlib.PurePath(path).name}"] = (
+                    content + b"renamed = True\n"
+                )
+
+        commit_id = repo.create_commit(
+            "refs/heads/main",
+            signature,
+            signature,
+            f"Commit {commit_number}",
+            _write_tree(repo, files),
+            parents,
+        )
+        parents = [commit_id]
+
+    repo.set_head("refs/heads/main")
+    return repo_path
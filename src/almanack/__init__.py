@@ -1,11 +1,23 @@
 # __init__.py for software gardening almanack python package
 
 from .book import read
+from .processing.blame_cache import BlameCache
+from .processing.budget import AnalysisBudget
 from .processing.calculate_entropy import (
+    EntropyProfile,
     calculate_aggregate_entropy,
+    calculate_author_entropy,
     calculate_normalized_entropy,
+    calculate_ownership_entropy,
 )
+from .processing.churn_index import ChurnIndex
+from .processing.churn_matrix import ChurnEntries, ChurnMatrix
 from .processing.compute_data import process_repo_for_analysis
+from .processing.diff_cache import DiffStatsCache
+from .processing.diff_options import DiffOptions
+from .processing.entropy_series import WindowSpec, calculate_entropy_series
+from .processing.metrics import Metric, MetricEngine, register_metric
+from .processing.repo_pool import WorkerOptions, compute_repos_data
 
 # note: version placeholder is updated during build
 # by poetry-dynamic-versioning.
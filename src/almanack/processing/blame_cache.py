@@ -0,0 +1,63 @@
+"""
+This module provides a persistent cache of line ownership from git blame
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from .diff_cache import ObjectCache, _hash_key
+
+
+class BlameCache(ObjectCache):
+    """
+    A persistent cache of the lines of each file owned by each author,
+    as found by git blame, keyed by the file's path and blob OID and the
+    .mailmap which maps authors.
+
+    Blame is the slowest git operation used for metrics, since it walks the
+    history of each file. Commits which leave a file unchanged do not change
+    its blame, so re-runs after new commits, and forks or mirrors which share
+    the file, only blame the files whose content changed. Editing .mailmap
+    changes the authors, so it invalidates every cached result.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the cache database file.
+        max_bytes (Optional[int]): Maximum size of the cache database in bytes.
+            Defaults to no limit.
+
+    Example:
+        >>> with BlameCache("~/.cache/almanack/blame.sqlite") as cache:
+        ...     ownership = calculate_ownership_entropy(
+        ...         "path/to/repo", "HEAD", ["README.md"], blame_cache=cache
+        ...     )
+    """
+
+    _table = "blame"
+
+    def get_ownership(self, keys_parts: List[Tuple]) -> List[Optional[Dict[str, int]]]:
+        """
+        Looks up the line ownership of many files in batches.
+
+        Args:
+            keys_parts (List[Tuple]): The path and blob OID of each file, along
+                with the commit, .mailmap and options which affect the blame.
+
+        Returns:
+            List[Optional[Dict[str, int]]]: The lines owned by each author of each
+            file, or None for files which are not cached.
+        """
+        keys = [_hash_key(("blame", *key_parts)) for key_parts in keys_parts]
+        found = self._get_many(keys)
+        return [found.get(key) for key in keys]
+
+    def put_ownership(self, entries: List[Tuple[Tuple, Dict[str, int]]]) -> None:
+        """
+        Stores the line ownership of many files.
+
+        Args:
+            entries (List[Tuple[Tuple, Dict[str, int]]]): The key parts and the
+                lines owned by each author of each file.
+        """
+        self._put_many(
+            (_hash_key(("blame", *key_parts)), ownership)
+            for key_parts, ownership in entries
+        )
@@ -0,0 +1,212 @@
+"""
+This module bounds the work of analyzing a repository
+"""
+
+import time
+from typing import Iterable, List, Optional, Sequence, TypeVar
+
+import pygit2
+
+T = TypeVar("T")
+
+
+class AnalysisBudget:
+    """
+    Limits on the work of analyzing one repository, so that repositories with
+    very large files, very many files or very long histories return partial
+    results instead of running for hours.
+
+    A budget is checked cooperatively: history walks and the per-file loops
+    of diff backends ask it whether to continue, and the files, blobs and
+    commits beyond a limit are left out of the results. Each limit which was
+    reached is recorded in exceeded, and results computed under an exceeded
+    budget are flagged as partial and are not stored in persistent caches.
+
+    - max_files: Changed files beyond the limit are sampled at an even stride
+      over the paths, so the sample spans the whole tree.
+    - max_blob_bytes: Files whose blobs do not fit in the remaining bytes are
+      skipped. Only blobs whose line counts are computed are charged, so
+      counts reused from a diff cache are free.
+    - max_seconds: Once the time is up, the remaining history and files are
+      skipped.
+    - max_commits: Only the most recent commits are walked, and the analysis
+      covers the changes since the oldest of them.
+
+    The pygit2 backend checks the budget before generating each patch. The
+    git-cli and gitpython backends receive the whole diff from git, so the
+    budget limits their results the same way, and git-cli stops git once the
+    time is up.
+
+    Args:
+        max_files (Optional[int]): Maximum number of changed files diffed.
+        max_blob_bytes (Optional[int]): Maximum bytes of blobs loaded to count lines.
+        max_seconds (Optional[float]): Maximum seconds spent on the analysis.
+        max_commits (Optional[int]): Maximum number of commits walked.
+
+    Example:
+        >>> budget = AnalysisBudget(max_files=10_000, max_seconds=600)
+        >>> data = compute_repo_data("path/to/repo", budget=budget)
+        >>> data["partial"], data["budgets_exceeded"]
+    """
+
+    def __init__(
+        self,
+        max_files: Optional[int] = None,
+        max_blob_bytes: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        max_commits: Optional[int] = None,
+    ) -> None:
+        for name, value in (
+            ("max_files", max_files),
+            ("max_blob_bytes", max_blob_bytes),
+            ("max_seconds", max_seconds),
+            ("max_commits", max_commits),
+        ):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive.")
+        self.max_files = max_files
+        self.max_blob_bytes = max_blob_bytes
+        self.max_seconds = max_seconds
+        self.max_commits = max_commits
+        self.exceeded: List[str] = []
+        self.blob_bytes = 0
+        self._deadline: Optional[float] = None
+        self._cancelled = False
+
+    def __repr__(self) -> str:
+        return (
+            f"AnalysisBudget(max_files={self.max_files!r}, "
+            f"max_blob_bytes={self.max_blob_bytes!r}, "
+            f"max_seconds={self.max_seconds!r}, max_commits={self.max_commits!r})"
+        )
+
+    def start(self) -> "AnalysisBudget":
+        """
+        Starts the budget of a new analysis, resetting its usage and starting
+        its clock. A cancelled budget stays cancelled.
+
+        Returns:
+            AnalysisBudget: The budget itself.
+        """
+        self.exceeded = []
+        self.blob_bytes = 0
+        self._deadline = (
+            None if self.max_seconds is None else time.monotonic() + self.max_seconds
+        )
+        return self
+
+    def cancel(self) -> None:
+        """
+        Asks the running analysis to stop at its next check, which may
+        be called from another thread.
+        """
+        self._cancelled = True
+
+    @property
+    def partial(self) -> bool:
+        """
+        Whether any limit was reached, so results cover only part of the repository.
+        """
+        return bool(self.exceeded)
+
+    def exceed(self, name: str) -> None:
+        """
+        Records that a limit was reached.
+
+        Args:
+            name (str): The name of the limit, such as "max_files".
+        """
+        if name not in self.exceeded:
+            self.exceeded.append(name)
+
+    def remaining_seconds(self) -> Optional[float]:
+        """
+        Returns the seconds left before the deadline, or None without a deadline.
+        """
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    def stop_requested(self) -> bool:
+        """
+        Checks whether the analysis should stop because it was cancelled
+        or its time is up, recording the reason.
+
+        Returns:
+            bool: True if the analysis should stop.
+        """
+        if self._cancelled:
+            self.exceed("cancelled")
+            return True
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            self.exceed("max_seconds")
+            return True
+        return False
+
+    def limits_diffs(self) -> bool:
+        """
+        Checks whether the budget may cut a diff short, so that complete
+        statistics from a cache cannot stand in for the diff: when it limits
+        files or blob bytes, or the analysis should already stop.
+
+        Returns:
+            bool: True if diffs must run within the budget.
+        """
+        return (
+            self.max_files is not None
+            or self.max_blob_bytes is not None
+            or self.stop_requested()
+        )
+
+    def sample(self, items: Sequence[T]) -> Sequence[T]:
+        """
+        Samples changed files down to max_files at an even stride,
+        keeping their order.
+
+        Args:
+            items (Sequence[T]): The changed files.
+
+        Returns:
+            Sequence[T]: The files within the budget.
+        """
+        if self.max_files is None or len(items) <= self.max_files:
+            return items
+        self.exceed("max_files")
+        return [
+            items[index * len(items) // self.max_files]
+            for index in range(self.max_files)
+        ]
+
+    def admit_blobs(
+        self, repo: pygit2.Repository, blob_ids: Iterable[Optional[pygit2.Oid]]
+    ) -> bool:
+        """
+        Charges the blobs of a changed file against max_blob_bytes, reading
+        only their object headers.
+
+        Args:
+            repo (pygit2.Repository): The Git repository.
+            blob_ids (Iterable[Optional[pygit2.Oid]]): The blobs on each side of a
+                changed file. None or zero OIDs mark missing sides of added or
+                deleted files.
+
+        Returns:
+            bool: True if the blobs fit in the remaining bytes and were charged.
+        """
+        if self.max_blob_bytes is None:
+            return True
+        size = 0
+        for blob_id in blob_ids:
+            # Skip missing sides of added or deleted files
+            if blob_id is None or blob_id.raw == bytes(len(blob_id.raw)):
+                continue
+            try:
+                size += repo.odb.read_header(blob_id)[1]
+            except KeyError:
+                # Objects outside the repository (for example, submodule commits)
+                continue
+        if self.blob_bytes + size > self.max_blob_bytes:
+            self.exceed("max_blob_bytes")
+            return False
+        self.blob_bytes += size
+        return True
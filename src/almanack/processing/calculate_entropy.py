@@ -2,29 +2,344 @@
 This module calculates the amount of Software information entropy
 """
 
-import math
+import functools
 import pathlib
-from typing import List
+from typing import Dict, List, Optional, Tuple, Union
 
-from .git_operations import get_loc_changed
+import numpy as np
+
+from .blame_cache import BlameCache
+from .git_operations import get_diff_stats, get_line_ownership, get_loc_changed
+from .repo_session import RepoSession
+
+
+def pack_loc_changes(
+    repos_loc_changes: List[Dict[str, int]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs the lines changed for each file of many repositories into a ragged
+    representation: one flat array of change counts, and offsets where the
+    files of repository i are changes[offsets[i]:offsets[i + 1]].
+
+    Args:
+        repos_loc_changes (List[Dict[str, int]]): Lines changed for each file,
+            for each repository.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The flat change counts and the offsets,
+        which have one more element than there are repositories.
+    """
+    counts = np.fromiter(
+        (len(loc_changes) for loc_changes in repos_loc_changes),
+        dtype=np.int64,
+        count=len(repos_loc_changes),
+    )
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    changes = np.fromiter(
+        (
+            changed
+            for loc_changes in repos_loc_changes
+            for changed in loc_changes.values()
+        ),
+        dtype=np.int64,
+        count=int(offsets[-1]),
+    )
+    return changes, offsets
+
+
+def calculate_batch_entropy(
+    changes: np.ndarray,
+    offsets: np.ndarray,
+    number_of_files: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the normalized entropy of each file and the aggregate entropy
+    of each repository for many repositories at once, using array operations
+    over a ragged representation of their change counts.
+
+    Args:
+        changes (np.ndarray): Lines changed for each file of every repository,
+            concatenated in repository order.
+        offsets (np.ndarray): Start of each repository's files within changes,
+            followed by the total number of files (see pack_loc_changes).
+        number_of_files (Optional[np.ndarray]): Number of files to normalize each
+            repository's aggregate entropy by. Defaults to the number of files
+            with change counts.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The entropy of each file, aligned with
+        changes, and the aggregate entropy of each repository.
+    """
+    changes = np.asarray(changes)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if (
+        offsets.ndim != 1
+        or len(offsets) == 0
+        or offsets[0] != 0
+        or offsets[-1] != len(changes)
+        or np.any(np.diff(offsets) < 0)
+    ):
+        raise ValueError(
+            "Offsets must start at 0, never decrease and end at the number of changes."
+        )
+    counts = np.diff(offsets)
+
+    # Total changes per repository from a cumulative sum, which is exact for integers
+    cumulative = np.zeros(len(changes) + 1, dtype=np.result_type(changes, np.int64))
+    np.cumsum(changes, out=cumulative[1:])
+    totals = cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+    # Repository of each file, used to broadcast totals and gather sums
+    repo_index = np.repeat(np.arange(len(counts)), counts)
+    file_totals = totals[repo_index]
+
+    # Files without changes, or in repositories without changes, have zero entropy
+    valid = (changes != 0) & (file_totals != 0)
+    probabilities = changes[valid] / file_totals[valid]
+    entropy = np.zeros(len(changes), dtype=np.float64)
+    entropy[valid] = -(probabilities * np.log2(probabilities))
+
+    # bincount adds each repository's file entropies in order
+    total_entropy = np.bincount(repo_index, weights=entropy, minlength=len(counts))
+    number_of_files = counts if number_of_files is None else np.asarray(number_of_files)
+    aggregate_entropy = np.divide(
+        total_entropy,
+        number_of_files,
+        out=np.zeros(len(counts), dtype=np.float64),
+        where=number_of_files > 0,
+    )
+    return entropy, aggregate_entropy
+
+
+def calculate_entropy_arrays(
+    changes: np.ndarray, number_of_files: Optional[int] = None
+) -> Tuple[np.ndarray, float]:
+    """
+    Calculates the normalized entropy of each file and the aggregate entropy
+    of a single repository from an array of per-file change counts.
+
+    Args:
+        changes (np.ndarray): Lines changed for each file.
+        number_of_files (Optional[int]): Number of files to normalize the aggregate
+            entropy by. Defaults to the number of change counts.
+
+    Returns:
+        Tuple[np.ndarray, float]: The entropy of each file and the aggregate entropy.
+    """
+    changes = np.asarray(changes)
+    entropy, aggregate_entropy = calculate_batch_entropy(
+        changes,
+        np.array([0, len(changes)]),
+        None if number_of_files is None else np.array([number_of_files]),
+    )
+    return entropy, float(aggregate_entropy[0])
+
+
+class EntropyProfile:
+    """
+    The entropy of the changes between two commits, computed once from the
+    lines changed in each file. The per-file entropies are calculated on first
+    use and every other statistic is derived lazily from them, so the aggregate,
+    totals, top files and distribution always describe the same changes.
+
+    Args:
+        loc_changes (Dict[str, int]): Lines changed (added and deleted) in each file.
+        number_of_files (Optional[int]): Number of files to normalize the aggregate
+            entropy by. Defaults to the number of files in loc_changes.
+
+    Example:
+        >>> profile = EntropyProfile.from_commits("path/to/repo", "HEAD~10", "HEAD")
+        >>> profile.aggregate_entropy, profile.top_files(5)
+    """
+
+    def __init__(
+        self, loc_changes: Dict[str, int], number_of_files: Optional[int] = None
+    ) -> None:
+        self.file_names = list(loc_changes)
+        self.loc_changes = np.fromiter(
+            loc_changes.values(), dtype=np.int64, count=len(loc_changes)
+        )
+        self.number_of_files = (
+            len(self.file_names) if number_of_files is None else number_of_files
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"EntropyProfile(files={len(self.file_names)}, "
+            f"aggregate_entropy={self.aggregate_entropy:.4f})"
+        )
+
+    @classmethod
+    def from_diff_stats(
+        cls,
+        diff_stats: Dict[str, Dict[str, int]],
+        number_of_files: Optional[int] = None,
+    ) -> "EntropyProfile":
+        """
+        Creates a profile from the added and deleted lines of each file.
+
+        Args:
+            diff_stats (Dict[str, Dict[str, int]]): The "additions" and "deletions"
+                of each file, as returned by get_diff_stats.
+            number_of_files (Optional[int]): Number of files to normalize the
+                aggregate entropy by.
+
+        Returns:
+            EntropyProfile: The entropy profile of the changes.
+        """
+        return cls(
+            {
+                file_name: file_stats["additions"] + file_stats["deletions"]
+                for file_name, file_stats in diff_stats.items()
+            },
+            number_of_files,
+        )
+
+    @classmethod
+    def from_commits(
+        cls,
+        repo_path: Union[pathlib.Path, RepoSession],
+        source_commit: str,
+        target_commit: str,
+        file_names: Optional[List[str]] = None,
+    ) -> "EntropyProfile":
+        """
+        Creates a profile by diffing two commits once.
+
+        Args:
+            repo_path (Union[pathlib.Path, RepoSession]): The file path to the git
+                repository or a session for it.
+            source_commit (str): The git hash of the source commit.
+            target_commit (str): The git hash of the target commit.
+            file_names (Optional[List[str]]): The files to calculate entropy for,
+                which also normalize the aggregate entropy. Defaults to every
+                file edited between the commits.
+
+        Returns:
+            EntropyProfile: The entropy profile of the changes.
+        """
+        if file_names is None:
+            return cls.from_diff_stats(
+                get_diff_stats(repo_path, source_commit, target_commit)
+            )
+        return cls(
+            get_loc_changed(repo_path, source_commit, target_commit, file_names),
+            number_of_files=len(file_names),
+        )
+
+    @functools.cached_property
+    def _entropy(self) -> Tuple[np.ndarray, float]:
+        """
+        The per-file entropies and the aggregate entropy from one kernel call.
+        """
+        return calculate_entropy_arrays(self.loc_changes, self.number_of_files)
+
+    @property
+    def file_entropy(self) -> np.ndarray:
+        """
+        The normalized entropy of each file, aligned with file_names.
+        """
+        return self._entropy[0]
+
+    @functools.cached_property
+    def file_level_entropy(self) -> Dict[str, float]:
+        """
+        The normalized entropy of each file keyed by file name.
+        """
+        return dict(zip(self.file_names, self.file_entropy.tolist()))
+
+    @property
+    def aggregate_entropy(self) -> float:
+        """
+        The sum of the file entropies normalized by the number of files.
+        """
+        return self._entropy[1]
+
+    @property
+    def total_entropy(self) -> float:
+        """
+        The Shannon entropy of the distribution of changes among the files.
+        """
+        return float(self.file_entropy.sum())
+
+    @property
+    def total_lines_changed(self) -> int:
+        """
+        The lines changed (added and deleted) across all files.
+        """
+        return int(self.loc_changes.sum())
+
+    def top_files(self, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Returns the files with the highest entropy, using a partial sort.
+
+        Args:
+            k (int): Number of files to return.
+
+        Returns:
+            List[Tuple[str, float]]: File names and entropies in descending order
+            of entropy, with ties in file order.
+        """
+        k = min(max(k, 0), len(self.file_names))
+        if not k:
+            return []
+        entropy = self.file_entropy
+        # Find the k-th largest entropy without sorting every file, then order
+        # the files at or above it, which include every tie at the boundary
+        threshold = np.partition(entropy, len(entropy) - k)[len(entropy) - k]
+        candidates = np.flatnonzero(entropy >= threshold)
+        candidates = candidates[np.lexsort((candidates, -entropy[candidates]))][:k]
+        return [(self.file_names[index], float(entropy[index])) for index in candidates]
+
+    @functools.cached_property
+    def distribution(self) -> Dict[str, float]:
+        """
+        Summary statistics of the per-file entropies.
+
+        Returns:
+            Dict[str, float]: The "min", "max", "mean", "std", "median",
+            "p90" and "p99" of the file entropies, or zeros without files.
+        """
+        entropy = self.file_entropy
+        if not len(entropy):
+            return dict.fromkeys(
+                ["min", "max", "mean", "std", "median", "p90", "p99"], 0.0
+            )
+        median, p90, p99 = np.percentile(entropy, [50, 90, 99]).tolist()
+        return {
+            "min": float(entropy.min()),
+            "max": float(entropy.max()),
+            "mean": float(entropy.mean()),
+            "std": float(entropy.std()),
+            "median": median,
+            "p90": p90,
+            "p99": p99,
+        }
 
 
 def calculate_normalized_entropy(
-    repo_path: pathlib.Path,
+    repo_path: Union[pathlib.Path, RepoSession],
     source_commit: str,
     target_commit: str,
     file_names: list[str],
+    loc_changes: Optional[Dict[str, int]] = None,
 ) -> dict[str, float]:
     """
     Calculates the entropy of changes in specified files between two commits,
     inspired by Shannon's entropy formula. Normalized relative to the total lines
-    of code changes across specified files.
+    of code changes across specified files. This is a view of
+    EntropyProfile.file_level_entropy.
 
     Args:
-        repo_path (str): The file path to the git repository.
+        repo_path (Union[pathlib.Path, RepoSession]): The file path to the git repository
+            or a session for it.
         source_commit (str): The git hash of the source commit.
         target_commit (str): The git hash of the target commit.
         file_names (list[str]): List of file names to calculate entropy for.
+        loc_changes (Optional[Dict[str, int]]): Precomputed lines changed for each
+            file (for example, derived from get_diff_stats). When provided, the
+            repository is not diffed again.
 
     Returns:
         dict[str, float]: A dictionary mapping file names to their calculated entropy.
@@ -36,59 +351,119 @@ def calculate_normalized_entropy(
         changes, helping identify potentially unstable code areas.
 
     """
-    loc_changes = get_loc_changed(repo_path, source_commit, target_commit, file_names)
-    # Calculate total lines of code changes across all specified files
-    total_changes = sum(loc_changes.values())
-
-    # Calculate the entropy for each file, relative to total changes
-    entropy_calculation = {
-        file_name: (
-            -(
-                (loc_changes[file_name] / total_changes)
-                * math.log2(
-                    loc_changes[file_name] / total_changes
-                )  # Entropy Calculation
-            )
-            if loc_changes[file_name] != 0
-            and total_changes
-            != 0  # Avoid division by zero and ensure valid entropy calculation
-            else 0.0
-        )
-        for file_name in loc_changes  # Iterate over each file in loc_changes dictionary
-    }
-    return entropy_calculation
+    if loc_changes is None:
+        return EntropyProfile.from_commits(
+            repo_path, source_commit, target_commit, file_names
+        ).file_level_entropy
+    return EntropyProfile(loc_changes).file_level_entropy
 
 
 def calculate_aggregate_entropy(
-    repo_path: pathlib.Path,
+    repo_path: Union[pathlib.Path, RepoSession],
     source_commit: str,
     target_commit: str,
     file_names: List[str],
+    loc_changes: Optional[Dict[str, int]] = None,
 ) -> float:
     """
     Computes the aggregated normalized entropy score from the output of
-    calculate_normalized_entropy for specified a Git repository
+    calculate_normalized_entropy for specified a Git repository. This is a view
+    of EntropyProfile.aggregate_entropy; use an EntropyProfile directly to get
+    both without diffing twice.
 
     Args:
-        repo_path (str): The file path to the git repository.
+        repo_path (Union[pathlib.Path, RepoSession]): The file path to the git repository
+            or a session for it.
         source_commit (str): The git hash of the source commit.
         target_commit (str): The git hash of the target commit.
         file_names (list[str]): List of file names to calculate entropy for.
+        loc_changes (Optional[Dict[str, int]]): Precomputed lines changed for each
+            file. When provided, the repository is not diffed again.
 
     Returns:
         float: Normalized entropy calculation.
     """
-    # Get the entropy for each file
-    entropy_calculation = calculate_normalized_entropy(
-        repo_path, source_commit, target_commit, file_names
-    )
-
-    # Calculate total entropy of the repository
-    total_entropy = sum(entropy_calculation.values())
+    if loc_changes is None:
+        return EntropyProfile.from_commits(
+            repo_path, source_commit, target_commit, file_names
+        ).aggregate_entropy
 
     # Normalize total entropy by the number of files edited between the two commits
-    num_files = len(file_names)
-    normalized_total_entropy = (
-        total_entropy / num_files if num_files > 0 else 0.0
-    )  # Avoid division by zero (e.g., num_files = 0) and ensure valid entropy calculation
-    return normalized_total_entropy
+    return EntropyProfile(loc_changes, len(file_names)).aggregate_entropy
+
+
+def _ownership_entropy(owned_lines: List[int]) -> float:
+    """
+    Calculates the entropy of the lines owned by each author, normalized by
+    the maximum entropy for the number of authors to the range [0, 1].
+    """
+    lines = np.asarray(owned_lines, dtype=np.int64)
+    lines = lines[lines > 0]
+    if len(lines) <= 1:
+        # A single author owns every line
+        return 0.0
+    probabilities = lines / lines.sum()
+    return float(-(probabilities * np.log2(probabilities)).sum() / np.log2(len(lines)))
+
+
+def calculate_ownership_entropy(
+    repo_path: Union[pathlib.Path, RepoSession],
+    target_commit: str,
+    file_names: List[str],
+    blame_cache: Optional[BlameCache] = None,
+) -> Dict[str, float]:
+    """
+    Calculates the entropy of the ownership of the lines in specified files
+    among their authors at a commit, as found by git blame.
+
+    Args:
+        repo_path (Union[pathlib.Path, RepoSession]): The file path to the git repository
+            or a session for it.
+        target_commit (str): The git hash of the commit to blame the files at.
+        file_names (List[str]): List of file names to calculate ownership entropy for.
+        blame_cache (Optional[BlameCache]): A persistent cache of blame results, so that
+            only files whose blobs changed since a previous run are blamed again.
+
+    Returns:
+        Dict[str, float]: A dictionary mapping file names to their ownership entropy.
+
+    Application of Ownership Entropy:
+        Ownership entropy is 0 when one author wrote every line of a file and 1
+        when every author wrote an equal share. High values point to files with
+        diffuse ownership, which are changed by many hands without a clear owner.
+    """
+    return {
+        file_name: _ownership_entropy(list(owners.values()))
+        for file_name, owners in get_line_ownership(
+            repo_path, target_commit, file_names, blame_cache
+        ).items()
+    }
+
+
+def calculate_author_entropy(
+    repo_path: Union[pathlib.Path, RepoSession],
+    target_commit: str,
+    file_names: List[str],
+    blame_cache: Optional[BlameCache] = None,
+) -> float:
+    """
+    Calculates the entropy of the ownership of all lines in specified files
+    among their authors at a commit, normalized to the range [0, 1].
+
+    Args:
+        repo_path (Union[pathlib.Path, RepoSession]): The file path to the git repository
+            or a session for it.
+        target_commit (str): The git hash of the commit to blame the files at.
+        file_names (List[str]): List of file names to calculate author entropy for.
+        blame_cache (Optional[BlameCache]): A persistent cache of blame results.
+
+    Returns:
+        float: Normalized author entropy.
+    """
+    author_lines: Dict[str, int] = {}
+    for owners in get_line_ownership(
+        repo_path, target_commit, file_names, blame_cache
+    ).values():
+        for author, lines in owners.items():
+            author_lines[author] = author_lines.get(author, 0) + lines
+    return _ownership_entropy(list(author_lines.values()))
@@ -0,0 +1,314 @@
+"""
+This module provides a persistent index of the churn of each commit
+"""
+
+import itertools
+import pathlib
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import pygit2
+
+from .calculate_entropy import EntropyProfile
+from .diff_options import DiffOptions, get_diff_options
+from .repo_session import RepoSession, open_session
+
+# number of commits indexed in each transaction, so that an interrupted
+# update keeps most of its work
+_COMMITS_PER_TRANSACTION = 500
+
+
+class ChurnIndex:
+    """
+    A persistent index of the lines added and deleted in each file by each
+    commit of a repository's first-parent history, keyed by commit OID.
+
+    Updating the index walks back from HEAD only until it reaches an indexed
+    commit, and diffs just the new commits against their first parents, so
+    refreshing a tracked repository costs as much as its new commits. When
+    history was rewritten, commits which are no longer on the first-parent
+    history are dropped and the new ones indexed in their place.
+
+    Cumulative churn, commit counts and windowed entropy are then answered
+    from the index without diffing. As in iter_commit_churn, merge commits
+    count the changes against their first parent and root commits are the
+    baseline of the history, so they have no churn.
+
+    An index holds the churn computed with one set of diff options, which
+    are recorded on the first update.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the index database file
+            of one repository.
+
+    Example:
+        >>> with ChurnIndex("~/.cache/almanack/repo.churn.sqlite") as index:
+        ...     index.update("path/to/repo")
+        ...     profile = index.entropy_profile()
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self.path = pathlib.Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            # Commits are numbered by their position in the first-parent
+            # history, starting from 0 at the root commit
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS commits (
+                    position INTEGER PRIMARY KEY,
+                    oid TEXT NOT NULL UNIQUE,
+                    commit_time INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS churn (
+                    position INTEGER NOT NULL,
+                    file TEXT NOT NULL,
+                    additions INTEGER NOT NULL,
+                    deletions INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS churn_position ON churn (position);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """
+            )
+
+    def __repr__(self) -> str:
+        return f"ChurnIndex({str(self.path)!r})"
+
+    def __enter__(self) -> "ChurnIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the index database.
+        """
+        self._connection.close()
+
+    def _check_options(self, options: str) -> None:
+        """
+        Records the diff options of the index, or checks that they match
+        the options of earlier updates.
+        """
+        row = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'options'"
+        ).fetchone()
+        if row is None:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT INTO meta (key, value) VALUES ('options', ?)", (options,)
+                )
+        elif row[0] != options:
+            raise ValueError(
+                f"The churn index {str(self.path)!r} was built with other diff "
+                "options. Use a separate index for each set of options."
+            )
+
+    def _new_commits(self, session: RepoSession) -> Tuple[int, List[pygit2.Oid]]:
+        """
+        Walks the first-parent history back from HEAD until an indexed commit,
+        returning the position of that commit (-1 when none was reached) and
+        the OIDs of the commits after it, oldest first.
+        """
+        walker = session.repo.walk(
+            session.get_head_commit().id, pygit2.enums.SortMode.TOPOLOGICAL
+        )
+        walker.simplify_first_parent()
+        new_commits = []
+        for commit in walker:
+            row = self._connection.execute(
+                "SELECT position FROM commits WHERE oid = ?", (str(commit.id),)
+            ).fetchone()
+            if row is not None:
+                return row[0], new_commits[::-1]
+            new_commits.append(commit.id)
+        return -1, new_commits[::-1]
+
+    def update(
+        self,
+        repo: Union[str, pathlib.Path, pygit2.Repository, RepoSession],
+        diff_options: Optional[DiffOptions] = None,
+    ) -> int:
+        """
+        Indexes the commits of the first-parent history which are not indexed yet.
+
+        Args:
+            repo (Union[str, pathlib.Path, pygit2.Repository, RepoSession]): The
+                repository, which must be the one the index was built from.
+            diff_options (Optional[DiffOptions]): The diff filter, profile and
+                backend applied to each diff.
+
+        Returns:
+            int: The number of commits indexed.
+
+        Raises:
+            ValueError: If the index was built with other diff options.
+        """
+        diff_options = get_diff_options(diff_options)
+        diff_filter = diff_options.diff_filter
+        self._check_options(
+            repr(
+                (
+                    None if diff_filter is None else diff_filter.key,
+                    diff_options.get_profile().key,
+                    diff_options.get_backend().name,
+                )
+            )
+        )
+
+        session = open_session(repo, diff_options.cache)
+        try:
+            base_position, new_commits = self._new_commits(session)
+            with self._connection:
+                # Drop commits which are no longer on the first-parent history
+                for table in ("churn", "commits"):
+                    self._connection.execute(
+                        f"DELETE FROM {table} WHERE position > ?",  # nosec B608
+                        (base_position,),
+                    )
+
+            for start in range(0, len(new_commits), _COMMITS_PER_TRANSACTION):
+                with self._connection:
+                    for offset, oid in enumerate(
+                        new_commits[start : start + _COMMITS_PER_TRANSACTION],
+                        start=base_position + 1 + start,
+                    ):
+                        self._index_commit(
+                            session, offset, session.repo[oid], diff_options
+                        )
+            return len(new_commits)
+        finally:
+            # Close sessions opened here, leaving sessions passed in open
+            if session is not repo:
+                session.close()
+
+    def _index_commit(
+        self,
+        session: RepoSession,
+        position: int,
+        commit: pygit2.Commit,
+        diff_options: DiffOptions,
+    ) -> None:
+        """
+        Diffs a commit against its first parent and stores its churn.
+        """
+        self._connection.execute(
+            "INSERT INTO commits (position, oid, commit_time) VALUES (?, ?, ?)",
+            (position, str(commit.id), commit.commit_time),
+        )
+        if not commit.parents:
+            return
+        # A short-lived session per commit pair keeps cached diffs from
+        # accumulating over long histories, while sharing the persistent cache
+        with RepoSession(
+            session.repo, session.diff_cache, session.profiler
+        ) as pair_session:
+            diff_stats = pair_session.get_diff_stats(
+                commit.parents[0], commit, diff_options
+            )
+        self._connection.executemany(
+            "INSERT INTO churn (position, file, additions, deletions) VALUES (?, ?, ?, ?)",
+            (
+                (position, file_name, file_stats["additions"], file_stats["deletions"])
+                for file_name, file_stats in diff_stats.items()
+            ),
+        )
+
+    @property
+    def head(self) -> Optional[str]:
+        """
+        The OID of the most recent indexed commit, or None for an empty index.
+        """
+        row = self._connection.execute(
+            "SELECT oid FROM commits ORDER BY position DESC LIMIT 1"
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def count_commits(self) -> int:
+        """
+        Returns the number of indexed commits of the first-parent history.
+        """
+        return self._connection.execute("SELECT COUNT(*) FROM commits").fetchone()[0]
+
+    def loc_changes(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Sums the lines changed (added and deleted) in each file over a range of
+        the first-parent history.
+
+        Args:
+            start (Optional[int]): Position of the first commit, where the root
+                commit has position 0. Defaults to the root commit.
+            end (Optional[int]): Position after the last commit. Defaults to
+                after the most recent commit.
+
+        Returns:
+            Dict[str, int]: The lines changed in each file, ordered by file name.
+        """
+        # Without an end, the range runs past the most recent commit
+        rows = self._connection.execute(
+            """
+            SELECT file, SUM(additions + deletions) FROM churn
+            WHERE position >= ? AND (? IS NULL OR position < ?)
+            GROUP BY file ORDER BY file
+            """,
+            (0 if start is None else start, end, end),
+        )
+        return dict(rows)
+
+    def entropy_profile(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> EntropyProfile:
+        """
+        Returns the entropy of the cumulative churn over a range of the
+        first-parent history.
+
+        Args:
+            start (Optional[int]): Position of the first commit. Defaults to the root commit.
+            end (Optional[int]): Position after the last commit. Defaults to
+                after the most recent commit.
+
+        Returns:
+            EntropyProfile: The entropy of the lines changed in each file.
+        """
+        return EntropyProfile(self.loc_changes(start, end))
+
+    def iter_commit_churn(
+        self, repo: pygit2.Repository
+    ) -> Iterator[Tuple[pygit2.Commit, Dict[str, int]]]:
+        """
+        Yields the churn of each indexed commit from the index, like
+        iter_commit_churn does by diffing.
+
+        Args:
+            repo (pygit2.Repository): The repository the index was built from,
+                which holds the commits.
+
+        Yields:
+            Tuple[pygit2.Commit, Dict[str, int]]: Each commit, oldest first, with the
+            lines changed (added and removed) in each file it edited.
+        """
+        # Files keep the order the diff reported them in
+        rows = self._connection.execute(
+            """
+            SELECT commits.position, commits.oid, churn.file,
+                churn.additions + churn.deletions
+            FROM commits LEFT JOIN churn ON churn.position = commits.position
+            ORDER BY commits.position, churn.rowid
+            """
+        )
+        for (_, oid), commit_rows in itertools.groupby(
+            rows, key=lambda row: (row[0], row[1])
+        ):
+            yield repo[pygit2.Oid(hex=oid)], {
+                file_name: changed
+                for _, _, file_name, changed in commit_rows
+                if file_name is not None
+            }
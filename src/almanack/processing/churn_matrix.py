@@ -0,0 +1,493 @@
+"""
+This module provides a sparse matrix of the churn of each file in each commit
+"""
+
+import array
+import json
+import pathlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pygit2
+
+from .calculate_entropy import EntropyProfile, calculate_batch_entropy
+from .diff_options import DiffOptions, get_diff_options
+from .entropy_series import iter_commit_diff_stats
+from .repo_session import RepoSession, open_session
+
+# first bytes of a saved churn matrix, which include the format version
+MAGIC = b"ALMCHRN1"
+
+# arrays are aligned within saved files so that memory-mapped views are aligned
+_ALIGNMENT = 64
+
+# little-endian types of the arrays of a saved churn matrix
+_DTYPES = {
+    "indptr": "<i8",
+    "indices": "<i4",
+    "additions": "<i4",
+    "deletions": "<i4",
+    "commit_times": "<i8",
+    "commits_data": "u1",
+    "commits_offsets": "<i8",
+    "paths_data": "u1",
+    "paths_offsets": "<i8",
+}
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs strings into their concatenated UTF-8 bytes and the offsets
+    where string i is data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """
+    Unpacks strings packed by _pack_strings.
+    """
+    raw = data.tobytes()
+    # itertools.pairwise would need Python 3.10
+    starts, ends = offsets[:-1].tolist(), offsets[1:].tolist()
+    return [raw[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+
+
+class ChurnEntries(NamedTuple):
+    """
+    The entries of a churn matrix in compressed sparse row (CSR) form.
+
+    Attributes:
+        indptr (np.ndarray): Where each row's entries start, followed by the
+            number of entries.
+        indices (np.ndarray): The column of each entry.
+        additions (np.ndarray): The lines added by each entry.
+        deletions (np.ndarray): The lines deleted by each entry.
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    additions: np.ndarray
+    deletions: np.ndarray
+
+
+class ChurnMatrix:
+    """
+    A sparse commit by file matrix of the lines added and deleted in each file
+    by each commit of the first-parent history, oldest commit first.
+
+    The matrix is stored in compressed sparse row (CSR) form: the files changed
+    by commit i are indices[indptr[i]:indptr[i + 1]], with their line counts at
+    the same positions of additions and deletions. Commits and file paths are
+    interned in tables, so every path is stored once and files are referred to
+    by their column number.
+
+    The matrix is built in a single pass over the history and can be saved to
+    a compact binary file, which is memory-mapped when loaded, so analyses
+    such as co-change coupling, hotspots and entropy variants share one walk
+    of the repository. Entropy statistics are computed from the matrix with
+    vectorized reductions.
+
+    Args:
+        commits (List[str]): The OID of each row's commit.
+        commit_times (np.ndarray): The commit time of each row as a Unix timestamp.
+        paths (List[str]): The path of each column's file.
+        entries (ChurnEntries): The CSR arrays of the entries.
+
+    Example:
+        >>> matrix = ChurnMatrix.from_repo("path/to/repo")
+        >>> matrix.save("repo.churn")
+        >>> matrix = ChurnMatrix.load("repo.churn")
+        >>> hotspots = np.argsort(matrix.file_churn())[::-1][:10]
+    """
+
+    def __init__(
+        self,
+        commits: List[str],
+        commit_times: np.ndarray,
+        paths: List[str],
+        entries: ChurnEntries,
+    ) -> None:
+        indptr, indices, additions, deletions = entries
+        if len(indptr) != len(commits) + 1 or len(commit_times) != len(commits):
+            raise ValueError("indptr and commit_times must have a row per commit.")
+        if not len(indices) == len(additions) == len(deletions) == indptr[-1]:
+            raise ValueError("indices, additions and deletions must align with indptr.")
+        self.commits = commits
+        self.commit_times = commit_times
+        self.paths = paths
+        self.indptr = indptr
+        self.indices = indices
+        self.additions = additions
+        self.deletions = deletions
+        self._path_index: Optional[Dict[str, int]] = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ChurnMatrix(commits={len(self.commits)}, files={len(self.paths)}, "
+            f"entries={len(self.indices)})"
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """
+        The number of commits (rows) and files (columns).
+        """
+        return len(self.commits), len(self.paths)
+
+    @property
+    def churn(self) -> np.ndarray:
+        """
+        The lines changed (added and deleted) by each entry.
+        """
+        return self.additions.astype(np.int64) + self.deletions
+
+    def path_index(self, path: str) -> int:
+        """
+        Returns the column of a file.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            int: The column of the file.
+
+        Raises:
+            KeyError: If the file never changed.
+        """
+        if self._path_index is None:
+            self._path_index = {path: column for column, path in enumerate(self.paths)}
+        return self._path_index[path]
+
+    @classmethod
+    def from_commit_stats(
+        cls,
+        commit_stats: Iterable[Tuple[pygit2.Commit, Dict[str, Dict[str, int]]]],
+    ) -> "ChurnMatrix":
+        """
+        Builds a matrix from the per-file diff statistics of each commit,
+        as yielded by iter_commit_diff_stats.
+
+        Args:
+            commit_stats (Iterable[Tuple[pygit2.Commit, Dict[str, Dict[str, int]]]]):
+                Each commit with the "additions" and "deletions" of each file.
+
+        Returns:
+            ChurnMatrix: The churn matrix.
+        """
+        commits: List[str] = []
+        path_index: Dict[str, int] = {}
+        # Typed arrays grow without a Python object per entry
+        commit_times = array.array("q")
+        indptr = array.array("q", [0])
+        indices = array.array("i")
+        additions = array.array("i")
+        deletions = array.array("i")
+
+        for commit, diff_stats in commit_stats:
+            commits.append(str(commit.id))
+            commit_times.append(commit.commit_time)
+            for file_name, file_stats in diff_stats.items():
+                indices.append(path_index.setdefault(file_name, len(path_index)))
+                additions.append(file_stats["additions"])
+                deletions.append(file_stats["deletions"])
+            indptr.append(len(indices))
+
+        matrix = cls(
+            commits,
+            np.frombuffer(commit_times, dtype=np.int64),
+            list(path_index),
+            ChurnEntries(
+                np.frombuffer(indptr, dtype=np.int64),
+                np.frombuffer(indices, dtype=np.int32),
+                np.frombuffer(additions, dtype=np.int32),
+                np.frombuffer(deletions, dtype=np.int32),
+            ),
+        )
+        matrix._path_index = path_index
+        return matrix
+
+    @classmethod
+    def from_repo(
+        cls,
+        repo: Union[str, pathlib.Path, pygit2.Repository, RepoSession],
+        diff_options: Optional[DiffOptions] = None,
+    ) -> "ChurnMatrix":
+        """
+        Builds the matrix of a repository's first-parent history in a single pass,
+        diffing each commit against its first parent.
+
+        Args:
+            repo (Union[str, pathlib.Path, pygit2.Repository, RepoSession]): The
+                path to the Git repository, an opened repository or a session.
+            diff_options (Optional[DiffOptions]): The diff filter, profile and
+                backend applied to each diff.
+
+        Returns:
+            ChurnMatrix: The churn matrix.
+        """
+        diff_options = get_diff_options(diff_options)
+        session = open_session(repo, diff_options.cache)
+        try:
+            return cls.from_commit_stats(iter_commit_diff_stats(session, diff_options))
+        finally:
+            # Close sessions opened here, leaving sessions passed in open
+            if session is not repo:
+                session.close()
+
+    def row(self, commit: int) -> Dict[str, int]:
+        """
+        Returns the lines changed in each file by one commit.
+
+        Args:
+            commit (int): The row of the commit.
+
+        Returns:
+            Dict[str, int]: The lines changed (added and deleted) in each file.
+        """
+        start, end = self.indptr[commit], self.indptr[commit + 1]
+        return {
+            self.paths[column]: int(added) + int(deleted)
+            for column, added, deleted in zip(
+                self.indices[start:end].tolist(),
+                self.additions[start:end].tolist(),
+                self.deletions[start:end].tolist(),
+            )
+        }
+
+    def _entries(self, start: Optional[int], end: Optional[int]) -> slice:
+        """
+        Returns the slice of entries of a range of rows.
+        """
+        rows = range(len(self.commits))[slice(start, end)]
+        return slice(int(self.indptr[rows.start]), int(self.indptr[rows.stop]))
+
+    def file_churn(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Sums the lines changed in each file over a range of commits.
+
+        Args:
+            start (Optional[int]): The first row. Defaults to the first commit.
+            end (Optional[int]): The row after the last. Defaults to after the
+                most recent commit.
+
+        Returns:
+            np.ndarray: The lines changed in each file, by column.
+        """
+        entries = self._entries(start, end)
+        return np.bincount(
+            self.indices[entries],
+            weights=self.churn[entries],
+            minlength=len(self.paths),
+        ).astype(np.int64)
+
+    def file_commit_counts(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Counts the commits which changed each file over a range of commits.
+
+        Args:
+            start (Optional[int]): The first row. Defaults to the first commit.
+            end (Optional[int]): The row after the last. Defaults to after the
+                most recent commit.
+
+        Returns:
+            np.ndarray: The number of commits which changed each file, by column.
+        """
+        return np.bincount(
+            self.indices[self._entries(start, end)], minlength=len(self.paths)
+        )
+
+    def entropy_profile(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> EntropyProfile:
+        """
+        Returns the entropy of the cumulative churn of the files changed over
+        a range of commits.
+
+        Args:
+            start (Optional[int]): The first row. Defaults to the first commit.
+            end (Optional[int]): The row after the last. Defaults to after the
+                most recent commit.
+
+        Returns:
+            EntropyProfile: The entropy of the lines changed in each file.
+        """
+        changed = np.flatnonzero(self.file_commit_counts(start, end))
+        churn = self.file_churn(start, end)[changed]
+        return EntropyProfile(
+            {self.paths[column]: int(value) for column, value in zip(changed, churn)}
+        )
+
+    def commit_windows(
+        self, size: int, step: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows of windows of commits, matching the "commits" windows
+        of calculate_entropy_series.
+
+        Args:
+            size (int): Number of commits in each window.
+            step (Optional[int]): Number of commits between the starts of windows.
+                Defaults to size.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The first row of each window and the
+            row after its last.
+        """
+        step = size if step is None else step
+        if size < 1 or step < 1:
+            raise ValueError("Window size and step must be positive.")
+        number_of_commits = len(self.commits)
+        starts = np.arange(0, max(number_of_commits - size + 1, 0), step)
+        ends = starts + size
+        # Cover trailing commits with a final, possibly shorter, window
+        last_end = ends[-1] if len(ends) else None
+        if number_of_commits and last_end != number_of_commits:
+            start = max(number_of_commits - size, 0)
+            if last_end is not None:
+                start = max(start, int(last_end) - size + step)
+            starts = np.append(starts, start)
+            ends = np.append(ends, number_of_commits)
+        return starts, ends
+
+    def window_entropy(
+        self, starts: np.ndarray, ends: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """
+        Calculates the entropy of the churn within many windows of commits at
+        once, with vectorized reductions over the entries of every window.
+
+        Args:
+            starts (np.ndarray): The first row of each window.
+            ends (np.ndarray): The row after the last row of each window.
+
+        Returns:
+            Dict[str, np.ndarray]: The "number_of_files", "total_lines_changed"
+            and "normalized_entropy" of each window.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        entry_starts, entry_ends = self.indptr[starts], self.indptr[ends]
+        lengths = entry_ends - entry_starts
+
+        # Gather the entries of every window, so overlapping windows repeat them
+        window_of_entry = np.repeat(np.arange(len(starts)), lengths)
+        positions = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        entries = np.repeat(entry_starts, lengths) + positions
+
+        # Sum each file's churn within each window; unique keys sort by window
+        keys, inverse = np.unique(
+            window_of_entry * len(self.paths) + self.indices[entries],
+            return_inverse=True,
+        )
+        loc_changes = np.bincount(
+            inverse.ravel(), weights=self.churn[entries], minlength=len(keys)
+        ).astype(np.int64)
+        number_of_files = np.bincount(
+            keys // max(len(self.paths), 1), minlength=len(starts)
+        )
+        offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+        np.cumsum(number_of_files, out=offsets[1:])
+
+        cumulative = np.zeros(len(loc_changes) + 1, dtype=np.int64)
+        np.cumsum(loc_changes, out=cumulative[1:])
+
+        _, normalized_entropy = calculate_batch_entropy(loc_changes, offsets)
+        return {
+            "number_of_files": number_of_files,
+            "total_lines_changed": cumulative[offsets[1:]] - cumulative[offsets[:-1]],
+            "normalized_entropy": normalized_entropy,
+        }
+
+    def save(self, path: Union[str, pathlib.Path]) -> None:
+        """
+        Saves the matrix to a binary file: a magic number, the length of a JSON
+        header describing each array, the header, and the arrays, each aligned
+        so that they can be memory-mapped.
+
+        Args:
+            path (Union[str, pathlib.Path]): The path to the file.
+        """
+        commits_data, commits_offsets = _pack_strings(self.commits)
+        paths_data, paths_offsets = _pack_strings(self.paths)
+        arrays = {
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "additions": self.additions,
+            "deletions": self.deletions,
+            "commit_times": self.commit_times,
+            "commits_data": commits_data,
+            "commits_offsets": commits_offsets,
+            "paths_data": paths_data,
+            "paths_offsets": paths_offsets,
+        }
+
+        # Lay out the arrays after a header padded to the alignment
+        header_size = 4096
+        while True:
+            offset = len(MAGIC) + 8 + header_size
+            layout = {}
+            for name, values in arrays.items():
+                offset += -offset % _ALIGNMENT
+                layout[name] = [_DTYPES[name], len(values), offset]
+                offset += len(values) * np.dtype(_DTYPES[name]).itemsize
+            header = json.dumps({"arrays": layout}).encode("utf-8")
+            if len(header) <= header_size:
+                break
+            header_size *= 2
+
+        with open(path, "wb") as matrix_file:
+            matrix_file.write(MAGIC)
+            matrix_file.write(np.array(header_size, dtype="<u8").tobytes())
+            matrix_file.write(header.ljust(header_size))
+            for name, values in arrays.items():
+                _, _, offset = layout[name]
+                matrix_file.write(b"\0" * (offset - matrix_file.tell()))
+                np.asarray(values, dtype=_DTYPES[name]).tofile(matrix_file)
+
+    @classmethod
+    def load(cls, path: Union[str, pathlib.Path], mmap: bool = True) -> "ChurnMatrix":
+        """
+        Loads a matrix saved by save.
+
+        Args:
+            path (Union[str, pathlib.Path]): The path to the file.
+            mmap (bool): Whether to memory-map the arrays read-only rather than
+                reading them into memory. The commit and path tables are always read.
+
+        Returns:
+            ChurnMatrix: The churn matrix.
+        """
+        with open(path, "rb") as matrix_file:
+            if matrix_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{str(path)!r} is not a saved churn matrix.")
+            header_size = int(np.frombuffer(matrix_file.read(8), dtype="<u8")[0])
+            layout = json.loads(matrix_file.read(header_size))["arrays"]
+
+        arrays = {}
+        for name, (dtype, length, offset) in layout.items():
+            if not length:
+                arrays[name] = np.zeros(0, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode="r", offset=offset, shape=(length,)
+                )
+            else:
+                arrays[name] = np.fromfile(
+                    path, dtype=dtype, count=length, offset=offset
+                )
+        return cls(
+            _unpack_strings(arrays["commits_data"], arrays["commits_offsets"]),
+            arrays["commit_times"],
+            _unpack_strings(arrays["paths_data"], arrays["paths_offsets"]),
+            ChurnEntries(*(arrays[name] for name in ChurnEntries._fields)),
+        )
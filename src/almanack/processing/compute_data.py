@@ -2,24 +2,51 @@
 This module computes data for GitHub Repositories
 """
 
+import contextlib
 import pathlib
-import shutil
-import tempfile
 from datetime import datetime, timezone
-from typing import Optional, Tuple
-
-import pygit2
-
-from .calculate_entropy import calculate_aggregate_entropy, calculate_normalized_entropy
-from .git_operations import clone_repository, get_commits, get_edited_files
-
-
-def compute_repo_data(repo_path: str) -> None:
+from typing import Iterable, Optional, Tuple, Type, Union
+
+from .budget import AnalysisBudget
+from .calculate_entropy import EntropyProfile
+from .diff_cache import DiffStatsCache
+from .diff_options import DiffOptions, get_diff_options
+from .git_operations import get_diff_stats, get_first_commit, get_head_commit
+from .metrics import Metric, MetricEngine
+from .mirror_cache import MirrorCache
+from .profiling import NULL_PROFILER, StageProfiler
+from .repo_session import RepoSession
+from .workspace import Workspace, get_default_workspace
+
+
+def compute_repo_data(
+    repo_path: str,
+    diff_options: Optional[DiffOptions] = None,
+    profile: bool = False,
+    budget: Optional[AnalysisBudget] = None,
+    metrics: Optional[Iterable[Union[str, Type[Metric], Metric]]] = None,
+) -> None:
     """
     Computes comprehensive data for a GitHub repository.
 
     Args:
-        repo_path (str): The local path to the Git repository.
+        repo_path (str): The local path to the Git repository, which may be
+            a bare repository without a working tree.
+        diff_options (Optional[DiffOptions]): The diff filter, profile, backend,
+            workers and persistent cache used to diff the first and most recent
+            commits. The cache, keyed by tree and blob OIDs, is reused across
+            runs and forks.
+        profile (bool): Whether to add a "timings" section with the wall and CPU
+            time of each stage ("open", "history", "diff" and "metrics") and
+            counters of the files diffed, hunks, lines and blob bytes loaded.
+            Hunks and blob bytes are only counted by backends which see patches.
+        budget (Optional[AnalysisBudget]): Limits on the files, blob bytes, time
+            and commits of the analysis. When a limit is reached, the results
+            cover the part of the repository analyzed within the budget.
+        metrics (Optional[Iterable[Union[str, Type[Metric], Metric]]]): The metrics
+            to compute from one traversal of the repository, as metrics, metric
+            classes or names of registered metrics. Defaults to DEFAULT_METRICS,
+            which produce the fields below.
 
     Returns:
         dict: A dictionary containing the following key-value pairs:
@@ -27,62 +54,60 @@ def compute_repo_data(repo_path: str) -> None:
             - "total_normalized_entropy": The total normalized entropy calculated for the repository.
             - "number_of_commits": The total number of commits in the repository.
             - "number_of_files": The number of files that have been edited between the first and most recent commit.
+              The files, and so the per-file normalization of the entropy, depend on the
+              diff profile: with rename or copy detection a moved file counts once under
+              its new path, where otherwise it counts as a deleted and an added file.
             - "time_range_of_commits": A tuple containing the dates of the first and most recent commits.
             - "file_level_entropy": A dictionary of entropy values for each file.
+            - "directory_entropy": A dictionary of the churn and entropy of each directory, aggregated from its files.
+            - "total_lines_added": The number of lines added between the first and most recent commit.
+            - "total_lines_deleted": The number of lines deleted between the first and most recent commit.
+            - The fields of any other metrics enabled.
+            - "timings": The stage timings and counters, when profiling. Failed
+              runs also include the timings of the stages reached.
+            - "partial": Whether a limit of the budget was reached, with a budget.
+            - "budgets_exceeded": The names of the limits reached, with a budget.
     """
+    diff_options = get_diff_options(diff_options)
+    profiler = StageProfiler() if profile else NULL_PROFILER
+    if budget is not None:
+        budget.start()
     try:
-        # Convert repo_path to an absolute path and initialize the repository
-        repo_path = pathlib.Path(repo_path).resolve()
-        repo = pygit2.Repository(str(repo_path))
-
-        # Retrieve the list of commits from the repository
-        commits = get_commits(repo)
-        most_recent_commit = commits[0]
-        first_commit = commits[-1]
-
-        # Get a list of files that have been edited between the first and most recent commit
-        file_names = get_edited_files(repo, first_commit, most_recent_commit)
-
-        # Calculate the normalized total entropy for the repository
-        normalized_total_entropy = calculate_aggregate_entropy(
-            repo_path,
-            str(first_commit.id),
-            str(most_recent_commit.id),
-            file_names,
-        )
-
-        # Calculate the normalized entropy for the changes between the first and most recent commits
-        file_entropy = calculate_normalized_entropy(
-            repo_path,
-            str(first_commit.id),
-            str(most_recent_commit.id),
-            file_names,
-        )
-        # Convert commit times to UTC datetime objects, then format as date strings.
-        first_commit_date, most_recent_commit_date = (
-            datetime.fromtimestamp(commit.commit_time, tz=timezone.utc)
-            .date()
-            .isoformat()
-            for commit in (first_commit, most_recent_commit)
-        )
-
-        # Return the data structure
-        return {
-            "repo_path": str(repo_path),
-            "total_normalized_entropy": normalized_total_entropy,
-            "number_of_commits": len(commits),
-            "number_of_files": len(file_names),
-            "time_range_of_commits": (first_commit_date, most_recent_commit_date),
-            "file_level_entropy": file_entropy,
-        }
+        # Convert repo_path to an absolute path and open a session which
+        # performs each piece of git work for the repository once
+        with profiler.stage("open"):
+            repo_path = pathlib.Path(repo_path).resolve()
+            session = RepoSession(
+                repo_path,
+                diff_cache=diff_options.cache,
+                profiler=profiler,
+                budget=budget,
+            )
+            get_head_commit(session)
+
+        # Walk the history and diff the first and most recent commits once,
+        # feeding every metric from that traversal
+        data = {"repo_path": str(repo_path)}
+        data.update(MetricEngine(metrics).run(session, diff_options))
 
     except Exception as e:
         # If processing fails, return an error dictionary
-        return {"repo_path": str(repo_path), "error": str(e)}
+        data = {"repo_path": str(repo_path), "error": str(e)}
+
+    if budget is not None:
+        data["partial"] = budget.partial
+        data["budgets_exceeded"] = list(budget.exceeded)
+    if profile:
+        data["timings"] = profiler.summary()
+    return data
 
 
 def process_repo_for_analysis(
     repo_url: str,
+    mirror_cache: Optional[MirrorCache] = None,
+    bare: bool = True,
+    workspace: Optional[Workspace] = None,
+    diff_cache: Optional[DiffStatsCache] = None,
 ) -> Tuple[Optional[float], Optional[str], Optional[str], Optional[int]]:
     """
     Processes GitHub repository URL's to calculate entropy and other metadata.
@@ -91,22 +116,37 @@ def process_repo_for_analysis(
 
     Args:
         repo_url (str): The URL of the GitHub repository.
+        mirror_cache (Optional[MirrorCache]): A persistent store of repository mirrors.
+            When provided, the repository is incrementally fetched into its cached
+            mirror and analyzed from there instead of being cloned from scratch.
+        bare (bool): Whether to clone without checking out a working tree.
+            Entropy only reads git objects, so bare clones are used by default.
+        workspace (Optional[Workspace]): An entered workspace which owns the clone
+            and enforces its disk budget. When None, the workspace shared by every
+            analysis in the process is used, so that concurrent analyses clone
+            within one disk budget. The clone is removed once analysis completes.
+        diff_cache (Optional[DiffStatsCache]): A persistent cache of diff statistics,
+            which lets forks and re-runs reuse the statistics of identical trees.
 
     Returns:
         tuple: A tuple containing the normalized total entropy, the date of the first commit,
                the date of the most recent commit, and the total time of existence in days.
     """
-    temp_dir = tempfile.mkdtemp()
+    # Holds the cached mirror or the managed clone until the analysis completes
+    repo_stack = contextlib.ExitStack()
     try:
-        repo_path = clone_repository(repo_url)
-        # Load the cloned repo
-        repo = pygit2.Repository(str(repo_path))
-
-        # Retrieve the list of commits from the repo
-        commits = get_commits(repo)
-        # Select the first and most recent commits from the list
-        first_commit = commits[-1]
-        most_recent_commit = commits[0]
+        if mirror_cache is not None:
+            repo_path = repo_stack.enter_context(mirror_cache.mirror(repo_url))
+        else:
+            if workspace is None:
+                workspace = get_default_workspace()
+            repo_path = repo_stack.enter_context(workspace.clone(repo_url, bare=bare))
+        # Open a session for the cloned repo
+        session = RepoSession(repo_path, diff_cache=diff_cache)
+
+        # Retrieve the first and most recent commits without holding the history in memory
+        first_commit = get_first_commit(session)
+        most_recent_commit = get_head_commit(session)
 
         # Calculate the time span of existence between the first and most recent commits in days
         time_of_existence = (
@@ -124,12 +164,13 @@ def process_repo_for_analysis(
             .date()
             .isoformat()
         )
-        # Get a list of all files that have been edited between the commits
-        file_names = get_edited_files(repo, commits)
+        # Diff the first and most recent commits once to find the edited files
+        # along with their added and deleted line counts
+        diff_stats = get_diff_stats(session, first_commit, most_recent_commit)
         # Calculate the normalized entropy for the changes between the first and most recent commits
-        normalized_total_entropy = calculate_aggregate_entropy(
-            repo_path, str(first_commit.id), str(most_recent_commit.id), file_names
-        )
+        normalized_total_entropy = EntropyProfile.from_diff_stats(
+            diff_stats
+        ).aggregate_entropy
 
         return (
             normalized_total_entropy,
@@ -148,4 +189,4 @@ def process_repo_for_analysis(
         )
 
     finally:
-        shutil.rmtree(temp_dir)
+        repo_stack.close()
@@ -0,0 +1,373 @@
+"""
+This module runs resumable analyses over corpora of repositories
+"""
+
+import json
+import os
+import pathlib
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Union
+
+from .pipeline import RepoPipeline
+
+# name of the manifest file within a corpus output directory
+MANIFEST_FILE = "manifest.jsonl"
+
+
+class CorpusManifest:
+    """
+    An append-only record of the repositories a corpus run has completed or
+    failed, and of the result files holding the data of completed repositories.
+
+    Each line is a JSON record with the "repo_url", its "status" ("completed"
+    or "failed"), the "result_file" or "error", and the UTC "time". The latest
+    record of a URL wins, so retried failures are superseded by later records.
+    Records are flushed to disk as they are written, and a line left incomplete
+    by a crash is ignored when the manifest is read.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the manifest file.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        self.path = pathlib.Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path) as manifest_file:
+                for line in manifest_file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash interrupted the last write
+                        continue
+                    self.entries[record["repo_url"]] = record
+
+    def __repr__(self) -> str:
+        return f"CorpusManifest({str(self.path)!r})"
+
+    def completed(self) -> Set[str]:
+        """
+        Returns the URLs of repositories whose results were written.
+        """
+        return {
+            repo_url
+            for repo_url, record in self.entries.items()
+            if record["status"] == "completed"
+        }
+
+    def failed(self) -> Dict[str, str]:
+        """
+        Returns the URLs of repositories which failed, along with their errors.
+        """
+        return {
+            repo_url: record["error"]
+            for repo_url, record in self.entries.items()
+            if record["status"] == "failed"
+        }
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Appends records and flushes them to disk.
+        """
+        if not records:
+            return
+        # Start on a new line if a crash left the last line incomplete
+        prefix = ""
+        if self.path.exists() and self.path.stat().st_size:
+            with open(self.path, "rb") as manifest_file:
+                manifest_file.seek(-1, os.SEEK_END)
+                prefix = "" if manifest_file.read(1) == b"\n" else "\n"
+        with open(self.path, "a") as manifest_file:
+            manifest_file.write(
+                prefix + "".join(json.dumps(record) + "\n" for record in records)
+            )
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        for record in records:
+            self.entries[record["repo_url"]] = record
+
+    def record_completed(self, repo_urls: List[str], result_file: str) -> None:
+        """
+        Records repositories whose results were written to a result file.
+
+        Args:
+            repo_urls (List[str]): The URLs of the repositories.
+            result_file (str): The result file, relative to the manifest.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        self._append(
+            [
+                {
+                    "repo_url": repo_url,
+                    "status": "completed",
+                    "result_file": result_file,
+                    "time": now,
+                }
+                for repo_url in repo_urls
+            ]
+        )
+
+    def record_failed(self, repo_url: str, error: str) -> None:
+        """
+        Records a repository which failed.
+
+        Args:
+            repo_url (str): The URL of the repository.
+            error (str): Why the repository failed.
+        """
+        self._append(
+            [
+                {
+                    "repo_url": repo_url,
+                    "status": "failed",
+                    "error": error,
+                    "time": datetime.now(timezone.utc).isoformat(),
+                }
+            ]
+        )
+
+
+class JSONLinesSink:
+    """
+    Writes batches of results as JSON Lines files, one file per batch.
+
+    Args:
+        output_dir (Union[str, pathlib.Path]): The directory for result files.
+    """
+
+    # file name pattern of result files
+    pattern = "results-{batch:06d}.jsonl"
+
+    def __init__(self, output_dir: Union[str, pathlib.Path]) -> None:
+        self.output_dir = pathlib.Path(output_dir)
+
+    def write_batch(self, batch: int, results: List[Dict[str, Any]]) -> str:
+        """
+        Writes a batch of results to a new file, which appears only once complete.
+
+        Args:
+            batch (int): The number of the batch.
+            results (List[Dict[str, Any]]): The data of each repository.
+
+        Returns:
+            str: The name of the result file within the output directory.
+        """
+        name = self.pattern.format(batch=batch)
+        temporary_path = self.output_dir / f".{name}.tmp"
+        with open(temporary_path, "w") as result_file:
+            for result in results:
+                result_file.write(json.dumps(result) + "\n")
+            result_file.flush()
+            os.fsync(result_file.fileno())
+        os.replace(temporary_path, self.output_dir / name)
+        return name
+
+    def read(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Reads the results of a result file.
+
+        Args:
+            name (str): The name of the result file within the output directory.
+
+        Yields:
+            Dict[str, Any]: The data of each repository.
+        """
+        with open(self.output_dir / name) as result_file:
+            for line in result_file:
+                yield json.loads(line)
+
+    def is_complete(self, name: str) -> bool:
+        """
+        Returns whether a result file was completely written, which holds for
+        every JSON Lines file since each appears only once complete.
+
+        Args:
+            name (str): The name of the result file within the output directory.
+        """
+        return (self.output_dir / name).exists()
+
+    def close(self) -> None:
+        """
+        Does nothing, since each result file is closed as it is written.
+        """
+
+
+def _next_batch(output_dir: pathlib.Path, manifest: CorpusManifest) -> int:
+    """
+    Returns a batch number after every result file referenced by the manifest
+    or left in the output directory.
+    """
+    names = {
+        record["result_file"]
+        for record in manifest.entries.values()
+        if record["status"] == "completed"
+    }
+    names.update(path.name for path in output_dir.glob("results-*"))
+    numbers = [
+        int(match.group(1))
+        for match in map(re.compile(r"results-(\d+)\.").match, names)
+        if match
+    ]
+    return max(numbers, default=0) + 1
+
+
+def _completed(manifest: CorpusManifest, sink: Any) -> Dict[str, str]:
+    """
+    Returns the completed repositories and their result files, leaving out
+    repositories whose result file the sink could not finish before a crash.
+    """
+    complete: Dict[str, bool] = {}
+    completed = {}
+    for repo_url, record in manifest.entries.items():
+        if record["status"] != "completed":
+            continue
+        name = record["result_file"]
+        if name not in complete:
+            complete[name] = sink.is_complete(name)
+        if complete[name]:
+            completed[repo_url] = name
+    return completed
+
+
+class CorpusOptions(NamedTuple):
+    """
+    How a corpus run batches its results and treats earlier failures.
+
+    Attributes:
+        flush_every (int): Number of results written to each result file.
+        flush_seconds (float): Maximum seconds results are held before being written.
+        retry_failed (bool): Whether to retry repositories which failed in earlier runs.
+    """
+
+    flush_every: int = 100
+    flush_seconds: float = 60.0
+    retry_failed: bool = True
+
+
+def run_corpus(
+    repo_urls: Iterable[str],
+    output_dir: Union[str, pathlib.Path],
+    options: Optional[CorpusOptions] = None,
+    pipeline: Optional[RepoPipeline] = None,
+    sink: Optional[Any] = None,
+    **kwargs: Any,
+) -> Dict[str, int]:
+    """
+    Clones and analyzes a corpus of repositories, recording progress in an
+    append-only manifest so that an interrupted run resumes where it stopped.
+
+    Results are buffered and written to a new result file every flush_every
+    repositories or flush_seconds of the options, after which the manifest records the
+    repositories as completed. On restart, completed repositories are skipped
+    and failed repositories are retried, so at most one unflushed batch of
+    work is repeated after a crash.
+
+    Args:
+        repo_urls (Iterable[str]): The URLs of the repositories.
+        output_dir (Union[str, pathlib.Path]): The directory holding the manifest
+            and result files.
+        options (Optional[CorpusOptions]): The number of results in each result
+            file, the maximum seconds results are held before being written and
+            whether to retry earlier failures. Defaults to CorpusOptions().
+        pipeline (Optional[RepoPipeline]): The pipeline which clones and analyzes
+            repositories. Defaults to a pipeline with default settings.
+        sink (Optional[Any]): Writes result files, such as a ParquetSink.
+            Defaults to JSON Lines files in output_dir.
+        **kwargs (Any): Keyword arguments passed to compute_repo_data.
+
+    Returns:
+        Dict[str, int]: The number of repositories "skipped" as already completed,
+        and "completed" and "failed" in this run.
+    """
+    flush_every, flush_seconds, retry_failed = options or CorpusOptions()
+    if flush_every < 1:
+        raise ValueError("flush_every must be positive.")
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = CorpusManifest(output_dir / MANIFEST_FILE)
+    sink = JSONLinesSink(output_dir) if sink is None else sink
+
+    # Skip finished work, keeping the first occurrence of duplicate URLs
+    completed = _completed(manifest, sink)
+    failed = set(manifest.failed())
+    repo_urls = list(dict.fromkeys(repo_urls))
+    todo = [
+        repo_url
+        for repo_url in repo_urls
+        if repo_url not in completed and (retry_failed or repo_url not in failed)
+    ]
+    summary = {
+        "skipped": sum(repo_url in completed for repo_url in repo_urls),
+        "completed": 0,
+        "failed": 0,
+    }
+
+    batch = _next_batch(output_dir, manifest)
+    buffer: List[Dict[str, Any]] = []
+    last_flush = time.monotonic()
+
+    def flush() -> None:
+        nonlocal batch, last_flush
+        if buffer:
+            # Write results before recording them, so the manifest never
+            # references a result file which does not exist
+            name = sink.write_batch(batch, buffer)
+            manifest.record_completed([result["repo_url"] for result in buffer], name)
+            summary["completed"] += len(buffer)
+            batch += 1
+            buffer.clear()
+        last_flush = time.monotonic()
+
+    owned_pipeline = pipeline is None
+    if owned_pipeline:
+        pipeline = RepoPipeline()
+    try:
+        for data in pipeline.run(todo, **kwargs):
+            if "error" in data:
+                manifest.record_failed(data["repo_url"], data["error"])
+                summary["failed"] += 1
+            else:
+                buffer.append(data)
+            if (
+                len(buffer) >= flush_every
+                or time.monotonic() - last_flush >= flush_seconds
+            ):
+                flush()
+    finally:
+        # Keep the results finished before an interruption
+        flush()
+        sink.close()
+        if owned_pipeline:
+            pipeline.close()
+    return summary
+
+
+def read_corpus_results(
+    output_dir: Union[str, pathlib.Path], sink: Optional[Any] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Reads the results of the repositories a corpus run completed, using the
+    manifest to skip results left behind by interrupted or repeated work.
+
+    Args:
+        output_dir (Union[str, pathlib.Path]): The directory holding the manifest
+            and result files.
+        sink (Optional[Any]): Reads result files. Defaults to JSON Lines.
+
+    Yields:
+        Dict[str, Any]: The data of each completed repository.
+    """
+    output_dir = pathlib.Path(output_dir)
+    manifest = CorpusManifest(output_dir / MANIFEST_FILE)
+    sink = JSONLinesSink(output_dir) if sink is None else sink
+
+    # Group the completed repositories by the file holding their latest results
+    files: Dict[str, Set[str]] = {}
+    for repo_url, name in _completed(manifest, sink).items():
+        files.setdefault(name, set()).add(repo_url)
+    for name in sorted(files):
+        for result in sink.read(name):
+            if result["repo_url"] in files[name]:
+                yield result
@@ -0,0 +1,810 @@
+"""
+This module provides interchangeable backends which compute per-file
+diff statistics between two commits
+"""
+
+import heapq
+import shutil
+import subprocess  # nosec B404
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import git
+import pygit2
+
+from .diff_filters import DiffFilter
+from .diff_profiles import DiffProfile
+
+if TYPE_CHECKING:
+    from .repo_session import RepoSession
+
+# a changed file as (old path, new path, additions, deletions)
+Change = Tuple[str, str, int, int]
+
+
+class DiffRequest(NamedTuple):
+    """
+    A diff between two commits which a backend computes.
+
+    Attributes:
+        source_commit (pygit2.Commit): The source commit.
+        target_commit (pygit2.Commit): The target commit.
+        diff_profile (DiffProfile): The diff options profile.
+        diff_filter (Optional[DiffFilter]): Pathspecs and size limits applied to the diff.
+        line_counts (bool): Whether to count changed lines. When False, the
+            line counts are zero and backends may skip generating patches.
+    """
+
+    source_commit: pygit2.Commit
+    target_commit: pygit2.Commit
+    diff_profile: DiffProfile
+    diff_filter: Optional[DiffFilter] = None
+    line_counts: bool = True
+
+
+class DiffBackend:
+    """
+    Computes the changed files and per-file line counts between two commits.
+
+    Every backend applies the same diff options profile and diff filter, so
+    that the backends are interchangeable and their results are identical.
+    Subclasses implement iter_changes.
+    """
+
+    name = "base"
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+    def iter_changes(
+        self, session: "RepoSession", request: DiffRequest
+    ) -> Iterator[Change]:
+        """
+        Yields the changed files which pass the filter.
+
+        Args:
+            session (RepoSession): The session for the repository.
+            request (DiffRequest): The commits to diff and the diff options.
+
+        Returns:
+            Iterator[Change]: The old path, new path, additions and deletions
+            of each changed file.
+        """
+        raise NotImplementedError
+
+    def edited_files(self, session: "RepoSession", request: DiffRequest) -> List[str]:
+        """
+        Finds the files edited, added, or deleted between two commits,
+        without counting changed lines.
+
+        Args:
+            session (RepoSession): The session for the repository.
+            request (DiffRequest): The commits to diff and the diff options.
+
+        Returns:
+            List[str]: List of file names that have been edited, added, or deleted.
+        """
+        # Create a set to store unique file names that have been edited
+        file_names = set()
+        for old_path, new_path, _, _ in self.iter_changes(
+            session, request._replace(line_counts=False)
+        ):
+            file_names.update((old_path, new_path))
+        return list(file_names)
+
+    def diff_stats(
+        self, session: "RepoSession", request: DiffRequest
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Computes the added and deleted line counts for each file edited
+        between two commits, keyed by the new path of each file.
+
+        Args:
+            session (RepoSession): The session for the repository.
+            request (DiffRequest): The commits to diff and the diff options.
+
+        Returns:
+            Dict[str, Dict[str, int]]: A dictionary where the key is the filename and
+            the value is a dictionary with the "additions" and "deletions" for that file.
+        """
+        return {
+            new_path: {"additions": additions, "deletions": deletions}
+            for _, new_path, additions, deletions in self.iter_changes(
+                session, request._replace(line_counts=True)
+            )
+        }
+
+
+def _change_blob_ids(
+    source_commit: pygit2.Commit,
+    target_commit: pygit2.Commit,
+    old_path: str,
+    new_path: str,
+) -> List[Optional[pygit2.Oid]]:
+    """
+    Looks up the blobs on each side of a changed file in the commit trees.
+    """
+    blob_ids = []
+    for commit, path in ((source_commit, old_path), (target_commit, new_path)):
+        try:
+            blob_ids.append(commit.tree[path].id)
+        except KeyError:
+            # Missing sides of added or deleted files
+            blob_ids.append(None)
+    return blob_ids
+
+
+def _accepts_change(
+    session: "RepoSession", request: DiffRequest, old_path: str, new_path: str
+) -> bool:
+    """
+    Applies a diff filter to a changed file reported by the git command line,
+    looking up its blobs in the commit trees only when blob sizes are limited.
+    """
+    diff_filter = request.diff_filter
+    if diff_filter is None:
+        return True
+    if not diff_filter.matches(new_path):
+        return False
+    if diff_filter.max_blob_size is None:
+        return True
+    return diff_filter.within_size(
+        session.repo,
+        _change_blob_ids(
+            request.source_commit, request.target_commit, old_path, new_path
+        ),
+    )
+
+
+def _within_budget(
+    session: "RepoSession", request: DiffRequest, changes: List[Change]
+) -> Iterator[Change]:
+    """
+    Applies the session's budget to the changed files reported by the git
+    command line, sampling the files and charging the blobs of each file
+    whose lines were counted.
+    """
+    budget = session.budget
+    if budget is None:
+        yield from changes
+        return
+    for change in budget.sample(sorted(changes, key=lambda change: change[1])):
+        if budget.stop_requested():
+            return
+        if request.line_counts and not budget.admit_blobs(
+            session.repo,
+            _change_blob_ids(request.source_commit, request.target_commit, *change[:2]),
+        ):
+            continue
+        yield change
+
+
+def _pushdown_pathspecs(diff_filter: Optional[DiffFilter]) -> List[str]:
+    """
+    Returns the literal include pathspecs passed to git to limit the diff,
+    mirroring the subtree diffs of the pygit2 backend.
+    """
+    if diff_filter is None:
+        return []
+    return diff_filter.tree_prefixes() or []
+
+
+def _describe_change(
+    repo: pygit2.Repository,
+    path: str,
+    old_entry: Optional[pygit2.Object],
+    new_entry: Optional[pygit2.Object],
+) -> Optional[Tuple[str, int, bool]]:
+    """
+    Describes a tree entry as a (path, weight, is_tree) tuple, or None when it
+    is unchanged. Trees are weighted by their number of entries, and entries
+    which are a tree on one side and a file on the other are not split.
+    """
+    if (
+        old_entry is not None
+        and new_entry is not None
+        and old_entry.id == new_entry.id
+        and old_entry.filemode == new_entry.filemode
+    ):
+        return None
+    subtrees = [
+        repo[entry.id]
+        for entry in (old_entry, new_entry)
+        if entry is not None and entry.filemode == pygit2.enums.FileMode.TREE
+    ]
+    return (
+        path,
+        max([len(subtree) for subtree in subtrees] or [1]),
+        len(subtrees) == sum(entry is not None for entry in (old_entry, new_entry)),
+    )
+
+
+def _changed_entries(
+    repo: pygit2.Repository,
+    source_commit: pygit2.Commit,
+    target_commit: pygit2.Commit,
+    path: str,
+) -> List[Tuple[str, int, bool]]:
+    """
+    Describes the entries which differ between the two commits directly
+    within a directory, or the root directory when the path is empty.
+    """
+    sides = []
+    for commit in (source_commit, target_commit):
+        try:
+            tree = repo[commit.tree[path].id] if path else commit.tree
+        except KeyError:
+            tree = None
+        sides.append(
+            {entry.name: entry for entry in tree}
+            if isinstance(tree, pygit2.Tree)
+            else {}
+        )
+
+    changes = (
+        _describe_change(
+            repo,
+            f"{path}/{name}" if path else name,
+            sides[0].get(name),
+            sides[1].get(name),
+        )
+        for name in sorted(set(sides[0]) | set(sides[1]))
+    )
+    return [change for change in changes if change is not None]
+
+
+def plan_diff_shards(
+    repo: pygit2.Repository,
+    source_commit: pygit2.Commit,
+    target_commit: pygit2.Commit,
+    shards: int,
+    prefixes: Optional[List[str]] = None,
+) -> List[List[str]]:
+    """
+    Splits the paths changed between two commits into balanced shards of
+    literal pathspecs which can be diffed independently.
+
+    Starting from the top-level entries, unchanged entries are dropped and the
+    largest changed subtrees are split into their entries until there are
+    several pathspecs per shard. The pathspecs are then packed into shards,
+    largest first, so that each shard holds a similar number of entries.
+
+    Args:
+        repo (pygit2.Repository): The Git repository.
+        source_commit (pygit2.Commit): The source commit.
+        target_commit (pygit2.Commit): The target commit.
+        shards (int): The number of shards to create.
+        prefixes (Optional[List[str]]): Paths to limit the shards to.
+            Defaults to the whole tree.
+
+    Returns:
+        List[List[str]]: The pathspecs of each non-empty shard. Together the
+        shards cover every changed path exactly once.
+    """
+    # Pathspecs as (negated weight, path, is_tree), so the heaviest is popped first
+    if prefixes is None:
+        changes = _changed_entries(repo, source_commit, target_commit, "")
+    else:
+        changes = []
+        for prefix in prefixes:
+            entries = []
+            for commit in (source_commit, target_commit):
+                try:
+                    entries.append(commit.tree[prefix])
+                except KeyError:
+                    entries.append(None)
+            changes.append(_describe_change(repo, prefix, *entries))
+    pathspecs = [
+        (-weight, path, is_tree) for path, weight, is_tree in filter(None, changes)
+    ]
+    heapq.heapify(pathspecs)
+
+    # Split the heaviest subtrees until there are several pathspecs per shard
+    target_count = shards * 4
+    while pathspecs and len(pathspecs) < target_count:
+        _, path, is_tree = pathspecs[0]
+        if not is_tree:
+            break
+        entries = _changed_entries(repo, source_commit, target_commit, path)
+        # Stop rather than pass an unbounded number of pathspecs to git
+        if len(pathspecs) - 1 + len(entries) > target_count * 2:
+            break
+        heapq.heappop(pathspecs)
+        for entry_path, entry_weight, entry_is_tree in entries:
+            heapq.heappush(pathspecs, (-entry_weight, entry_path, entry_is_tree))
+
+    # Pack the pathspecs into the lightest shard, largest first
+    bins = [(0, number, []) for number in range(shards)]
+    for weight, path, _ in sorted(pathspecs):
+        total, number, paths = heapq.heappop(bins)
+        paths.append(path)
+        heapq.heappush(bins, (total - weight, number, paths))
+    return [paths for _, _, paths in sorted(bins, key=lambda bin: bin[1]) if paths]
+
+
+class Pygit2Backend(DiffBackend):
+    """
+    Diffs commits in process with libgit2, counting lines from each patch
+    without creating Python objects for its lines.
+
+    Literal include pathspecs are pushed down to subtree diffs and the
+    remaining deltas are filtered before any patches are generated.
+    """
+
+    name = "pygit2"
+
+    def _filtered_diffs(
+        self, session: "RepoSession", request: DiffRequest
+    ) -> List[Tuple[str, pygit2.Diff]]:
+        """
+        Diffs only the subtrees named by literal include pathspecs, or the
+        whole tree otherwise, returning each diff with the path prefix of its paths.
+        """
+        source_commit, target_commit, diff_profile, diff_filter, _ = request
+        prefixes = None if diff_filter is None else diff_filter.tree_prefixes()
+        if prefixes is None:
+            return [("", session.get_diff(source_commit, target_commit, diff_profile))]
+
+        diffs = []
+        for prefix in prefixes:
+            subtrees = []
+            for commit in (source_commit, target_commit):
+                try:
+                    subtrees.append(session.repo[commit.tree[prefix].id])
+                except KeyError:
+                    subtrees.append(None)
+            # Literal include pathspecs which name files require the whole tree diff
+            if any(
+                subtree is not None and not isinstance(subtree, pygit2.Tree)
+                for subtree in subtrees
+            ):
+                return [
+                    ("", session.get_diff(source_commit, target_commit, diff_profile))
+                ]
+
+            # Added or deleted subtrees are diffed against the empty tree
+            if any(subtree is not None for subtree in subtrees):
+                diffs.append((f"{prefix}/", diff_profile.diff(session.repo, *subtrees)))
+        return diffs
+
+    def iter_changes(
+        self, session: "RepoSession", request: DiffRequest
+    ) -> Iterator[Change]:
+        _, _, diff_profile, diff_filter, line_counts = request
+        diffs = self._filtered_diffs(session, request)
+
+        accepted = [
+            (prefix, diff, index, delta)
+            for prefix, diff in diffs
+            for index, delta in enumerate(diff.deltas)
+            if diff_filter is None
+            or diff_filter.accepts(session.repo, prefix + delta.new_file.path, delta)
+        ]
+        if session.budget is not None:
+            # Sample in path order, like the git command line backends
+            accepted = session.budget.sample(
+                sorted(accepted, key=lambda item: item[0] + item[3].new_file.path)
+            )
+        if line_counts:
+            counts = self._line_counts(session, diff_profile, accepted)
+        else:
+            counts = [(0, 0)] * len(accepted)
+
+        for (prefix, _, _, delta), file_counts in zip(accepted, counts):
+            # Skip files left out by the budget
+            if file_counts is None:
+                continue
+            additions, deletions = file_counts
+            # Like git, drop modified files whose changes are all ignored whitespace
+            if (
+                line_counts
+                and diff_profile.whitespace != "none"
+                and not additions
+                and not deletions
+                and delta.status == pygit2.enums.DeltaStatus.MODIFIED
+                and delta.old_file.mode == delta.new_file.mode
+            ):
+                continue
+            yield (
+                prefix + delta.old_file.path,
+                prefix + delta.new_file.path,
+                additions,
+                deletions,
+            )
+
+    @staticmethod
+    def _line_counts(
+        session: "RepoSession",
+        diff_profile: DiffProfile,
+        accepted: List[Tuple[str, pygit2.Diff, int, pygit2.DiffDelta]],
+    ) -> List[Optional[Tuple[int, int]]]:
+        """
+        Counts the added and deleted lines of each accepted delta, reusing the
+        counts of (blob, blob) pairs from the session's diff cache when it has one.
+        Deltas whose patches the session's budget does not allow are counted as None.
+        """
+        # Only whitespace handling and the diff algorithm change line counts
+        options = (diff_profile.whitespace, diff_profile.patience)
+        if session.diff_cache is None:
+            cached = [None] * len(accepted)
+        else:
+            cached = session.diff_cache.get_blob_stats(
+                [
+                    (str(delta.old_file.id), str(delta.new_file.id), *options)
+                    for _, _, _, delta in accepted
+                ]
+            )
+
+        counts = []
+        computed = []
+        for (_, diff, index, delta), cached_counts in zip(accepted, cached):
+            # Check the budget before loading the blobs of each patch. Cached
+            # counts are charged too, so results do not depend on the cache.
+            if session.budget is not None and (
+                session.budget.stop_requested()
+                or not session.budget.admit_blobs(
+                    session.repo, (delta.old_file.id, delta.new_file.id)
+                )
+            ):
+                counts.append(None)
+                continue
+            if cached_counts is not None:
+                counts.append(cached_counts)
+                continue
+            # Generate the patch only for deltas which pass the filter.
+            # line_stats counts lines within libgit2 as (context, additions,
+            # deletions), which avoids creating a Python object for every line.
+            patch = diff[index]
+            _, additions, deletions = patch.line_stats
+            if session.profiler.enabled:
+                # Hunk objects are only created when profiling
+                session.profiler.count("hunks", len(patch.hunks))
+                session.profiler.count(
+                    "blob_bytes", patch.delta.old_file.size + patch.delta.new_file.size
+                )
+            counts.append((additions, deletions))
+            computed.append(
+                (
+                    (str(delta.old_file.id), str(delta.new_file.id), *options),
+                    (additions, deletions),
+                )
+            )
+
+        if session.diff_cache is not None and computed:
+            session.diff_cache.put_blob_stats(computed)
+        return counts
+
+
+class GitCliBackend(DiffBackend):
+    """
+    Diffs commits with `git diff-tree --numstat`, which streams line counts
+    from git's own diff machinery without transferring any patch text.
+
+    The plumbing command ignores user diff configuration, and every option
+    from the diff profile is passed explicitly. Exact renames match the other
+    backends, while git scores the similarity of inexact renames differently
+    from libgit2, so pairs close to the rename threshold may differ.
+
+    With more than one worker, the diff is split into balanced pathspec
+    shards which are diffed concurrently by separate git processes from a
+    thread pool, and the per-file results are merged. Shards cover disjoint
+    paths, so the merged results are identical to a single diff. Rename and
+    copy detection pair files across the whole tree, so profiles which detect
+    them always run as a single diff.
+
+    Args:
+        git_executable (Optional[str]): Path to the git executable.
+            Defaults to the git found on the PATH.
+        workers (Optional[int]): Number of shards diffed concurrently.
+            Defaults to a single diff.
+    """
+
+    name = "git-cli"
+
+    def __init__(
+        self, git_executable: Optional[str] = None, workers: Optional[int] = None
+    ) -> None:
+        self.git_executable = git_executable
+        self.workers = workers
+
+    def __repr__(self) -> str:
+        return f"GitCliBackend(workers={self.workers!r})"
+
+    @staticmethod
+    def diff_options(diff_profile: DiffProfile) -> List[str]:
+        """
+        Translates a diff profile into `git diff-tree` options.
+
+        Args:
+            diff_profile (DiffProfile): The diff options profile.
+
+        Returns:
+            List[str]: The command line options.
+        """
+        # Context options are left out since they imply patch output and
+        # do not change line counts
+        options = [
+            "--no-ext-diff",
+            "--no-textconv",
+            f"--diff-algorithm={'patience' if diff_profile.patience else 'myers'}",
+        ]
+        options += {
+            "none": [],
+            "all": ["--ignore-all-space"],
+            "change": ["--ignore-space-change"],
+            "eol": ["--ignore-space-at-eol"],
+        }[diff_profile.whitespace]
+        if diff_profile.detect_renames or diff_profile.detect_copies:
+            options += [
+                f"--find-renames={diff_profile.rename_threshold}%",
+                f"-l{diff_profile.rename_limit}",
+            ]
+            if diff_profile.detect_copies:
+                options.append(f"--find-copies={diff_profile.rename_threshold}%")
+        else:
+            options.append("--no-renames")
+        return options
+
+    def _run(
+        self, session: "RepoSession", *args: str, timeout: Optional[float] = None
+    ) -> str:
+        """
+        Runs a git command against the repository, returning its output.
+        """
+        git_executable = self.git_executable or shutil.which("git")
+        if git_executable is None:
+            raise RuntimeError("The git-cli diff backend requires git on the PATH.")
+        result = subprocess.run(  # nosec B603
+            [git_executable, "--git-dir", session.repo.path, *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            timeout=timeout,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"git {args[0]} failed: {result.stderr.decode(errors='replace')}"
+            )
+        return result.stdout.decode("utf-8", errors="replace")
+
+    def _diff_tree(
+        self, session: "RepoSession", request: DiffRequest, pathspecs: List[str]
+    ) -> List[Change]:
+        """
+        Runs `git diff-tree` limited to literal pathspecs and parses its
+        NUL-terminated output into changes.
+        """
+        line_counts = request.line_counts
+        budget = session.budget
+        try:
+            output = self._run(
+                session,
+                "--literal-pathspecs",
+                "diff-tree",
+                "-r",
+                "-z",
+                "--numstat" if line_counts else "--name-status",
+                *self.diff_options(request.diff_profile),
+                str(request.source_commit.id),
+                str(request.target_commit.id),
+                "--",
+                *pathspecs,
+                timeout=None if budget is None else budget.remaining_seconds(),
+            )
+        except subprocess.TimeoutExpired:
+            # git is stopped once the budget's time is up
+            budget.exceed("max_seconds")
+            return []
+
+        # With -z, each record is NUL terminated and renamed or copied files
+        # report their old and new paths as separate fields
+        fields = output.split("\0")
+        position = 0
+        changes = []
+        while position < len(fields) and fields[position]:
+            if line_counts:
+                # "<additions>\t<deletions>\t<path>", with an empty path for renames
+                additions, deletions, path = fields[position].split("\t", 2)
+                renamed = not path
+            else:
+                # "<status>" followed by the path, with two paths for renames
+                additions = deletions = "0"
+                status, path = fields[position], None
+                renamed = status[0] in "RC"
+            if renamed:
+                old_path, new_path = fields[position + 1 : position + 3]
+                position += 3
+            elif path:
+                old_path = new_path = path
+                position += 1
+            else:
+                old_path = new_path = fields[position + 1]
+                position += 2
+
+            # Binary files report "-" for both counts
+            changes.append(
+                (
+                    old_path,
+                    new_path,
+                    0 if additions == "-" else int(additions),
+                    0 if deletions == "-" else int(deletions),
+                )
+            )
+        return changes
+
+    def iter_changes(
+        self, session: "RepoSession", request: DiffRequest
+    ) -> Iterator[Change]:
+        diff_profile = request.diff_profile
+        pathspecs = _pushdown_pathspecs(request.diff_filter)
+        if (
+            self.workers is None
+            or self.workers <= 1
+            or diff_profile.detect_renames
+            or diff_profile.detect_copies
+        ):
+            shards = [pathspecs]
+        else:
+            shards = plan_diff_shards(
+                session.repo,
+                request.source_commit,
+                request.target_commit,
+                self.workers,
+                pathspecs or None,
+            )
+
+        if not shards:
+            return
+        if len(shards) == 1:
+            shard_changes = [self._diff_tree(session, request, shards[0])]
+        else:
+            # The threads only wait on git processes, so the shards run in parallel
+            with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+                shard_changes = list(
+                    executor.map(
+                        lambda shard: self._diff_tree(session, request, shard),
+                        shards,
+                    )
+                )
+
+        accepted = [
+            change
+            for changes in shard_changes
+            for change in changes
+            if _accepts_change(session, request, *change[:2])
+        ]
+        yield from _within_budget(session, request, accepted)
+
+
+class GitPythonBackend(DiffBackend):
+    """
+    Diffs commits through GitPython, which parses the patch output of
+    `git diff-tree` and counts lines from each file's patch in Python.
+    """
+
+    name = "gitpython"
+
+    @staticmethod
+    def diff_options(
+        diff_profile: DiffProfile, patch: bool = True
+    ) -> Dict[str, Union[str, bool]]:
+        """
+        Translates a diff profile into GitPython diff keyword arguments.
+
+        Args:
+            diff_profile (DiffProfile): The diff options profile.
+            patch (bool): Whether patches are generated. Context options
+                imply patch output, so they are only passed with patches.
+
+        Returns:
+            Dict[str, Union[str, bool]]: The keyword arguments.
+        """
+        # Values are passed as strings because GitPython drops zero-valued options
+        options: Dict[str, Union[str, bool]] = {
+            "no_textconv": True,
+            "diff_algorithm": "patience" if diff_profile.patience else "myers",
+        }
+        whitespace_option = {
+            "all": "ignore_all_space",
+            "change": "ignore_space_change",
+            "eol": "ignore_space_at_eol",
+        }.get(diff_profile.whitespace)
+        if whitespace_option is not None:
+            options[whitespace_option] = True
+        if diff_profile.detect_renames or diff_profile.detect_copies:
+            options["find_renames"] = f"{diff_profile.rename_threshold}%"
+            options["l"] = str(diff_profile.rename_limit)
+            if diff_profile.detect_copies:
+                options["find_copies"] = f"{diff_profile.rename_threshold}%"
+        else:
+            options["no_renames"] = True
+        if patch:
+            options["unified"] = str(diff_profile.context_lines)
+            options["inter_hunk_context"] = str(diff_profile.interhunk_lines)
+        return options
+
+    def iter_changes(
+        self, session: "RepoSession", request: DiffRequest
+    ) -> Iterator[Change]:
+        source_commit, target_commit, diff_profile, diff_filter, line_counts = request
+        with git.Repo(session.repo.path) as repo:
+            # Build the commits from their OIDs, which avoids reading the objects
+            diff_index = git.Commit(repo, source_commit.id.raw).diff(
+                git.Commit(repo, target_commit.id.raw),
+                paths=_pushdown_pathspecs(diff_filter) or None,
+                create_patch=line_counts,
+                **self.diff_options(diff_profile, patch=line_counts),
+            )
+
+        changes = []
+        for diff in diff_index:
+            # Added and deleted files only have a path on one side
+            old_path = diff.a_path or diff.b_path
+            new_path = diff.b_path or diff.a_path
+            if not _accepts_change(session, request, old_path, new_path):
+                continue
+            additions = deletions = hunks = 0
+            if line_counts:
+                for line in diff.diff.splitlines():
+                    if line.startswith(b"+"):
+                        additions += 1
+                    elif line.startswith(b"-"):
+                        deletions += 1
+                    elif line.startswith(b"@@"):
+                        hunks += 1
+                session.profiler.count("hunks", hunks)
+            changes.append((old_path, new_path, additions, deletions))
+        yield from _within_budget(session, request, changes)
+
+
+# built-in diff backends
+DIFF_BACKENDS: Dict[str, DiffBackend] = {
+    backend.name: backend
+    for backend in [Pygit2Backend(), GitCliBackend(), GitPythonBackend()]
+}
+
+
+def get_diff_backend(
+    backend: Optional[Union[str, DiffBackend]], workers: Optional[int] = None
+) -> DiffBackend:
+    """
+    Looks up a diff backend by name, passing backends through unchanged.
+
+    Args:
+        backend (Optional[Union[str, DiffBackend]]): A backend, the name of a
+            built-in backend, or None for the pygit2 backend.
+        workers (Optional[int]): Number of shards to diff concurrently. Parallel
+            diffing runs git processes from a thread pool, so it uses the git-cli
+            backend, which is also chosen when no backend is given.
+
+    Returns:
+        DiffBackend: The diff backend.
+    """
+    if workers is not None:
+        backend = get_diff_backend("git-cli" if backend is None else backend)
+        if not isinstance(backend, GitCliBackend):
+            raise ValueError(
+                f"Parallel diffing is only supported by the git-cli backend, "
+                f"not {backend.name!r}."
+            )
+        return GitCliBackend(git_executable=backend.git_executable, workers=workers)
+
+    if backend is None:
+        return DIFF_BACKENDS["pygit2"]
+    if isinstance(backend, DiffBackend):
+        return backend
+    if backend not in DIFF_BACKENDS:
+        raise ValueError(
+            f"Unknown diff backend {backend!r}. "
+            f"Available backends are: {sorted(DIFF_BACKENDS)}."
+        )
+    return DIFF_BACKENDS[backend]
@@ -0,0 +1,292 @@
+"""
+This module provides a persistent content-addressed cache of diff statistics
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# environment variables which enable a default cache for every session
+DIFF_CACHE_ENV = "ALMANACK_DIFF_CACHE"
+DIFF_CACHE_MAX_BYTES_ENV = "ALMANACK_DIFF_CACHE_MAX_BYTES"
+
+# SQLite limits the number of parameters in a single statement
+_BATCH_SIZE = 500
+
+_default_cache: Optional["DiffStatsCache"] = None
+
+
+def _hash_key(parts: Tuple) -> str:
+    """
+    Hashes the parts of a cache key into a fixed-length key.
+    """
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class ObjectCache:
+    """
+    A persistent SQLite cache of values derived from immutable Git objects,
+    keyed by object IDs and the options which affect the values.
+
+    Object IDs identify content, so entries are shared across forks,
+    re-runs and overlapping windows of the same history. Entries are evicted
+    least recently used first when the cache grows beyond max_bytes.
+
+    The cache uses SQLite's write-ahead log, so several processes may share
+    a cache file. Subclasses store their entries in their own table.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the cache database file.
+        max_bytes (Optional[int]): Maximum size of the cache database in bytes.
+            Defaults to no limit.
+    """
+
+    # name of the table holding this cache's entries
+    _table = "objects"
+
+    def __init__(
+        self, path: Union[str, pathlib.Path], max_bytes: Optional[int] = None
+    ) -> None:
+        self.path = pathlib.Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self._table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self._table}_accessed ON {self._table} (accessed)"
+            )
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.path)!r})"
+
+    def __enter__(self) -> "ObjectCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the cache database.
+        """
+        self._connection.close()
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Looks up entries by key, marking the entries found as recently used.
+        """
+        found = {}
+        for start in range(0, len(keys), _BATCH_SIZE):
+            batch = keys[start : start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._connection.execute(
+                f"SELECT key, value FROM {self._table} WHERE key IN ({placeholders})",  # nosec B608
+                batch,
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+            if rows:
+                with self._connection:
+                    self._connection.execute(
+                        f"UPDATE {self._table} SET accessed = ? WHERE key IN ({placeholders})",  # nosec B608
+                        [time.time(), *batch],
+                    )
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def _put_many(self, entries: Iterable[Tuple[str, Any]]) -> None:
+        """
+        Stores entries, then evicts the least recently used entries
+        when the cache is over its size limit.
+        """
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, accessed) VALUES (?, ?, ?)",  # nosec B608
+                ((key, json.dumps(value), now) for key, value in entries),
+            )
+        if self.max_bytes is not None:
+            self.evict()
+
+    def size(self) -> int:
+        """
+        Returns the size in bytes of the pages which hold cache entries.
+        """
+        page_size, page_count, freelist_count = (
+            self._connection.execute(f"PRAGMA {pragma}").fetchone()[0]
+            for pragma in ("page_size", "page_count", "freelist_count")
+        )
+        return page_size * (page_count - freelist_count)
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache fits within
+        max_bytes, leaving room for new entries.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        if self.max_bytes is None or self.size() <= self.max_bytes:
+            return 0
+
+        removed = 0
+        # Evict down to 90% of the budget so that eviction is not run on every write
+        while self.size() > self.max_bytes * 0.9:
+            entries = self._connection.execute(
+                f"SELECT COUNT(*) FROM {self._table}"  # nosec B608
+            )
+            count = entries.fetchone()[0]
+            if not count:
+                break
+            with self._connection:
+                cursor = self._connection.execute(
+                    f"""
+                    DELETE FROM {self._table} WHERE key IN (
+                        SELECT key FROM {self._table} ORDER BY accessed LIMIT ?
+                    )
+                    """,  # nosec B608
+                    (max(1, count // 10),),
+                )
+            removed += cursor.rowcount
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters of this cache instance along with
+        the number of entries and size of the cache.
+
+        Returns:
+            Dict[str, int]: The "hits", "misses", "evictions", "entries" and "bytes".
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self._connection.execute(
+                f"SELECT COUNT(*) FROM {self._table}"  # nosec B608
+            ).fetchone()[0],
+            "bytes": self.size(),
+        }
+
+
+class DiffStatsCache(ObjectCache):
+    """
+    A persistent cache of diff statistics keyed by tree and blob OIDs.
+
+    Two kinds of entries are stored: the per-file statistics of a whole
+    (tree, tree) diff, and the line counts of a single (blob, blob) pair.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the cache database file.
+        max_bytes (Optional[int]): Maximum size of the cache database in bytes.
+            Defaults to no limit.
+
+    Example:
+        >>> with DiffStatsCache("~/.cache/almanack/diff-stats.sqlite") as cache:
+        ...     data = compute_repo_data("path/to/repo", diff_cache=cache)
+        ...     print(cache.hits, cache.misses)
+    """
+
+    _table = "diff_stats"
+
+    def get_tree_stats(self, key_parts: Tuple) -> Optional[Dict[str, Dict[str, int]]]:
+        """
+        Looks up the per-file statistics of a whole diff.
+
+        Args:
+            key_parts (Tuple): The tree OIDs of both sides and the options
+                which affect the statistics.
+
+        Returns:
+            Optional[Dict[str, Dict[str, int]]]: The statistics, or None on a miss.
+        """
+        key = _hash_key(("tree", *key_parts))
+        return self._get_many([key]).get(key)
+
+    def put_tree_stats(
+        self, key_parts: Tuple, stats: Dict[str, Dict[str, int]]
+    ) -> None:
+        """
+        Stores the per-file statistics of a whole diff.
+
+        Args:
+            key_parts (Tuple): The tree OIDs of both sides and the options
+                which affect the statistics.
+            stats (Dict[str, Dict[str, int]]): The statistics to store.
+        """
+        self._put_many([(_hash_key(("tree", *key_parts)), stats)])
+
+    def get_blob_stats(
+        self, keys_parts: List[Tuple]
+    ) -> List[Optional[Tuple[int, int]]]:
+        """
+        Looks up the line counts of many (blob, blob) pairs in batches.
+
+        Args:
+            keys_parts (List[Tuple]): The blob OIDs of both sides of each pair and
+                the options which affect the line counts.
+
+        Returns:
+            List[Optional[Tuple[int, int]]]: The additions and deletions of each
+            pair, or None for pairs which are not cached.
+        """
+        keys = [_hash_key(("blob", *key_parts)) for key_parts in keys_parts]
+        found = self._get_many(keys)
+        return [tuple(found[key]) if key in found else None for key in keys]
+
+    def put_blob_stats(self, entries: List[Tuple[Tuple, Tuple[int, int]]]) -> None:
+        """
+        Stores the line counts of many (blob, blob) pairs.
+
+        Args:
+            entries (List[Tuple[Tuple, Tuple[int, int]]]): The key parts and the
+                additions and deletions of each pair.
+        """
+        self._put_many(
+            (_hash_key(("blob", *key_parts)), list(counts))
+            for key_parts, counts in entries
+        )
+
+
+def get_default_diff_cache() -> Optional[DiffStatsCache]:
+    """
+    Returns the cache named by the ALMANACK_DIFF_CACHE environment variable,
+    limited to ALMANACK_DIFF_CACHE_MAX_BYTES when set, which lets every
+    session use a cache without changes to callers.
+
+    Returns:
+        Optional[DiffStatsCache]: The default cache, or None when it is not configured.
+    """
+    global _default_cache  # noqa: PLW0603
+    cache_path = os.environ.get(DIFF_CACHE_ENV)
+    if not cache_path:
+        return None
+    if (
+        _default_cache is None
+        or _default_cache.path != pathlib.Path(cache_path).expanduser()
+    ):
+        max_bytes = os.environ.get(DIFF_CACHE_MAX_BYTES_ENV)
+        _default_cache = DiffStatsCache(
+            cache_path, max_bytes=int(max_bytes) if max_bytes else None
+        )
+    return _default_cache
@@ -0,0 +1,272 @@
+"""
+This module filters the paths and blobs considered when diffing commits
+"""
+
+import fnmatch
+import posixpath
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pygit2
+
+# characters which make a pathspec a glob rather than a literal path
+GLOB_CHARACTERS = "*?["
+
+# built-in exclude pathspecs for commonly vendored, generated and binary paths
+DIFF_FILTER_PRESETS: Dict[str, List[str]] = {
+    "vendored": [
+        f"{prefix}{directory}/*"
+        for directory in [
+            "vendor",
+            "vendors",
+            "third_party",
+            "thirdparty",
+            "third-party",
+            "node_modules",
+            "bower_components",
+            "site-packages",
+            ".venv",
+            "venv",
+        ]
+        for prefix in ["", "*/"]
+    ],
+    "generated": [
+        "*.min.js",
+        "*.min.css",
+        "*.js.map",
+        "*.css.map",
+        "*_pb2.py",
+        "*_pb2_grpc.py",
+        "*.pb.go",
+        "*.pyc",
+        "package-lock.json",
+        "*/package-lock.json",
+        "yarn.lock",
+        "*/yarn.lock",
+        "poetry.lock",
+        "*/poetry.lock",
+        "Cargo.lock",
+        "*/Cargo.lock",
+    ]
+    + [
+        f"{prefix}{directory}/*"
+        for directory in ["dist", "__pycache__", ".ipynb_checkpoints"]
+        for prefix in ["", "*/"]
+    ],
+    "binary": [
+        f"*.{extension}"
+        for extension in [
+            "png",
+            "jpg",
+            "jpeg",
+            "gif",
+            "ico",
+            "pdf",
+            "zip",
+            "gz",
+            "tgz",
+            "bz2",
+            "xz",
+            "tar",
+            "jar",
+            "whl",
+            "so",
+            "dll",
+            "dylib",
+            "exe",
+            "parquet",
+            "h5",
+            "hdf5",
+            "pkl",
+            "npy",
+            "npz",
+        ]
+    ],
+}
+
+
+def _is_literal(pathspec: str) -> bool:
+    """
+    Checks whether a pathspec is a literal path rather than a glob.
+    """
+    return not any(character in pathspec for character in GLOB_CHARACTERS)
+
+
+def _normalize_pathspec(pathspec: str) -> str:
+    """
+    Normalizes a pathspec relative to the repository root, as git does:
+    leading and trailing "/" and "./" components are dropped and literal
+    paths are collapsed with posixpath.normpath. The root itself, such as
+    "." or "/", becomes the empty string.
+    """
+    if not _is_literal(pathspec):
+        return re.sub(r"\A(?:\.?/)+", "", pathspec)
+    normalized = posixpath.normpath(pathspec.strip("/") or ".")
+    return "" if normalized == "." else normalized
+
+
+def _compile_pathspecs(pathspecs: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    Compiles pathspecs into a single regular expression, so that each
+    path is checked once regardless of the number of pathspecs.
+
+    Pathspecs follow `git diff -- <pathspec>` semantics: they are relative
+    to the repository root, a literal path matches itself and everything
+    beneath it, and glob wildcards also match across "/". The root, such
+    as ".", matches every path.
+    """
+    patterns = []
+    for pathspec in map(_normalize_pathspec, pathspecs):
+        if not _is_literal(pathspec):
+            patterns.append(fnmatch.translate(pathspec))
+        elif pathspec:
+            patterns.append(re.escape(pathspec) + r"(?:/.*)?\Z")
+        else:
+            patterns.append(r".*\Z")
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.DOTALL)
+
+
+class DiffFilter:
+    """
+    Include and exclude pathspecs and a maximum blob size applied to diffs
+    before patches are generated, so that filtered paths and large blobs
+    are never loaded.
+
+    Args:
+        include (Optional[List[str]]): Pathspecs to include. When empty, all
+            paths are included. When every include pathspec is a literal path,
+            only the matching subtrees are diffed.
+        exclude (Optional[List[str]]): Pathspecs to exclude.
+        max_blob_size (Optional[int]): Maximum size in bytes of either side
+            of a changed file. Larger files are skipped.
+        presets (Optional[List[str]]): Names of built-in exclude pathspec
+            presets from DIFF_FILTER_PRESETS ("vendored", "generated", "binary").
+
+    Example:
+        >>> DiffFilter(include=["src"], presets=["generated"], max_blob_size=1024**2)
+    """
+
+    def __init__(
+        self,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_blob_size: Optional[int] = None,
+        presets: Optional[List[str]] = None,
+    ) -> None:
+        unknown_presets = set(presets or []) - set(DIFF_FILTER_PRESETS)
+        if unknown_presets:
+            raise ValueError(
+                f"Unknown diff filter presets: {sorted(unknown_presets)}. "
+                f"Available presets are: {sorted(DIFF_FILTER_PRESETS)}."
+            )
+
+        self.include = tuple(include or ())
+        self.exclude = tuple(exclude or ()) + tuple(
+            pathspec
+            for preset in (presets or [])
+            for pathspec in DIFF_FILTER_PRESETS[preset]
+        )
+        self.max_blob_size = max_blob_size
+        self._include_regex = _compile_pathspecs(self.include)
+        self._exclude_regex = _compile_pathspecs(self.exclude)
+
+    @property
+    def key(self) -> Tuple:
+        """
+        A hashable key identifying the filter, used to cache filtered results.
+        """
+        return (self.include, self.exclude, self.max_blob_size)
+
+    def tree_prefixes(self) -> Optional[List[str]]:
+        """
+        Returns the subtrees to diff when every include pathspec is a literal
+        path, which lets the diff skip all other trees entirely. Including the
+        root, such as ".", diffs the whole tree.
+
+        Returns:
+            Optional[List[str]]: The subtree paths, or None when the whole tree
+            must be diffed.
+        """
+        if not self.include or not all(map(_is_literal, self.include)):
+            return None
+
+        prefixes = sorted(set(map(_normalize_pathspec, self.include)))
+        if "" in prefixes:
+            return None
+        # Drop prefixes nested within other prefixes to avoid diffing paths twice
+        return [
+            prefix
+            for prefix in prefixes
+            if not any(
+                prefix.startswith(f"{other}/") for other in prefixes if other != prefix
+            )
+        ]
+
+    def matches(self, path: str) -> bool:
+        """
+        Checks whether a path is included and not excluded.
+
+        Args:
+            path (str): The path relative to the repository root.
+
+        Returns:
+            bool: True if the path passes the filter.
+        """
+        if self._include_regex is not None and not self._include_regex.match(path):
+            return False
+        return self._exclude_regex is None or not self._exclude_regex.match(path)
+
+    def accepts(
+        self, repo: pygit2.Repository, path: str, delta: pygit2.DiffDelta
+    ) -> bool:
+        """
+        Checks whether a changed file passes the filter, reading only the
+        object headers of its blobs to check their sizes.
+
+        Args:
+            repo (pygit2.Repository): The Git repository.
+            path (str): The path of the changed file relative to the repository root.
+            delta (pygit2.DiffDelta): The delta for the changed file.
+
+        Returns:
+            bool: True if the changed file should be diffed.
+        """
+        if not self.matches(path):
+            return False
+        return self.within_size(
+            repo, [diff_file.id for diff_file in (delta.old_file, delta.new_file)]
+        )
+
+    def within_size(
+        self, repo: pygit2.Repository, blob_ids: Iterable[Optional[pygit2.Oid]]
+    ) -> bool:
+        """
+        Checks whether blobs are within the maximum blob size, reading only
+        their object headers.
+
+        Args:
+            repo (pygit2.Repository): The Git repository.
+            blob_ids (Iterable[Optional[pygit2.Oid]]): The blobs on each side of a
+                changed file. None or zero OIDs mark missing sides of added or
+                deleted files.
+
+        Returns:
+            bool: True if no blob is larger than the maximum blob size.
+        """
+        if self.max_blob_size is None:
+            return True
+
+        for blob_id in blob_ids:
+            # Skip missing sides of added or deleted files
+            if blob_id is None or blob_id.raw == bytes(len(blob_id.raw)):
+                continue
+            try:
+                _, size = repo.odb.read_header(blob_id)
+            except KeyError:
+                # Objects outside the repository (for example, submodule commits)
+                continue
+            if size > self.max_blob_size:
+                return False
+        return True
@@ -0,0 +1,82 @@
+"""
+This module groups the options which control how commits are diffed
+"""
+
+from typing import NamedTuple, Optional, Union
+
+from .diff_backends import DiffBackend, get_diff_backend
+from .diff_cache import DiffStatsCache
+from .diff_filters import DiffFilter
+from .diff_profiles import DiffProfile, get_diff_profile
+
+
+class DiffOptions(NamedTuple):
+    """
+    The options applied whenever an analysis diffs commits.
+
+    Every option defaults to None, which keeps the default behaviour, so
+    callers only name the options they change.
+
+    Attributes:
+        diff_filter (Optional[DiffFilter]): Include and exclude pathspecs and a
+            maximum blob size applied to each diff before patches are generated.
+        diff_profile (Optional[Union[str, DiffProfile]]): The diff options profile
+            (context lines, whitespace handling, rename and copy detection) or the
+            name of a built-in profile from DIFF_PROFILES.
+        backend (Optional[Union[str, DiffBackend]]): The backend which computes
+            diff statistics or the name of a built-in backend from DIFF_BACKENDS.
+            Defaults to pygit2.
+        workers (Optional[int]): Opt-in number of pathspec shards of each diff to
+            run concurrently, for very large repositories. Results are identical
+            to a single diff. Requires the git-cli backend, which is used when no
+            backend is given.
+        cache (Optional[DiffStatsCache]): A persistent cache of diff statistics
+            keyed by tree and blob OIDs, used by sessions opened from a path.
+            Defaults to the cache named by the ALMANACK_DIFF_CACHE environment
+            variable, if any.
+
+    Example:
+        >>> options = DiffOptions(diff_profile="renames", backend="git-cli")
+        >>> data = compute_repo_data("path/to/repo", options)
+    """
+
+    diff_filter: Optional[DiffFilter] = None
+    diff_profile: Optional[Union[str, DiffProfile]] = None
+    backend: Optional[Union[str, DiffBackend]] = None
+    workers: Optional[int] = None
+    cache: Optional[DiffStatsCache] = None
+
+    def get_profile(self) -> DiffProfile:
+        """
+        Looks up the diff profile, which defaults to the "default" profile.
+
+        Returns:
+            DiffProfile: The diff profile.
+        """
+        return get_diff_profile(self.diff_profile)
+
+    def get_backend(self) -> DiffBackend:
+        """
+        Looks up the diff backend, sharding diffs across the workers if any.
+
+        Returns:
+            DiffBackend: The diff backend.
+        """
+        return get_diff_backend(self.backend, self.workers)
+
+
+# the options used when none are given
+DEFAULT_DIFF_OPTIONS = DiffOptions()
+
+
+def get_diff_options(options: Optional[DiffOptions]) -> DiffOptions:
+    """
+    Passes diff options through, defaulting to DEFAULT_DIFF_OPTIONS.
+
+    Args:
+        options (Optional[DiffOptions]): The diff options, or None.
+
+    Returns:
+        DiffOptions: The diff options.
+    """
+    return DEFAULT_DIFF_OPTIONS if options is None else options
@@ -0,0 +1,183 @@
+"""
+This module defines named profiles of options used when diffing commits
+"""
+
+import dataclasses
+from typing import Dict, Optional, Tuple, Union
+
+import pygit2
+
+# diff flags for each whitespace handling mode
+WHITESPACE_FLAGS: Dict[str, pygit2.enums.DiffOption] = {
+    "none": pygit2.enums.DiffOption.NORMAL,
+    "all": pygit2.enums.DiffOption.IGNORE_WHITESPACE,
+    "change": pygit2.enums.DiffOption.IGNORE_WHITESPACE_CHANGE,
+    "eol": pygit2.enums.DiffOption.IGNORE_WHITESPACE_EOL,
+}
+
+
+@dataclasses.dataclass(frozen=True, repr=False)
+class DiffProfile:
+    """
+    A named set of options applied whenever commits are diffed.
+
+    Rename and copy detection keep a moved file from counting as a full
+    deletion plus a full addition. Similarity search grows quadratically with
+    the number of added and deleted files, so rename_limit bounds its cost:
+    when there are more candidates than the limit, libgit2 skips inexact
+    rename detection for the diff rather than running an unbounded search.
+
+    Args:
+        name (str): The name of the profile.
+        context_lines (int): Unchanged lines included around each hunk. Line
+            counts do not depend on context, so fewer lines means less work.
+        interhunk_lines (int): Unchanged lines between hunks before they are merged.
+        whitespace (str): Whitespace handling, one of "none", "all"
+            (ignore all whitespace), "change" (ignore changes in the amount of
+            whitespace) or "eol" (ignore whitespace at the end of lines).
+        detect_renames (bool): Whether to detect renamed files.
+        detect_copies (bool): Whether to detect copied files.
+        rename_threshold (int): Similarity percentage for a rename or copy.
+        rename_limit (int): Maximum number of rename or copy candidates to compare.
+        patience (bool): Whether to use the patience diff algorithm.
+    """
+
+    name: str
+    context_lines: int = 3
+    interhunk_lines: int = 0
+    whitespace: str = "none"
+    detect_renames: bool = False
+    detect_copies: bool = False
+    rename_threshold: int = 50
+    rename_limit: int = 1000
+    patience: bool = False
+
+    def __post_init__(self) -> None:
+        if self.whitespace not in WHITESPACE_FLAGS:
+            raise ValueError(
+                f"Unknown whitespace handling {self.whitespace!r}. "
+                f"Available options are: {sorted(WHITESPACE_FLAGS)}."
+            )
+
+    def __repr__(self) -> str:
+        return f"DiffProfile({self.name!r})"
+
+    @property
+    def key(self) -> Tuple:
+        """
+        A hashable key identifying the options, used to cache diffs.
+        """
+        return (
+            self.context_lines,
+            self.interhunk_lines,
+            self.whitespace,
+            self.detect_renames,
+            self.detect_copies,
+            self.rename_threshold,
+            self.rename_limit,
+            self.patience,
+        )
+
+    @property
+    def flags(self) -> pygit2.enums.DiffOption:
+        """
+        The diff option flags for the profile.
+        """
+        flags = WHITESPACE_FLAGS[self.whitespace]
+        if self.patience:
+            flags |= pygit2.enums.DiffOption.PATIENCE
+        return flags
+
+    def diff(
+        self,
+        repo: pygit2.Repository,
+        old: Optional[Union[pygit2.Commit, pygit2.Tree]],
+        new: Optional[Union[pygit2.Commit, pygit2.Tree]],
+    ) -> pygit2.Diff:
+        """
+        Diffs two commits or trees using the profile options.
+
+        Args:
+            repo (pygit2.Repository): The Git repository.
+            old (Optional[Union[pygit2.Commit, pygit2.Tree]]): The old side,
+                or None for the empty tree.
+            new (Optional[Union[pygit2.Commit, pygit2.Tree]]): The new side,
+                or None for the empty tree.
+
+        Returns:
+            pygit2.Diff: The diff, with renames and copies marked when requested.
+        """
+        options = {
+            "flags": self.flags,
+            "context_lines": self.context_lines,
+            "interhunk_lines": self.interhunk_lines,
+        }
+        if old is None:
+            # Diff the empty tree to the new side
+            diff = new.peel(pygit2.Tree).diff_to_tree(swap=True, **options)
+        elif new is None:
+            # Diff the old side to the empty tree
+            diff = old.peel(pygit2.Tree).diff_to_tree(**options)
+        else:
+            diff = repo.diff(old, new, **options)
+
+        if self.detect_renames or self.detect_copies:
+            find_flags = pygit2.enums.DiffFind.FIND_RENAMES
+            if self.detect_copies:
+                find_flags |= pygit2.enums.DiffFind.FIND_COPIES
+            if self.whitespace != "none":
+                find_flags |= pygit2.enums.DiffFind.FIND_IGNORE_WHITESPACE
+            diff.find_similar(
+                flags=find_flags,
+                rename_threshold=self.rename_threshold,
+                copy_threshold=self.rename_threshold,
+                rename_limit=self.rename_limit,
+            )
+        return diff
+
+
+# built-in diff profiles
+DIFF_PROFILES: Dict[str, DiffProfile] = {
+    profile.name: profile
+    for profile in [
+        # libgit2 defaults, matching `repo.diff(a, b)`
+        DiffProfile("default"),
+        # no context lines, the cheapest way to count changed lines
+        DiffProfile("fast", context_lines=0),
+        # ignore changes in whitespace only
+        DiffProfile("ignore-whitespace", context_lines=0, whitespace="change"),
+        # detect renamed files so moves do not count as full rewrites
+        DiffProfile("renames", context_lines=0, detect_renames=True),
+        # detect renames and copies while ignoring whitespace changes
+        DiffProfile(
+            "thorough",
+            context_lines=0,
+            whitespace="change",
+            detect_renames=True,
+            detect_copies=True,
+        ),
+    ]
+}
+
+
+def get_diff_profile(profile: Optional[Union[str, DiffProfile]]) -> DiffProfile:
+    """
+    Looks up a diff profile by name, passing profiles through unchanged.
+
+    Args:
+        profile (Optional[Union[str, DiffProfile]]): A profile, the name of a
+            built-in profile, or None for the default profile.
+
+    Returns:
+        DiffProfile: The diff profile.
+    """
+    if profile is None:
+        return DIFF_PROFILES["default"]
+    if isinstance(profile, DiffProfile):
+        return profile
+    if profile not in DIFF_PROFILES:
+        raise ValueError(
+            f"Unknown diff profile {profile!r}. "
+            f"Available profiles are: {sorted(DIFF_PROFILES)}."
+        )
+    return DIFF_PROFILES[profile]
@@ -0,0 +1,173 @@
+"""
+This module aggregates entropy by directory using a path prefix tree
+"""
+
+import math
+from typing import Any, Dict, Iterator, List, Optional
+
+# key of the repository root in directory entropy results
+ROOT_DIRECTORY = "."
+
+
+class DirectoryNode:
+    """
+    A directory in a path prefix tree of changed files, holding the change
+    statistics of the files within it and, after aggregation, within all of
+    its subdirectories.
+
+    Args:
+        path (str): The path of the directory relative to the repository root.
+        depth (int): Number of directories between the root and this directory.
+    """
+
+    def __init__(self, path: str, depth: int) -> None:
+        self.path = path
+        self.depth = depth
+        self.children: Dict[str, "DirectoryNode"] = {}
+        self.number_of_files = 0
+        self.lines_changed = 0
+        # Sum of the repository-relative entropy of each file
+        self.entropy = 0.0
+        # Sum of c * log2(c) over the lines changed in each file, from which the
+        # entropy of the directory's own distribution of changes is derived
+        self.change_information = 0.0
+
+    def __repr__(self) -> str:
+        return f"DirectoryNode({self.path!r})"
+
+    def child(self, name: str) -> "DirectoryNode":
+        """
+        Returns the named subdirectory, creating it when it does not exist.
+        """
+        if name not in self.children:
+            path = name if self.path == ROOT_DIRECTORY else f"{self.path}/{name}"
+            self.children[name] = DirectoryNode(path, self.depth + 1)
+        return self.children[name]
+
+    @property
+    def normalized_entropy(self) -> float:
+        """
+        The entropy of the distribution of changes among the files within
+        the directory, normalized by their number, as calculated for a whole
+        repository by calculate_aggregate_entropy.
+
+        With total changes T, H = log2(T) - sum(c * log2(c)) / T, which only
+        needs sums that are aggregated bottom-up.
+        """
+        if not self.lines_changed or not self.number_of_files:
+            return 0.0
+        entropy = (
+            math.log2(self.lines_changed) - self.change_information / self.lines_changed
+        )
+        # Rounding may leave a tiny negative value when one file has every change
+        return max(entropy, 0.0) / self.number_of_files
+
+    def iter_nodes(self, max_depth: Optional[int] = None) -> Iterator["DirectoryNode"]:
+        """
+        Yields this directory and its subdirectories depth first, with the
+        subdirectories of each directory ordered by descending entropy.
+
+        Args:
+            max_depth (Optional[int]): Deepest directories to yield, where the
+                root has depth 0. Defaults to all directories.
+
+        Yields:
+            DirectoryNode: The directories in tree order.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            if max_depth is not None and node.depth >= max_depth:
+                continue
+            # Push in reverse so that the highest entropy subdirectory is next
+            stack.extend(
+                sorted(
+                    node.children.values(),
+                    key=lambda child: (child.entropy, child.path),
+                )
+            )
+
+
+def build_directory_tree(
+    loc_changes: Dict[str, int], file_entropy: Dict[str, float]
+) -> DirectoryNode:
+    """
+    Inserts each changed file into a path prefix tree once, then aggregates the
+    statistics of every directory bottom-up in a single pass over the tree.
+
+    Args:
+        loc_changes (Dict[str, int]): Lines changed (added and deleted) in each file.
+        file_entropy (Dict[str, float]): The normalized entropy of each file.
+
+    Returns:
+        DirectoryNode: The root of the tree, holding the repository totals.
+    """
+    root = DirectoryNode(ROOT_DIRECTORY, 0)
+    for file_name, changed in loc_changes.items():
+        # Record each file's statistics on its parent directory
+        node = root
+        for name in file_name.split("/")[:-1]:
+            node = node.child(name)
+        node.number_of_files += 1
+        node.lines_changed += changed
+        node.entropy += file_entropy.get(file_name, 0.0)
+        if changed:
+            node.change_information += changed * math.log2(changed)
+
+    # Directories are created after their parents, so a reversed pre-order
+    # visits every subdirectory before its parent
+    nodes: List[DirectoryNode] = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.children.values())
+    for node in reversed(nodes):
+        for child in node.children.values():
+            node.number_of_files += child.number_of_files
+            node.lines_changed += child.lines_changed
+            node.entropy += child.entropy
+            node.change_information += child.change_information
+    return root
+
+
+def calculate_directory_entropy(
+    loc_changes: Dict[str, int],
+    file_entropy: Dict[str, float],
+    max_depth: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Calculates the churn and entropy of every directory containing changed files.
+
+    Each directory reports:
+        - "depth": Number of directories between the root and the directory.
+        - "number_of_files": Number of changed files within the directory.
+        - "lines_changed": Lines added and deleted within the directory.
+        - "entropy": Sum of the entropy of the files within the directory, which
+          is the directory's share of the repository's entropy.
+        - "normalized_entropy": The normalized entropy of the changes among the
+          files within the directory, as if the directory were a repository.
+
+    Args:
+        loc_changes (Dict[str, int]): Lines changed (added and deleted) in each file.
+        file_entropy (Dict[str, float]): The normalized entropy of each file.
+        max_depth (Optional[int]): Deepest directories to include, where the root
+            has depth 0. Defaults to all directories.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The statistics of each directory keyed by its
+        path, with the repository root under ".", in tree order.
+    """
+    return {
+        node.path: {
+            "depth": node.depth,
+            "number_of_files": node.number_of_files,
+            "lines_changed": node.lines_changed,
+            "entropy": node.entropy,
+            "normalized_entropy": node.normalized_entropy,
+        }
+        for node in build_directory_tree(loc_changes, file_entropy).iter_nodes(
+            max_depth
+        )
+    }
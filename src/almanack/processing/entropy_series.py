@@ -0,0 +1,355 @@
+"""
+This module calculates entropy time series over windows of a repository's history
+"""
+
+import collections
+import fnmatch
+import pathlib
+from datetime import datetime, timezone
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import pygit2
+
+from .calculate_entropy import EntropyProfile
+from .diff_options import DiffOptions, get_diff_options
+from .repo_session import RepoSession, open_session
+
+if TYPE_CHECKING:
+    from .churn_index import ChurnIndex
+
+# kinds of windows an entropy series can be split into
+WINDOW_KINDS = ("commits", "month", "release")
+
+
+class WindowSpec(NamedTuple):
+    """
+    How an entropy series splits the history into windows.
+
+    Attributes:
+        kind (str): How to split the history: "commits" (windows of size
+            commits), "month" (calendar months in UTC) or "release" (commits up
+            to and including each tagged commit, with untagged trailing commits
+            in a "HEAD" window).
+        size (int): Number of commits in each "commits" window.
+        step (Optional[int]): Number of commits between the starts of "commits"
+            windows. Defaults to size, which gives non-overlapping windows, while
+            smaller steps give rolling windows.
+        tag_pattern (Optional[str]): Glob pattern selecting the release tags,
+            for example "v*". Defaults to all tags.
+    """
+
+    kind: str = "month"
+    size: int = 100
+    step: Optional[int] = None
+    tag_pattern: Optional[str] = None
+
+
+def _commit_date(commit: pygit2.Commit) -> datetime:
+    """
+    Returns the commit time as a UTC datetime.
+    """
+    return datetime.fromtimestamp(commit.commit_time, tz=timezone.utc)
+
+
+def iter_commit_diff_stats(
+    session: RepoSession, diff_options: Optional[DiffOptions] = None
+) -> Iterator[Tuple[pygit2.Commit, Dict[str, Dict[str, int]]]]:
+    """
+    Walks the first-parent history from the first commit to HEAD once, diffing
+    each commit against its parent to find the lines added and deleted in
+    each file.
+
+    Merge commits are diffed against their first parent, so changes merged from
+    a branch count once. Root commits are the baseline of the history, as in
+    compute_repo_data, so they have no changes.
+
+    Args:
+        session (RepoSession): The session for the repository.
+        diff_options (Optional[DiffOptions]): The diff filter, profile and backend
+            applied to each diff.
+
+    Yields:
+        Tuple[pygit2.Commit, Dict[str, Dict[str, int]]]: Each commit, oldest first,
+        with the "additions" and "deletions" of each file it edited.
+    """
+    walker = session.repo.walk(
+        session.get_head_commit().id,
+        pygit2.enums.SortMode.TOPOLOGICAL | pygit2.enums.SortMode.REVERSE,
+    )
+    walker.simplify_first_parent()
+    for commit in walker:
+        if not commit.parents:
+            yield commit, {}
+            continue
+        # A short-lived session per commit pair keeps cached diffs from
+        # accumulating over long histories, while sharing the persistent cache
+        with RepoSession(
+            session.repo, session.diff_cache, session.profiler
+        ) as pair_session:
+            yield commit, pair_session.get_diff_stats(
+                commit.parents[0], commit, diff_options
+            )
+
+
+def iter_commit_churn(
+    session: RepoSession, diff_options: Optional[DiffOptions] = None
+) -> Iterator[Tuple[pygit2.Commit, Dict[str, int]]]:
+    """
+    Walks the first-parent history from the first commit to HEAD once, finding
+    the lines changed in each file by each commit (see iter_commit_diff_stats).
+
+    Args:
+        session (RepoSession): The session for the repository.
+        diff_options (Optional[DiffOptions]): The diff filter, profile and backend
+            applied to each diff.
+
+    Yields:
+        Tuple[pygit2.Commit, Dict[str, int]]: Each commit, oldest first, with the
+        lines changed (added and removed) in each file it edited.
+    """
+    for commit, diff_stats in iter_commit_diff_stats(session, diff_options):
+        yield commit, {
+            file_name: file_stats["additions"] + file_stats["deletions"]
+            for file_name, file_stats in diff_stats.items()
+        }
+
+
+def _release_tags(
+    repo: pygit2.Repository, tag_pattern: Optional[str]
+) -> Dict[pygit2.Oid, str]:
+    """
+    Maps the commits pointed to by tags to their tag names, joining the
+    names of commits with several tags.
+    """
+    tags: Dict[pygit2.Oid, List[str]] = {}
+    for reference_name in repo.references:
+        if not reference_name.startswith("refs/tags/"):
+            continue
+        tag_name = reference_name[len("refs/tags/") :]
+        if tag_pattern is not None and not fnmatch.fnmatch(tag_name, tag_pattern):
+            continue
+        try:
+            commit = repo.references[reference_name].peel(pygit2.Commit)
+        except (pygit2.GitError, ValueError):
+            # Tags of trees or blobs do not mark releases
+            continue
+        tags.setdefault(commit.id, []).append(tag_name)
+    return {commit_id: ", ".join(sorted(names)) for commit_id, names in tags.items()}
+
+
+class _WindowChurn:
+    """
+    Running per-file churn of the commits in a window. Each commit's churn is
+    folded into the window's totals and dropped, except in rolling windows,
+    which keep the churn of their commits to remove the oldest incrementally.
+    """
+
+    def __init__(self, rolling: bool = False) -> None:
+        self.rolling = rolling
+        self.loc_changes: Dict[str, int] = {}
+        self.start_commit: Optional[pygit2.Commit] = None
+        self.end_commit: Optional[pygit2.Commit] = None
+        self.number_of_commits = 0
+        # Kept by rolling windows only: the churn of each commit in the window
+        # and the number of commits in the window which edited each file
+        self.commits: Deque[Tuple[pygit2.Commit, Dict[str, int]]] = collections.deque()
+        self.edits: Dict[str, int] = {}
+
+    def add(self, commit: pygit2.Commit, loc_changes: Dict[str, int]) -> None:
+        if self.start_commit is None:
+            self.start_commit = commit
+        self.end_commit = commit
+        self.number_of_commits += 1
+        for file_name, changed in loc_changes.items():
+            self.loc_changes[file_name] = self.loc_changes.get(file_name, 0) + changed
+        if self.rolling:
+            self.commits.append((commit, loc_changes))
+            for file_name in loc_changes:
+                self.edits[file_name] = self.edits.get(file_name, 0) + 1
+
+    def pop_oldest(self) -> None:
+        _, loc_changes = self.commits.popleft()
+        self.number_of_commits -= 1
+        self.start_commit = self.commits[0][0] if self.commits else None
+        for file_name, changed in loc_changes.items():
+            self.edits[file_name] -= 1
+            if self.edits[file_name]:
+                self.loc_changes[file_name] -= changed
+            else:
+                # Drop files which are no longer edited within the window
+                del self.edits[file_name]
+                del self.loc_changes[file_name]
+
+    def summarize(self, label: str, include_files: bool) -> Dict[str, Any]:
+        """
+        Calculates the entropy of the window's churn.
+        """
+        profile = EntropyProfile(self.loc_changes)
+        start_commit, end_commit = self.start_commit, self.end_commit
+        window = {
+            "window": label,
+            "start_commit": str(start_commit.id),
+            "end_commit": str(end_commit.id),
+            "start_date": _commit_date(start_commit).date().isoformat(),
+            "end_date": _commit_date(end_commit).date().isoformat(),
+            "number_of_commits": self.number_of_commits,
+            "number_of_files": profile.number_of_files,
+            "total_lines_changed": profile.total_lines_changed,
+            "normalized_entropy": profile.aggregate_entropy,
+        }
+        if include_files:
+            window["file_level_entropy"] = profile.file_level_entropy
+        return window
+
+
+def calculate_entropy_series(
+    repo_path: Union[str, pathlib.Path, RepoSession],
+    window: Union[str, WindowSpec] = "month",
+    diff_options: Optional[DiffOptions] = None,
+    include_files: bool = False,
+    churn_index: Optional["ChurnIndex"] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Calculates the normalized entropy of the changes within each window of
+    a repository's history, walking the history and diffing each adjacent
+    commit pair once.
+
+    Each window's entropy is calculated from the lines changed in each file,
+    summed over the commits in the window. The cost grows linearly with the
+    length of the history: rolling windows add and remove one commit's churn
+    at a time rather than re-diffing their span.
+
+    Args:
+        repo_path (Union[str, pathlib.Path, RepoSession]): The path to the Git
+            repository or a session for it.
+        window (Union[str, WindowSpec]): How to split the history, as a window
+            specification or the kind of window ("commits", "month" or
+            "release") with the default size, step and tag pattern.
+        diff_options (Optional[DiffOptions]): The diff filter, profile and backend
+            applied to each diff.
+        include_files (bool): Whether to include the entropy of each file
+            in each window.
+        churn_index (Optional[ChurnIndex]): A persistent index of the churn of
+            each commit, which is updated with the commits not indexed yet and
+            then read instead of diffing the whole history.
+
+    Returns:
+        List[Dict[str, Any]]: The windows in history order, each with its label,
+        start and end commits and dates, number of commits and files, total lines
+        changed and normalized entropy.
+    """
+    if isinstance(window, str):
+        window = WindowSpec(window)
+    kind, size, step, tag_pattern = window
+    if kind not in WINDOW_KINDS:
+        raise ValueError(
+            f"Unknown window {kind!r}. Available windows are: {list(WINDOW_KINDS)}."
+        )
+    step = size if step is None else step
+    if size < 1 or step < 1:
+        raise ValueError("Window size and step must be positive.")
+
+    diff_options = get_diff_options(diff_options)
+    session = open_session(repo_path, diff_options.cache)
+    try:
+        if churn_index is None:
+            commit_churn = iter_commit_churn(session, diff_options)
+        else:
+            churn_index.update(session, diff_options)
+            commit_churn = churn_index.iter_commit_churn(session.repo)
+        if kind == "commits":
+            return _commit_windows(commit_churn, size, step, include_files)
+        if kind == "month":
+            return _month_windows(commit_churn, include_files)
+        return _release_windows(
+            commit_churn, _release_tags(session.repo, tag_pattern), include_files
+        )
+    finally:
+        # Close sessions opened here, leaving sessions passed in open
+        if session is not repo_path:
+            session.close()
+
+
+def _commit_windows(
+    commit_churn: Iterator[Tuple[pygit2.Commit, Dict[str, int]]],
+    size: int,
+    step: int,
+    include_files: bool,
+) -> List[Dict[str, Any]]:
+    """
+    Summarizes rolling windows of size commits which start every step commits.
+    """
+    series = []
+    churn = _WindowChurn(rolling=True)
+    commits_seen = 0
+    last_emitted = None
+    for commit, loc_changes in commit_churn:
+        churn.add(commit, loc_changes)
+        commits_seen += 1
+        if churn.number_of_commits > size:
+            churn.pop_oldest()
+        # Windows start every step commits and end size commits later
+        if commits_seen >= size and (commits_seen - size) % step == 0:
+            series.append(
+                churn.summarize(
+                    f"{commits_seen - size + 1}-{commits_seen}", include_files
+                )
+            )
+            last_emitted = commits_seen
+    # Cover trailing commits with a final, possibly shorter, window
+    if commits_seen and last_emitted != commits_seen:
+        start = commits_seen - churn.number_of_commits + 1
+        if last_emitted is not None:
+            start = max(start, last_emitted - size + step + 1)
+            while churn.number_of_commits > commits_seen - start + 1:
+                churn.pop_oldest()
+        series.append(churn.summarize(f"{start}-{commits_seen}", include_files))
+    return series
+
+
+def _month_windows(
+    commit_churn: Iterator[Tuple[pygit2.Commit, Dict[str, int]]],
+    include_files: bool,
+) -> List[Dict[str, Any]]:
+    """
+    Summarizes the commits of each calendar month in UTC.
+    """
+    # Group by month, which tolerates commit times out of topological order.
+    # Only each month's running totals are kept, not each commit's churn.
+    months: Dict[str, _WindowChurn] = {}
+    for commit, loc_changes in commit_churn:
+        label = _commit_date(commit).strftime("%Y-%m")
+        months.setdefault(label, _WindowChurn()).add(commit, loc_changes)
+    return [months[label].summarize(label, include_files) for label in sorted(months)]
+
+
+def _release_windows(
+    commit_churn: Iterator[Tuple[pygit2.Commit, Dict[str, int]]],
+    tags: Dict[pygit2.Oid, str],
+    include_files: bool,
+) -> List[Dict[str, Any]]:
+    """
+    Summarizes the commits up to and including each tagged commit, with
+    untagged trailing commits in a "HEAD" window.
+    """
+    series = []
+    churn = _WindowChurn()
+    for commit, loc_changes in commit_churn:
+        churn.add(commit, loc_changes)
+        if commit.id in tags:
+            series.append(churn.summarize(tags[commit.id], include_files))
+            churn = _WindowChurn()
+    if churn.number_of_commits:
+        series.append(churn.summarize("HEAD", include_files))
+    return series
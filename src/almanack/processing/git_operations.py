@@ -4,137 +4,345 @@ This module performs git operations
 
 import pathlib
 import tempfile
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Union
 
 import pygit2
 
+from .blame_cache import BlameCache
+from .diff_options import DiffOptions, get_diff_options
+from .repo_session import RepoSession, open_session
 
-def clone_repository(repo_url: str) -> pathlib.Path:
+
+def clone_repository(
+    repo_url: str, bare: bool = False, directory: Optional[pathlib.Path] = None
+) -> pathlib.Path:
     """
     Clones the GitHub repository to a temporary directory.
 
     Args:
         repo_url (str): The URL of the GitHub repository.
+        bare (bool): Whether to clone only the object database without checking
+            out a working tree. Analysis only reads git objects, so a bare clone
+            avoids writing every file of the repository to disk.
+        directory (Optional[pathlib.Path]): The path to clone into. When None,
+            the repository is cloned into a new temporary directory which the
+            caller is responsible for removing (see Workspace for managed clones).
 
     Returns:
         pathlib.Path: Path to the cloned repository.
     """
-    # Create a temporary directory to store the cloned repository
-    temp_dir = tempfile.mkdtemp()
-    # Define the path for the cloned repository within the temporary directory
-    repo_path = pathlib.Path(temp_dir) / "repo"
+    if directory is None:
+        # Create a temporary directory to store the cloned repository
+        temp_dir = tempfile.mkdtemp()
+        # Define the path for the cloned repository within the temporary directory
+        directory = pathlib.Path(temp_dir) / "repo"
+    repo_path = pathlib.Path(directory)
     # Clone the repository from the given URL into the defined path
-    pygit2.clone_repository(repo_url, str(repo_path))
+    pygit2.clone_repository(repo_url, str(repo_path), bare=bare)
     return repo_path
 
 
-def get_commits(repo: pygit2.Repository) -> List[pygit2.Commit]:
+def is_repository(repo_path: pathlib.Path) -> bool:
+    """
+    Checks whether a directory is a Git repository, either with a
+    working tree (containing a .git entry) or a bare repository.
+
+    Args:
+        repo_path (pathlib.Path): The path to the directory.
+
+    Returns:
+        bool: True if the directory is a Git repository.
+    """
+    repo_path = pathlib.Path(repo_path)
+    return (repo_path / ".git").exists() or (
+        (repo_path / "HEAD").is_file()
+        and (repo_path / "objects").is_dir()
+        and (repo_path / "refs").is_dir()
+    )
+
+
+def get_commits(repo: Union[pygit2.Repository, RepoSession]) -> List[pygit2.Commit]:
     """
     Retrieves the list of commits from the main branch.
 
     Args:
-        repo (pygit2.Repository): The Git repository.
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
 
     Returns:
         List[pygit2.Commit]: List of commits in the repository.
     """
-    # Get the latest commit (HEAD) from the repository
-    head = repo.revparse_single("HEAD")
-    # Create a walker to iterate over commits starting from the HEAD
-    walker = repo.walk(
-        head.id, pygit2.enums.SortMode.NONE
-    )  #  SortMode.NONE traverses commits in natural order; no sorting applied.
-    # Collect all commits from the walker into a list
-    commits = list(walker)
-    return commits
+    return open_session(repo).get_commits()
+
+
+def iter_commits(
+    repo: Union[pygit2.Repository, RepoSession]
+) -> Iterator[pygit2.Commit]:
+    """
+    Lazily yields the commits from the main branch, most recent first,
+    keeping memory flat regardless of the length of the history.
+
+    Args:
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
+
+    Yields:
+        pygit2.Commit: Commits in the repository.
+    """
+    yield from open_session(repo).iter_commits()
+
+
+def get_head_commit(repo: Union[pygit2.Repository, RepoSession]) -> pygit2.Commit:
+    """
+    Retrieves the most recent commit (HEAD) without walking history.
+
+    Args:
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
+
+    Returns:
+        pygit2.Commit: The most recent commit.
+    """
+    return open_session(repo).get_head_commit()
+
+
+def get_root_commits(
+    repo: Union[pygit2.Repository, RepoSession]
+) -> List[pygit2.Commit]:
+    """
+    Retrieves the root commits (commits without parents) reachable from HEAD.
+
+    Args:
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
+
+    Returns:
+        List[pygit2.Commit]: The root commits, most recent first.
+    """
+    return open_session(repo).get_root_commits()
+
+
+def get_first_commit(repo: Union[pygit2.Repository, RepoSession]) -> pygit2.Commit:
+    """
+    Retrieves the first commit of the history reachable from HEAD.
+
+    Args:
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
+
+    Returns:
+        pygit2.Commit: The first commit.
+    """
+    return open_session(repo).get_first_commit()
+
+
+def count_commits(repo: Union[pygit2.Repository, RepoSession]) -> int:
+    """
+    Counts the commits reachable from HEAD without holding them in memory.
+
+    Args:
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
+
+    Returns:
+        int: The number of commits.
+    """
+    return open_session(repo).count_commits()
 
 
 def get_edited_files(
-    repo: pygit2.Repository, source_commit: pygit2.Commit, target_commit: pygit2.Commit
+    repo: Union[pygit2.Repository, RepoSession],
+    source_commit: pygit2.Commit,
+    target_commit: pygit2.Commit,
+    diff_options: Optional[DiffOptions] = None,
 ) -> List[str]:
     """
     Finds all files that have been edited, added, or deleted between two specific commits.
 
     Args:
-        repo (pygit2.Repository): The Git repository.
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
         source_commit (pygit2.Commit): The source commit.
         target_commit (pygit2.Commit): The target commit.
+        diff_options (Optional[DiffOptions]): The diff filter, profile and backend
+            ("pygit2", "git-cli" or "gitpython"). With rename detection, both paths
+            of a renamed file are included.
 
     Returns:
         List[str]: List of file names that have been edited, added, or deleted between the two commits.
     """
-    # Create a set to store unique file names that have been edited
-    file_names = set()
-    # Get the differences (diff) between the source and target commits
-    diff = repo.diff(source_commit, target_commit)
-    # Iterate through each patch in the diff
-    for patch in diff:
-        # If the old file path is present, add it to the set
-        if patch.delta.old_file.path:
-            file_names.add(patch.delta.old_file.path)
-        # If the new file path is present, add it to the set
-        if patch.delta.new_file.path:
-            file_names.add(patch.delta.new_file.path)
-    return list(file_names)
+    # Iterate through the deltas only, which avoids generating patches
+    diff_options = get_diff_options(diff_options)
+    return open_session(repo, diff_options.cache).get_edited_files(
+        source_commit, target_commit, diff_options
+    )
+
+
+def get_diff_stats(
+    repo: Union[pygit2.Repository, RepoSession],
+    source_commit: pygit2.Commit,
+    target_commit: pygit2.Commit,
+    diff_options: Optional[DiffOptions] = None,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Finds the edited files and their added and deleted line counts between
+    two commits in a single diff pass.
+
+    Args:
+        repo (Union[pygit2.Repository, RepoSession]): The Git repository or a session for it.
+        source_commit (pygit2.Commit): The source commit.
+        target_commit (pygit2.Commit): The target commit.
+        diff_options (Optional[DiffOptions]): The diff filter, applied before any
+            patches are generated, profile and backend ("pygit2", "git-cli" or
+            "gitpython"). With rename detection, renamed files are reported under
+            their new path.
+
+    Returns:
+        Dict[str, Dict[str, int]]: A dictionary where the key is the filename and the
+        value is a dictionary with the "additions" and "deletions" for that file.
+    """
+    diff_options = get_diff_options(diff_options)
+    return open_session(repo, diff_options.cache).get_diff_stats(
+        source_commit, target_commit, diff_options
+    )
 
 
 def get_loc_changed(
-    repo_path: pathlib.Path, source: str, target: str, file_names: List[str]
+    repo_path: Union[pathlib.Path, RepoSession],
+    source: str,
+    target: str,
+    file_names: List[str],
+    diff_options: Optional[DiffOptions] = None,
 ) -> Dict[str, int]:
     """
     Finds the total number of code lines changed for each specified file between two commits.
 
     Args:
-        repo_path (pathlib.Path): The path to the git repository.
+        repo_path (Union[pathlib.Path, RepoSession]): The path to the git repository or a session for it.
         source (str): The source commit hash.
         target (str): The target commit hash.
         file_names (List[str]): List of file names to calculate changes for.
+        diff_options (Optional[DiffOptions]): The diff filter, applied before any
+            patches are generated, profile and backend.
 
     Returns:
         Dict[str, int]: A dictionary where the key is the filename, and the value is the lines changed (added and removed).
     """
-    repo = pygit2.Repository(str(repo_path))
+    # Use a set for constant-time membership checks on file names
+    file_names = set(file_names)
+    diff_options = get_diff_options(diff_options)
+
+    return {
+        file_name: file_stats["additions"] + file_stats["deletions"]
+        for file_name, file_stats in open_session(repo_path, diff_options.cache)
+        .get_diff_stats(source, target, diff_options)
+        .items()
+        if file_name in file_names
+    }
+
+
+def _mailmap_key(repo: pygit2.Repository) -> str:
+    """
+    Identifies the .mailmap which blame applies to a repository: the blob
+    OID of the working tree's .mailmap, or of HEAD's for bare repositories,
+    or a sentinel when there is none.
+    """
+    if not repo.is_bare:
+        mailmap_path = pathlib.Path(repo.workdir) / ".mailmap"
+        if mailmap_path.is_file():
+            return str(pygit2.hashfile(str(mailmap_path)))
+        return "no-mailmap"
+    try:
+        return str(repo.revparse_single("HEAD:.mailmap").id)
+    except KeyError:
+        return "no-mailmap"
+
+
+def get_line_ownership(
+    repo_path: Union[pathlib.Path, RepoSession],
+    target: str,
+    file_names: List[str],
+    blame_cache: Optional[BlameCache] = None,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Finds the number of lines of each specified file owned by each author at a
+    commit using git blame, reusing cached blame results for unchanged blobs.
+
+    Authors are identified by their email address after applying the
+    repository's .mailmap.
+
+    Args:
+        repo_path (Union[pathlib.Path, RepoSession]): The path to the git repository or a session for it.
+        target (str): The commit hash to blame the files at.
+        file_names (List[str]): List of file names to find ownership for. Files which
+            do not exist at the target commit are skipped.
+        blame_cache (Optional[BlameCache]): A persistent cache of blame results,
+            keyed by path, blob OID and the .mailmap.
+
+    Returns:
+        Dict[str, Dict[str, int]]: A dictionary where the key is the filename, and the value
+        maps each author to the number of lines they own.
+    """
+    session = open_session(repo_path)
+    commit = session.resolve(target)
 
-    # Resolve the source and target commits by their hashes
-    source_commit = repo.revparse_single(source)
-    target_commit = repo.revparse_single(target)
+    # Find the blob of each file, which identifies its content in the cache.
+    # Blame also depends on the authors mapped, so the .mailmap is part of
+    # each key. The commit blamed at is not: commits which leave a file
+    # unchanged do not change its blame.
+    mailmap_key = _mailmap_key(session.repo)
+    files = []
+    for file_name in file_names:
+        try:
+            entry = commit.tree[file_name]
+        except KeyError:
+            continue
+        if entry.type == pygit2.enums.ObjectType.BLOB:
+            files.append(
+                (
+                    file_name,
+                    (file_name, str(entry.id), "mailmap", mailmap_key),
+                )
+            )
 
-    changes = {}
-    # Compute the diff between the source and target commits
-    diff = repo.diff(source_commit, target_commit)
+    cached = (
+        [None] * len(files)
+        if blame_cache is None
+        else blame_cache.get_ownership([key_parts for _, key_parts in files])
+    )
 
-    # Iterate over each patch in the diff
-    for patch in diff:
-        if patch.delta.new_file.path in file_names:
-            additions = 0
-            deletions = 0
-            # Iterate over each hunk in the patch
-            for hunk in patch.hunks:
-                # Iterate over each line in the hunk
-                for line in hunk.lines:
-                    if line.origin == "+":
-                        additions += 1
-                    elif line.origin == "-":
-                        deletions += 1
-            lines_changed = additions + deletions
-            # Store the number of lines changed for the file
-            changes[patch.delta.new_file.path] = lines_changed
+    ownership = {}
+    blamed = []
+    for (file_name, key_parts), cached_owners in zip(files, cached):
+        owners = cached_owners
+        if owners is None:
+            # Blame only the files whose blobs are not cached
+            owners = {}
+            for hunk in session.repo.blame(
+                file_name,
+                flags=pygit2.enums.BlameFlag.USE_MAILMAP,
+                newest_commit=commit.id,
+            ):
+                author = (
+                    hunk.final_committer.email.lower()
+                    if hunk.final_committer is not None
+                    else ""
+                )
+                owners[author] = owners.get(author, 0) + hunk.lines_in_hunk
+            blamed.append((key_parts, owners))
+        ownership[file_name] = owners
 
-    return changes
+    if blame_cache is not None and blamed:
+        blame_cache.put_ownership(blamed)
+    return ownership
 
 
-def get_most_recent_commits(repo_path: pathlib.Path) -> tuple[str, str]:
+def get_most_recent_commits(
+    repo_path: Union[pathlib.Path, RepoSession]
+) -> tuple[str, str]:
     """
     Retrieves the two most recent commit hashes in the test repositories
 
     Args:
-        repo_path (pathlib.Path): The path to the git repository.
+        repo_path (Union[pathlib.Path, RepoSession]): The path to the git repository or a session for it.
 
     Returns:
         tuple[str, str]: Tuple containing the source and target commit hashes.
     """
-    repo = pygit2.Repository(str(repo_path))
-    commits = get_commits(repo)
+    commits = get_commits(open_session(repo_path))
 
     # Assumes that commits are sorted by time, with the most recent first
     source_commit = commits[1]  # Second most recent
@@ -0,0 +1,380 @@
+"""
+This module provides metric plugins which are fed from a single traversal
+of a repository's history and diff
+"""
+
+import copy
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+import pygit2
+
+from .calculate_entropy import EntropyProfile
+from .diff_options import DiffOptions
+from .directory_entropy import calculate_directory_entropy
+from .git_operations import get_diff_stats, get_head_commit
+from .repo_session import RepoSession
+
+
+class Traversal:
+    """
+    The state of one engine run, shared by the metrics it feeds.
+
+    Args:
+        session (RepoSession): The session for the repository.
+        head_commit (pygit2.Commit): The most recent commit.
+    """
+
+    def __init__(self, session: RepoSession, head_commit: pygit2.Commit) -> None:
+        self.session = session
+        self.head_commit = head_commit
+        # set once history was walked; a budget may stop the walk at a
+        # more recent commit, which then stands in for the first commit
+        self.first_commit: Optional[pygit2.Commit] = None
+        self.number_of_commits = 0
+        # set once the first and most recent commits were diffed
+        self.diff_stats: Dict[str, Dict[str, int]] = {}
+        # results of the metrics finished so far, keyed by metric name
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+
+class Metric:
+    """
+    A metric computed from one traversal of a repository.
+
+    The engine walks the history once and diffs the first and most recent
+    commits once, calling each metric's callbacks along the way. Subclasses
+    override only the callbacks they need, and callbacks which are not
+    overridden are never called. Metrics keep their state on the instance,
+    so each engine run feeds new copies of the metrics it was given.
+
+    Subclasses set a unique name, list the names of metrics whose results
+    they read in requires, and implement result.
+    """
+
+    name = "base"
+    requires: Tuple[str, ...] = ()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+    def on_commit(self, commit: pygit2.Commit) -> None:
+        """
+        Called with each commit of the history, most recent first. Metrics
+        which override this make the engine stream the history instead of
+        counting commits through commit-graph files.
+
+        Args:
+            commit (pygit2.Commit): A commit reachable from HEAD.
+        """
+
+    def on_delta(self, file_name: str, additions: int, deletions: int) -> None:
+        """
+        Called with each file changed between the first and most recent commits.
+
+        Args:
+            file_name (str): The path of the changed file.
+            additions (int): Lines added to the file.
+            deletions (int): Lines deleted from the file.
+        """
+
+    def on_diff_stats(self, diff_stats: Dict[str, Dict[str, int]]) -> None:
+        """
+        Called once with the per-file statistics of the diff between the first
+        and most recent commits, for metrics which need every file at once.
+
+        Args:
+            diff_stats (Dict[str, Dict[str, int]]): The lines added and deleted
+                in each changed file.
+        """
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        """
+        Computes the metric once the traversal is complete.
+
+        Args:
+            traversal (Traversal): The state of the run, including the results
+                of the metrics this one requires.
+
+        Returns:
+            Dict[str, Any]: The fields of the metric, merged into the repository data.
+        """
+        raise NotImplementedError
+
+
+# metric classes by name, filled by register_metric
+METRICS: Dict[str, Type[Metric]] = {}
+
+
+def register_metric(metric: Type[Metric]) -> Type[Metric]:
+    """
+    Registers a metric class under its name, so that engines can enable it by name.
+    Use as a class decorator.
+
+    Args:
+        metric (Type[Metric]): The metric class.
+
+    Returns:
+        Type[Metric]: The metric class, unchanged.
+    """
+    if metric.name in METRICS and METRICS[metric.name] is not metric:
+        raise ValueError(f"A metric named {metric.name!r} is already registered.")
+    METRICS[metric.name] = metric
+    return metric
+
+
+def get_metric(metric: Union[str, Type[Metric], Metric]) -> Metric:
+    """
+    Looks up a registered metric by name, instantiating metric classes and
+    passing metric instances through unchanged.
+
+    Args:
+        metric (Union[str, Type[Metric], Metric]): A metric, a metric class, or
+            the name of a registered metric.
+
+    Returns:
+        Metric: A metric instance.
+    """
+    if isinstance(metric, Metric):
+        return metric
+    if isinstance(metric, type) and issubclass(metric, Metric):
+        return metric()
+    if metric not in METRICS:
+        raise ValueError(
+            f"Unknown metric {metric!r}. Available metrics are: {sorted(METRICS)}."
+        )
+    return METRICS[metric]()
+
+
+def _overrides(metric: Metric, callback: str) -> bool:
+    """
+    Checks whether a metric overrides one of the base class callbacks.
+    """
+    return getattr(type(metric), callback) is not getattr(Metric, callback)
+
+
+@register_metric
+class CommitsMetric(Metric):
+    """
+    The number of commits and the dates of the first and most recent commits.
+    """
+
+    name = "commits"
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        # Convert commit times to UTC datetime objects, then format as date strings
+        first_commit_date, most_recent_commit_date = (
+            datetime.fromtimestamp(commit.commit_time, tz=timezone.utc)
+            .date()
+            .isoformat()
+            for commit in (traversal.first_commit, traversal.head_commit)
+        )
+        return {
+            "number_of_commits": traversal.number_of_commits,
+            "time_range_of_commits": (first_commit_date, most_recent_commit_date),
+        }
+
+
+@register_metric
+class EntropyMetric(Metric):
+    """
+    The normalized entropy of each changed file and of the repository.
+
+    The files are those of the diff, so they depend on the diff profile:
+    profiles which detect renames count a moved file once under its new
+    path rather than as a deletion and an addition, which changes the
+    number of files the entropy is normalized by.
+    """
+
+    name = "entropy"
+
+    def __init__(self) -> None:
+        self.profile = EntropyProfile({})
+
+    def on_diff_stats(self, diff_stats: Dict[str, Dict[str, int]]) -> None:
+        self.profile = EntropyProfile.from_diff_stats(diff_stats)
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        return {
+            "total_normalized_entropy": self.profile.aggregate_entropy,
+            "number_of_files": self.profile.number_of_files,
+            "file_level_entropy": self.profile.file_level_entropy,
+        }
+
+
+@register_metric
+class DirectoryEntropyMetric(Metric):
+    """
+    The churn and entropy of each directory, rolled up from the file entropy.
+    """
+
+    name = "directory_entropy"
+    requires = ("entropy",)
+
+    def __init__(self) -> None:
+        self.loc_changes: Dict[str, int] = {}
+
+    def on_delta(self, file_name: str, additions: int, deletions: int) -> None:
+        self.loc_changes[file_name] = additions + deletions
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        # Roll the file statistics up into every directory with a prefix tree
+        return {
+            "directory_entropy": calculate_directory_entropy(
+                self.loc_changes,
+                traversal.results["entropy"]["file_level_entropy"],
+            )
+        }
+
+
+@register_metric
+class LineTotalsMetric(Metric):
+    """
+    The lines added and deleted between the first and most recent commits.
+    """
+
+    name = "lines"
+
+    def __init__(self) -> None:
+        self.added = 0
+        self.deleted = 0
+
+    def on_delta(self, file_name: str, additions: int, deletions: int) -> None:
+        self.added += additions
+        self.deleted += deletions
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        return {"total_lines_added": self.added, "total_lines_deleted": self.deleted}
+
+
+@register_metric
+class AuthorsMetric(Metric):
+    """
+    The number of distinct commit authors, identified by email. Not enabled
+    by default, since it streams the history instead of counting commits
+    through commit-graph files.
+    """
+
+    name = "authors"
+
+    def __init__(self) -> None:
+        self.emails = set()
+
+    def on_commit(self, commit: pygit2.Commit) -> None:
+        self.emails.add(commit.author.email)
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        return {"number_of_authors": len(self.emails)}
+
+
+# metrics computed by compute_repo_data
+DEFAULT_METRICS = ("entropy", "commits", "directory_entropy", "lines")
+
+
+class MetricEngine:
+    """
+    Feeds every enabled metric from one traversal of a repository, so that
+    additional metrics cost only their own arithmetic and no extra git work.
+
+    A run walks the history from HEAD once, calling on_commit, then diffs the
+    first and most recent commits once, calling on_delta for each changed file
+    and on_diff_stats with all of them. Metrics then compute their results in
+    order, after the metrics they require, which are enabled automatically.
+
+    The enabled metrics are templates: each run feeds deep copies of them, so
+    an engine can run any number of times and metric instances passed in are
+    never changed by a run.
+
+    Args:
+        metrics (Optional[Iterable[Union[str, Type[Metric], Metric]]]): The
+            metrics to compute, as metrics, metric classes or names of
+            registered metrics. Defaults to DEFAULT_METRICS.
+
+    Example:
+        >>> engine = MetricEngine(["entropy", "authors"])
+        >>> with RepoSession("path/to/repo") as session:
+        ...     data = engine.run(session)
+    """
+
+    def __init__(
+        self, metrics: Optional[Iterable[Union[str, Type[Metric], Metric]]] = None
+    ) -> None:
+        self.metrics: List[Metric] = []
+        for metric in DEFAULT_METRICS if metrics is None else metrics:
+            self._add(get_metric(metric))
+
+    def __repr__(self) -> str:
+        return f"MetricEngine({[metric.name for metric in self.metrics]!r})"
+
+    def _add(self, metric: Metric) -> None:
+        """
+        Enables a metric after the metrics it requires.
+        """
+        names = [enabled.name for enabled in self.metrics]
+        if metric.name in names:
+            return
+        for required in metric.requires:
+            self._add(get_metric(required))
+        self.metrics.append(metric)
+
+    def run(
+        self, session: RepoSession, diff_options: Optional[DiffOptions] = None
+    ) -> Dict[str, Any]:
+        """
+        Traverses the repository once and computes every enabled metric.
+        The traversal honours the session's budget and is timed in the
+        "history", "diff" and "metrics" stages of its profiler.
+
+        Args:
+            session (RepoSession): The session for the repository.
+            diff_options (Optional[DiffOptions]): The diff filter, profile and backend.
+
+        Returns:
+            Dict[str, Any]: The fields of every metric, in the order the metrics run.
+        """
+        traversal = Traversal(session, get_head_commit(session))
+        # Metrics keep state while they are fed, so each run starts from
+        # fresh copies of the enabled metrics
+        metrics = [copy.deepcopy(metric) for metric in self.metrics]
+        # Only callbacks which metrics override are called
+        commit_callbacks = [
+            metric.on_commit for metric in metrics if _overrides(metric, "on_commit")
+        ]
+        delta_callbacks = [
+            metric.on_delta for metric in metrics if _overrides(metric, "on_delta")
+        ]
+
+        def on_commit(commit: pygit2.Commit) -> None:
+            for callback in commit_callbacks:
+                callback(commit)
+
+        with session.profiler.stage("history"):
+            traversal.number_of_commits, traversal.first_commit = session.walk_history(
+                on_commit if commit_callbacks else None
+            )
+
+        # Diff the first and most recent commits once to find the edited files
+        # along with their added and deleted line counts
+        with session.profiler.stage("diff"):
+            traversal.diff_stats = get_diff_stats(
+                session,
+                traversal.first_commit,
+                traversal.head_commit,
+                diff_options,
+            )
+
+        with session.profiler.stage("metrics"):
+            for file_name, file_stats in traversal.diff_stats.items():
+                for callback in delta_callbacks:
+                    callback(
+                        file_name, file_stats["additions"], file_stats["deletions"]
+                    )
+            for metric in metrics:
+                if _overrides(metric, "on_diff_stats"):
+                    metric.on_diff_stats(traversal.diff_stats)
+
+            data = {}
+            for metric in metrics:
+                traversal.results[metric.name] = metric.result(traversal)
+                data.update(traversal.results[metric.name])
+        return data
@@ -0,0 +1,230 @@
+"""
+This module provides a persistent on-disk cache of bare repository mirrors
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+from typing import Iterator, List, Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+
+import pygit2
+
+# refspec used to mirror every reference from the remote
+MIRROR_REFSPEC = "+refs/*:refs/*"
+
+
+def normalize_remote_url(repo_url: str) -> str:
+    """
+    Normalizes a remote URL so that equivalent spellings of the same
+    remote share a single mirror.
+
+    Credentials, letter case of the scheme and host, trailing slashes
+    and a trailing ".git" are ignored, and scp-like SSH URLs
+    (for example, git@github.com:owner/repo) are treated as their
+    host and path.
+
+    Args:
+        repo_url (str): The URL of the remote repository.
+
+    Returns:
+        str: The normalized URL.
+    """
+    repo_url = repo_url.strip()
+
+    # Convert scp-like SSH syntax (user@host:path) into a URL
+    scp_match = re.match(r"^(?:[^@/]+@)?([^:/]+):(?!//)(.+)$", repo_url)
+    if scp_match and "://" not in repo_url:
+        repo_url = f"ssh://{scp_match.group(1)}/{scp_match.group(2)}"
+
+    parts = urlsplit(repo_url)
+    # Drop credentials and normalize the case of the scheme and host
+    netloc = (parts.hostname or "").lower()
+    if parts.port:
+        netloc = f"{netloc}:{parts.port}"
+    path = re.sub(r"/+$", "", parts.path)
+    path = re.sub(r"\.git$", "", path)
+
+    # Treat http, https and ssh remotes for the same host and path as equivalent
+    scheme = parts.scheme.lower()
+    if scheme in ("http", "https", "ssh", "git"):
+        scheme = "https"
+
+    return urlunsplit((scheme, netloc, path, "", ""))
+
+
+class MirrorCache:
+    """
+    A persistent store of bare mirrors keyed by normalized remote URL.
+
+    A repeat request for a remote performs an incremental fetch into the
+    existing mirror instead of a fresh clone. Mirrors are evicted in least
+    recently used order when the store grows beyond max_bytes, and lock
+    files allow concurrent workers to share the store safely: a mirror is
+    locked exclusively while it is cloned, fetched or evicted, and shared
+    while it is being analyzed.
+
+    Args:
+        cache_dir (Union[str, pathlib.Path]): Directory which holds the mirrors.
+        max_bytes (Optional[int]): Maximum total size of the mirrors in bytes.
+            When None, mirrors are never evicted.
+
+    Example:
+        >>> cache = MirrorCache("~/.cache/almanack/mirrors", max_bytes=50 * 1024**3)
+        >>> with cache.mirror("https://github.com/owner/repo") as repo_path:
+        ...     data = compute_repo_data(repo_path)
+    """
+
+    def __init__(
+        self, cache_dir: Union[str, pathlib.Path], max_bytes: Optional[int] = None
+    ) -> None:
+        self.cache_dir = pathlib.Path(cache_dir).expanduser().resolve()
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def mirror_path(self, repo_url: str) -> pathlib.Path:
+        """
+        Returns the location of the mirror for a remote URL.
+
+        Args:
+            repo_url (str): The URL of the remote repository.
+
+        Returns:
+            pathlib.Path: Path to the bare mirror within the cache directory.
+        """
+        normalized_url = normalize_remote_url(repo_url)
+        # Combine a readable name with a digest of the URL to avoid collisions
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", normalized_url.split("://")[-1])[-64:]
+        digest = hashlib.sha256(normalized_url.encode()).hexdigest()[:16]
+        return self.cache_dir / f"{name.strip('_')}-{digest}.git"
+
+    @staticmethod
+    def _lock_path(mirror_path: pathlib.Path) -> pathlib.Path:
+        return mirror_path.with_suffix(".lock")
+
+    @contextlib.contextmanager
+    def mirror(self, repo_url: str) -> Iterator[pathlib.Path]:
+        """
+        Clones or incrementally fetches the mirror for a remote and holds a
+        shared lock on it while in use, so that it is not evicted by other workers.
+
+        Args:
+            repo_url (str): The URL of the remote repository.
+
+        Yields:
+            pathlib.Path: Path to the up to date bare mirror.
+        """
+        mirror_path = self.mirror_path(repo_url)
+        with open(self._lock_path(mirror_path), "a") as lock_file:
+            # Hold an exclusive lock while the mirror is created or updated
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if (mirror_path / "HEAD").exists():
+                    self._fetch(mirror_path)
+                else:
+                    self._clone(repo_url, mirror_path)
+                # Record the access time used for least recently used eviction
+                os.utime(mirror_path)
+                # Downgrade to a shared lock so concurrent readers may use the mirror
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                self.evict(keep=[mirror_path])
+                yield mirror_path
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _clone(self, repo_url: str, mirror_path: pathlib.Path) -> None:
+        """
+        Clones a new bare mirror, moving it into place once complete so
+        that an interrupted clone never leaves a partial mirror behind.
+        """
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".clone-")
+        try:
+            pygit2.clone_repository(
+                repo_url,
+                staging_dir,
+                bare=True,
+                remote=lambda repo, name, url: repo.remotes.create(
+                    name, url, MIRROR_REFSPEC
+                ),
+            )
+            pygit2.Repository(staging_dir).config["remote.origin.mirror"] = True
+            os.replace(staging_dir, mirror_path)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    @staticmethod
+    def _fetch(mirror_path: pathlib.Path) -> None:
+        """
+        Incrementally fetches new objects and references into an existing mirror.
+        """
+        repo = pygit2.Repository(str(mirror_path))
+        repo.remotes["origin"].fetch(prune=pygit2.enums.FetchPrune.PRUNE)
+
+    def mirrors(self) -> List[pathlib.Path]:
+        """
+        Lists the mirrors in the cache, least recently used first.
+
+        Returns:
+            List[pathlib.Path]: Paths to the mirrors.
+        """
+        return sorted(
+            (path for path in self.cache_dir.glob("*.git") if path.is_dir()),
+            key=lambda path: path.stat().st_mtime,
+        )
+
+    @staticmethod
+    def _size(path: pathlib.Path) -> int:
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+    def size(self) -> int:
+        """
+        Computes the total size of the mirrors in bytes.
+
+        Returns:
+            int: The total size of the mirrors.
+        """
+        return sum(self._size(mirror_path) for mirror_path in self.mirrors())
+
+    def evict(self, keep: Optional[List[pathlib.Path]] = None) -> List[pathlib.Path]:
+        """
+        Removes least recently used mirrors until the cache fits within
+        max_bytes. Mirrors which are locked by other workers are skipped.
+
+        Args:
+            keep (Optional[List[pathlib.Path]]): Mirrors which should not be evicted.
+
+        Returns:
+            List[pathlib.Path]: Paths to the evicted mirrors.
+        """
+        if self.max_bytes is None:
+            return []
+
+        keep = set(keep or [])
+        sizes = {mirror_path: self._size(mirror_path) for mirror_path in self.mirrors()}
+        total_size = sum(sizes.values())
+        evicted = []
+
+        for mirror_path, mirror_size in sizes.items():
+            if total_size <= self.max_bytes:
+                break
+            if mirror_path in keep:
+                continue
+            with open(self._lock_path(mirror_path), "a") as lock_file:
+                # Skip mirrors which are being fetched or analyzed by other workers
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    shutil.rmtree(mirror_path, ignore_errors=True)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            total_size -= mirror_size
+            evicted.append(mirror_path)
+
+        return evicted
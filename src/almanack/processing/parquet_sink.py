@@ -0,0 +1,432 @@
+"""
+This module streams repository data into Parquet files with a fixed schema
+"""
+
+import os
+import pathlib
+import shutil
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+# number of rows buffered before they are written as one row group
+ROW_GROUP_SIZE = 10_000
+
+# directory within an output directory holding the batches staged for each
+# part file until the part file is closed
+STAGING_DIR = ".staged"
+
+
+def _import_pyarrow() -> Any:
+    """
+    Imports pyarrow, which is an optional dependency of the package.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Writing Parquet files requires pyarrow, which can be installed with "
+            "`pip install pyarrow`."
+        ) from e
+    return pyarrow
+
+
+def result_schema() -> Any:
+    """
+    Returns the Arrow schema of repository data, with one row per repository.
+
+    Per-file and per-directory entropy are nested list columns, so a corpus is
+    held in one table rather than one row per file.
+
+    Returns:
+        pyarrow.Schema: The schema of the data returned by compute_repo_data,
+        along with the "repo_url" and "error" of failed repositories.
+    """
+    pa = _import_pyarrow()
+    return pa.schema(
+        [
+            ("repo_url", pa.string()),
+            ("repo_path", pa.string()),
+            ("error", pa.string()),
+            ("total_normalized_entropy", pa.float64()),
+            ("number_of_commits", pa.int64()),
+            ("number_of_files", pa.int64()),
+            ("first_commit_date", pa.date32()),
+            ("most_recent_commit_date", pa.date32()),
+            ("total_lines_added", pa.int64()),
+            ("total_lines_deleted", pa.int64()),
+            ("partial", pa.bool_()),
+            ("budgets_exceeded", pa.list_(pa.string())),
+            (
+                "file_level_entropy",
+                pa.list_(pa.struct([("file", pa.string()), ("entropy", pa.float64())])),
+            ),
+            (
+                "directory_entropy",
+                pa.list_(
+                    pa.struct(
+                        [
+                            ("path", pa.string()),
+                            ("depth", pa.int32()),
+                            ("number_of_files", pa.int64()),
+                            ("lines_changed", pa.int64()),
+                            ("entropy", pa.float64()),
+                            ("normalized_entropy", pa.float64()),
+                        ]
+                    )
+                ),
+            ),
+        ]
+    )
+
+
+def _to_row(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts repository data into a row of the result schema,
+    leaving keys outside the schema behind.
+    """
+    first_date, last_date = result.get("time_range_of_commits") or (None, None)
+    file_entropy = result.get("file_level_entropy")
+    directory_entropy = result.get("directory_entropy")
+    return {
+        "repo_url": result.get("repo_url"),
+        "repo_path": result.get("repo_path"),
+        "error": result.get("error"),
+        "total_normalized_entropy": result.get("total_normalized_entropy"),
+        "number_of_commits": result.get("number_of_commits"),
+        "number_of_files": result.get("number_of_files"),
+        "first_commit_date": date.fromisoformat(first_date) if first_date else None,
+        "most_recent_commit_date": (
+            date.fromisoformat(last_date) if last_date else None
+        ),
+        "total_lines_added": result.get("total_lines_added"),
+        "total_lines_deleted": result.get("total_lines_deleted"),
+        "partial": result.get("partial"),
+        "budgets_exceeded": result.get("budgets_exceeded"),
+        "file_level_entropy": (
+            None
+            if file_entropy is None
+            else [
+                {"file": file_name, "entropy": entropy}
+                for file_name, entropy in file_entropy.items()
+            ]
+        ),
+        "directory_entropy": (
+            None
+            if directory_entropy is None
+            else [{"path": path, **stats} for path, stats in directory_entropy.items()]
+        ),
+    }
+
+
+def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a row of the result schema back into repository data
+    as returned by compute_repo_data.
+    """
+    if row["error"] is not None:
+        return {key: row[key] for key in ("repo_url", "repo_path", "error") if row[key]}
+    result = {
+        key: row[key]
+        for key in (
+            "repo_url",
+            "repo_path",
+            "total_normalized_entropy",
+            "number_of_commits",
+            "number_of_files",
+            "total_lines_added",
+            "total_lines_deleted",
+            "partial",
+            "budgets_exceeded",
+        )
+        if row[key] is not None
+    }
+    result["time_range_of_commits"] = tuple(
+        None if day is None else day.isoformat()
+        for day in (row["first_commit_date"], row["most_recent_commit_date"])
+    )
+    result["file_level_entropy"] = {
+        entry["file"]: entry["entropy"] for entry in row["file_level_entropy"] or []
+    }
+    if row["directory_entropy"] is not None:
+        result["directory_entropy"] = {
+            entry.pop("path"): entry for entry in row["directory_entropy"]
+        }
+    return result
+
+
+class ParquetResultWriter:
+    """
+    Streams repository data into one Parquet file, converting buffered results
+    into an Arrow record batch and writing it as a row group each time
+    row_group_size results arrive, so memory stays constant however many
+    repositories are written.
+
+    A Parquet file is only readable once closed, since its footer records
+    where each row group lies.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the Parquet file.
+        row_group_size (int): Number of repositories in each row group.
+        compression (str): The compression codec of the file.
+
+    Example:
+        >>> with ParquetResultWriter("corpus.parquet") as writer:
+        ...     for data in compute_repos_data(repo_paths):
+        ...         writer.write(data)
+    """
+
+    def __init__(
+        self,
+        path: Union[str, pathlib.Path],
+        row_group_size: int = ROW_GROUP_SIZE,
+        compression: str = "zstd",
+    ) -> None:
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be positive.")
+        pa = _import_pyarrow()
+        self.path = pathlib.Path(path)
+        self.row_group_size = row_group_size
+        self.schema = result_schema()
+        self.rows = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._writer = pa.parquet.ParquetWriter(
+            str(self.path), self.schema, compression=compression
+        )
+
+    def __enter__(self) -> "ParquetResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, result: Dict[str, Any]) -> None:
+        """
+        Buffers the data of a repository, writing a row group once the buffer is full.
+
+        Args:
+            result (Dict[str, Any]): The data of the repository.
+        """
+        self._buffer.append(_to_row(result))
+        self.rows += 1
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def write_many(self, results: Iterable[Dict[str, Any]]) -> None:
+        """
+        Writes the data of many repositories.
+
+        Args:
+            results (Iterable[Dict[str, Any]]): The data of each repository.
+        """
+        for result in results:
+            self.write(result)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered results as a row group.
+        """
+        if not self._buffer:
+            return
+        pa = _import_pyarrow()
+        batch = pa.RecordBatch.from_pylist(self._buffer, schema=self.schema)
+        self._writer.write_batch(batch, row_group_size=self.row_group_size)
+        self._buffer.clear()
+
+    def close(self) -> None:
+        """
+        Writes the remaining results and the file footer.
+        """
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
+
+
+def read_parquet_results(path: Union[str, pathlib.Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Reads repository data from a Parquet file one row group at a time.
+
+    Args:
+        path (Union[str, pathlib.Path]): The path to the Parquet file.
+
+    Yields:
+        Dict[str, Any]: The data of each repository.
+    """
+    pa = _import_pyarrow()
+    parquet_file = pa.parquet.ParquetFile(str(path))
+    for row_group in range(parquet_file.num_row_groups):
+        for row in parquet_file.read_row_group(row_group).to_pylist():
+            yield _from_row(row)
+
+
+def _is_readable(path: pathlib.Path) -> bool:
+    """
+    Returns whether a Parquet file exists and has its footer.
+    """
+    pa = _import_pyarrow()
+    try:
+        pa.parquet.ParquetFile(str(path))
+    except (OSError, pa.ArrowException):
+        return False
+    return True
+
+
+def _write_durably(path: pathlib.Path, results: List[Dict[str, Any]]) -> None:
+    """
+    Writes results to a Parquet file which appears only once complete
+    and flushed to disk.
+    """
+    temporary_path = path.with_name(f".{path.name}.tmp")
+    with ParquetResultWriter(temporary_path) as writer:
+        writer.write_many(results)
+    with open(temporary_path, "rb") as result_file:
+        os.fsync(result_file.fileno())
+    os.replace(temporary_path, path)
+
+
+class ParquetSink:
+    """
+    Writes the result batches of a corpus run into Parquet part files of about
+    rows_per_file repositories each, in row groups of a fixed schema.
+
+    An open Parquet file has no footer and cannot be read, so each batch is
+    also staged in a small file of its own before the corpus manifest records
+    it as completed. Once a part file holds rows_per_file repositories it is
+    closed and its staged batches are removed, so a corpus ends up in few,
+    large files. A crash loses no flushed results: the results of a part file
+    left without a footer are read from its staged batches, and the sink
+    rewrites such part files from them before it opens a new one.
+
+    Args:
+        output_dir (Union[str, pathlib.Path]): The directory for result files.
+        row_group_size (int): Number of repositories in each row group.
+        rows_per_file (Optional[int]): Number of repositories to append to a
+            part file before closing it and starting a new one. Defaults to
+            row_group_size, so each part file holds one full row group.
+
+    Example:
+        >>> run_corpus(repo_urls, "corpus", sink=ParquetSink("corpus"))
+    """
+
+    # file name pattern of result files
+    pattern = "results-{batch:06d}.parquet"
+
+    def __init__(
+        self,
+        output_dir: Union[str, pathlib.Path],
+        row_group_size: int = ROW_GROUP_SIZE,
+        rows_per_file: Optional[int] = None,
+    ) -> None:
+        _import_pyarrow()
+        self.output_dir = pathlib.Path(output_dir)
+        self.row_group_size = row_group_size
+        self.rows_per_file = row_group_size if rows_per_file is None else rows_per_file
+        self._writer: Optional[ParquetResultWriter] = None
+        self._name: Optional[str] = None
+
+    def __enter__(self) -> "ParquetSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write_batch(self, batch: int, results: List[Dict[str, Any]]) -> str:
+        """
+        Stages a batch of results and appends it to the open part file,
+        opening a new part file named after the batch when none is open.
+        The part file is closed once it holds rows_per_file repositories.
+
+        Args:
+            batch (int): The number of the batch.
+            results (List[Dict[str, Any]]): The data of each repository.
+
+        Returns:
+            str: The name of the part file within the output directory.
+        """
+        if self._writer is None:
+            self._recover()
+            self._name = self.pattern.format(batch=batch)
+            self._writer = ParquetResultWriter(
+                self.output_dir / self._name, self.row_group_size
+            )
+        name = self._name
+        staging_dir = self._staging_dir(name)
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        _write_durably(staging_dir / self.pattern.format(batch=batch), results)
+        self._writer.write_many(results)
+        if self._writer.rows >= self.rows_per_file:
+            self._close_file()
+        return name
+
+    def close(self) -> None:
+        """
+        Closes the open part file, making its results readable.
+        """
+        self._close_file()
+
+    def _staging_dir(self, name: str) -> pathlib.Path:
+        return self.output_dir / STAGING_DIR / name
+
+    def _close_file(self) -> None:
+        """
+        Writes the footer of the open part file, closes it and removes
+        its staged batches.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            shutil.rmtree(self._staging_dir(self._name), ignore_errors=True)
+            self._writer = None
+            self._name = None
+
+    def _recover(self) -> None:
+        """
+        Rewrites part files left without a footer by a crash from their
+        staged batches, and removes the staged batches of closed part files.
+        """
+        staging_root = self.output_dir / STAGING_DIR
+        if not staging_root.is_dir():
+            return
+        for staging_dir in sorted(staging_root.iterdir()):
+            part_path = self.output_dir / staging_dir.name
+            if not _is_readable(part_path):
+                results = list(self._read_staged(staging_dir.name))
+                if results:
+                    _write_durably(part_path, results)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _read_staged(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Reads the results of the batches staged for a part file.
+        """
+        for staged_path in sorted(self._staging_dir(name).glob("*.parquet")):
+            yield from read_parquet_results(staged_path)
+
+    def is_complete(self, name: str) -> bool:
+        """
+        Returns whether the results of a part file can be read, either from
+        the closed part file or from its staged batches.
+
+        Args:
+            name (str): The name of the part file within the output directory.
+        """
+        return _is_readable(self.output_dir / name) or any(
+            self._staging_dir(name).glob("*.parquet")
+        )
+
+    def read(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Reads the results of a part file, or of its staged batches while
+        it is open or was left without a footer.
+
+        Args:
+            name (str): The name of the part file within the output directory.
+
+        Yields:
+            Dict[str, Any]: The data of each repository.
+        """
+        if _is_readable(self.output_dir / name):
+            yield from read_parquet_results(self.output_dir / name)
+        else:
+            yield from self._read_staged(name)
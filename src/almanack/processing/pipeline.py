@@ -0,0 +1,347 @@
+"""
+This module clones and analyzes repositories in a staged pipeline
+"""
+
+import contextlib
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .compute_data import compute_repo_data
+from .mirror_cache import MirrorCache
+from .repo_pool import POLL_INTERVAL, RepoPool, WorkerOptions
+from .workspace import Workspace
+
+
+def _analyze_clone(item: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+    """
+    Computes the data of a cloned repository in an analysis worker,
+    passing clone failures through.
+    """
+    if "error" in item:
+        return {"repo_url": item["repo_url"], "error": item["error"]}
+    data = compute_repo_data(item["repo_path"], **kwargs)
+    data["repo_url"] = item["repo_url"]
+    return data
+
+
+class StageStats:
+    """
+    Throughput and waiting time of one stage of a pipeline.
+
+    Attributes:
+        completed (int): Number of repositories the stage finished.
+        failed (int): Number of repositories which failed in the stage.
+        busy_seconds (float): Time spent working, summed over concurrent workers.
+        blocked_seconds (float): Time spent waiting on the next stage because
+            every clone slot was taken (back-pressure), or for analysis, worker
+            time spent idle waiting for clones.
+    """
+
+    def __init__(self) -> None:
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            self.completed += 1
+            self.failed += failed
+            self.busy_seconds += seconds
+
+    def record_blocked(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_seconds += seconds
+
+    def summary(self, wall_seconds: float) -> Dict[str, float]:
+        """
+        Returns the counters along with the stage's throughput.
+        """
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_seconds": self.busy_seconds,
+            "blocked_seconds": self.blocked_seconds,
+            "repos_per_second": self.completed / wall_seconds if wall_seconds else 0.0,
+        }
+
+
+class CloneOptions(NamedTuple):
+    """
+    How the clone stage of a RepoPipeline fetches repositories.
+
+    Attributes:
+        workers (int): Number of repositories cloned concurrently.
+        workspace (Optional[Workspace]): An entered workspace which holds the clones
+            and enforces their disk budget. When None, a workspace is created for
+            each run.
+        mirror_cache (Optional[MirrorCache]): A persistent store of repository
+            mirrors to fetch into instead of cloning into a workspace.
+        bare (bool): Whether to clone without checking out a working tree.
+    """
+
+    workers: int = 4
+    workspace: Optional[Workspace] = None
+    mirror_cache: Optional[MirrorCache] = None
+    bare: bool = True
+
+
+class _PipelineRun:
+    """
+    The state shared by the clone threads and the analysis stage of one run.
+    """
+
+    def __init__(
+        self, repo_urls: Iterable[str], workspace: Optional[Workspace]
+    ) -> None:
+        self.repo_urls = iter(enumerate(repo_urls))
+        self.urls_lock = threading.Lock()
+        self.workspace = workspace
+        # Clones are bounded by slots, so the queue between the stages is not
+        self.cloned: queue.Queue = queue.Queue()
+        self.clones: Dict[int, contextlib.ExitStack] = {}
+        self.stop = threading.Event()
+
+
+class RepoPipeline:
+    """
+    Clones and analyzes repositories in two overlapping stages, so that network
+    transfers and computation proceed at the same time.
+
+    A pool of clone threads with its own concurrency limit fills a queue of
+    cloned repositories, which a pool of analysis processes drains. Each clone
+    takes one of queue_size + analysis_workers slots before it starts and
+    frees it once its analysis completes and the clone is removed, so at most
+    that many clones, whether being cloned, waiting or being analyzed, are held
+    on disk at once. When the analysis stage falls behind, clone threads wait
+    for a free slot (back-pressure).
+
+    Args:
+        clone_options (Optional[CloneOptions]): The number of clone threads and
+            where repositories are cloned. Defaults to four threads cloning bare
+            repositories into a workspace created for each run.
+        analysis_workers (Optional[int]): Number of analysis processes.
+            Defaults to the number of CPUs.
+        queue_size (Optional[int]): Number of clones held on disk beyond those
+            being analyzed. Defaults to analysis_workers.
+        worker_options (Optional[WorkerOptions]): The maximum seconds spent
+            analyzing one repository, the maximum resident memory of an analysis
+            process in bytes and the start method of analysis processes. The start
+            method defaults to "forkserver", since forking while clone threads
+            run is unsafe.
+
+    Example:
+        >>> pipeline = RepoPipeline(CloneOptions(workers=8), analysis_workers=4)
+        >>> for data in pipeline.run(repo_urls):
+        ...     print(data["repo_url"], data.get("error"))
+        >>> pipeline.stats()
+    """
+
+    def __init__(
+        self,
+        clone_options: Optional[CloneOptions] = None,
+        analysis_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        worker_options: Optional[WorkerOptions] = None,
+    ) -> None:
+        if clone_options is None:
+            clone_options = CloneOptions()
+        if clone_options.workers < 1:
+            raise ValueError("A pipeline needs at least one clone worker.")
+        if worker_options is None:
+            worker_options = WorkerOptions()
+        if worker_options.mp_context is None:
+            worker_options = worker_options._replace(mp_context="forkserver")
+        self.clone_workers = clone_options.workers
+        self.pool = RepoPool(
+            workers=analysis_workers,
+            function=_analyze_clone,
+            worker_options=worker_options,
+        )
+        self.queue_size = queue_size or self.pool.workers
+        self._slots = threading.Semaphore(self.queue_size + self.pool.workers)
+        self.workspace = clone_options.workspace
+        self.mirror_cache = clone_options.mirror_cache
+        self.bare = clone_options.bare
+        self.clone_stats = StageStats()
+        self.analysis_stats = StageStats()
+        self._wall_seconds = 0.0
+
+    def __enter__(self) -> "RepoPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the analysis processes.
+        """
+        self.pool.close()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the throughput and waiting time of each stage over the runs so far.
+
+        Returns:
+            Dict[str, Dict[str, float]]: The "clone" and "analysis" stage statistics.
+        """
+        return {
+            "clone": self.clone_stats.summary(self._wall_seconds),
+            "analysis": self.analysis_stats.summary(self._wall_seconds),
+        }
+
+    def _clone_stage(self, run: _PipelineRun) -> None:
+        """
+        Clones repositories until the URLs run out, putting each clone or
+        clone failure on the queue. Each clone holds a slot until it is removed.
+        """
+        while not run.stop.is_set():
+            # Wait for a free slot, which applies back-pressure
+            start = time.perf_counter()
+            while not self._slots.acquire(timeout=POLL_INTERVAL):
+                if run.stop.is_set():
+                    return
+            self.clone_stats.record_blocked(time.perf_counter() - start)
+            with run.urls_lock:
+                index, repo_url = next(run.repo_urls, (None, None))
+            if index is None:
+                self._slots.release()
+                break
+
+            start = time.perf_counter()
+            clone = contextlib.ExitStack()
+            clone.callback(self._slots.release)
+            try:
+                repo_path = clone.enter_context(
+                    self.mirror_cache.mirror(repo_url)
+                    if self.mirror_cache is not None
+                    else run.workspace.clone(repo_url, bare=self.bare)
+                )
+                item = {
+                    "index": index,
+                    "repo_url": repo_url,
+                    "repo_path": str(repo_path),
+                }
+                run.clones[index] = clone
+                failed = False
+            except Exception as e:
+                clone.close()
+                item = {
+                    "index": index,
+                    "repo_url": repo_url,
+                    "error": f"Clone failed: {e}",
+                }
+                failed = True
+            self.clone_stats.record(time.perf_counter() - start, failed)
+            run.cloned.put(item)
+        # Tell the analysis stage that this clone thread is done
+        run.cloned.put(None)
+
+    def _cloned_items(self, run: _PipelineRun) -> Iterator:
+        """
+        Yields cloned repositories from the queue until every clone thread finishes.
+        """
+        remaining = self.clone_workers
+        while remaining and not run.stop.is_set():
+            try:
+                item = run.cloned.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is None:
+                remaining -= 1
+            else:
+                yield item
+
+    def run(self, repo_urls: Iterable[str], **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Clones and analyzes each repository, yielding the data of each
+        repository as its analysis completes.
+
+        Args:
+            repo_urls (Iterable[str]): The URLs of the repositories.
+            **kwargs (Any): Keyword arguments passed to compute_repo_data.
+
+        Yields:
+            Dict[str, Any]: The data of each repository as returned by
+            compute_repo_data along with its "repo_url", or a dictionary
+            with "repo_url" and "error" when cloning or analysis failed.
+        """
+        run_start = time.perf_counter()
+        # Analysis waits for clones where the pool's workers sit idle
+        idle_start = self.pool.idle_seconds
+
+        with contextlib.ExitStack() as run_stack:
+            workspace = self.workspace
+            if workspace is None and self.mirror_cache is None:
+                workspace = run_stack.enter_context(Workspace())
+            run = _PipelineRun(repo_urls, workspace)
+
+            threads: List[threading.Thread] = [
+                threading.Thread(target=self._clone_stage, args=(run,), daemon=True)
+                for _ in range(self.clone_workers)
+            ]
+            for thread in threads:
+                thread.start()
+
+            results = self.pool.imap_unordered(self._cloned_items(run), **kwargs)
+            try:
+                for result in results:
+                    # Remove the clone as soon as its analysis completes
+                    clone = run.clones.pop(result.item["index"], None)
+                    if clone is not None:
+                        clone.close()
+                    # Clone failures pass through analysis but count as clone failures
+                    self.analysis_stats.record(
+                        result.seconds,
+                        failed=result.error is not None
+                        or ("error" in result.value and "error" not in result.item),
+                    )
+                    yield (
+                        result.value
+                        if result.error is None
+                        else {
+                            "repo_url": result.item["repo_url"],
+                            "error": result.error,
+                        }
+                    )
+            finally:
+                run.stop.set()
+                results.close()
+                for thread in threads:
+                    thread.join()
+                for clone in run.clones.values():
+                    clone.close()
+                self.analysis_stats.record_blocked(self.pool.idle_seconds - idle_start)
+                self._wall_seconds += time.perf_counter() - run_start
+
+
+def analyze_repositories(
+    repo_urls: Iterable[str],
+    clone_workers: int = 4,
+    analysis_workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Clones and analyzes many repositories with overlapping clone and analysis
+    stages, yielding the data of each repository as it completes.
+
+    Args:
+        repo_urls (Iterable[str]): The URLs of the repositories.
+        clone_workers (int): Number of repositories cloned concurrently.
+        analysis_workers (Optional[int]): Number of analysis processes.
+        queue_size (Optional[int]): Number of clones held on disk beyond
+            those being analyzed.
+        **kwargs (Any): Keyword arguments passed to compute_repo_data.
+
+    Yields:
+        Dict[str, Any]: The data of each repository along with its "repo_url".
+    """
+    with RepoPipeline(
+        CloneOptions(clone_workers), analysis_workers, queue_size
+    ) as pipeline:
+        yield from pipeline.run(repo_urls, **kwargs)
@@ -2,38 +2,173 @@
 This module procesess GitHub data
 """
 
+import contextlib
 import json
 import pathlib
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+from almanack.processing.budget import AnalysisBudget
+from almanack.processing.churn_index import ChurnIndex
 from almanack.processing.compute_data import compute_repo_data
-from almanack.reporting.report import repo_report
+from almanack.processing.corpus import CorpusOptions, run_corpus
+from almanack.processing.diff_cache import DiffStatsCache
+from almanack.processing.diff_filters import DiffFilter
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.entropy_series import WindowSpec, calculate_entropy_series
+from almanack.processing.git_operations import is_repository
+from almanack.processing.parquet_sink import ParquetSink
+from almanack.processing.pipeline import CloneOptions, RepoPipeline
+from almanack.processing.repo_session import RepoSession
+from almanack.reporting.report import repo_report, series_report
 
 
-def process_repo_entropy(repo_path: str) -> None:
+def _as_list(value: Optional[Union[str, List[str]]]) -> Optional[List[str]]:
+    """
+    Converts a comma-separated string from the command line into a list.
+    """
+    if value is None or isinstance(value, (list, tuple)):
+        return value
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+def _check_repository(repo_path: str) -> pathlib.Path:
+    """
+    Checks that a path contains a Git repository, with a working tree or bare.
+    """
+    repo_path = pathlib.Path(repo_path)
+    if not repo_path.exists() or not is_repository(repo_path):
+        raise FileNotFoundError(f"The directory {repo_path} is not a repository")
+    return repo_path
+
+
+def _diff_filter_from_options(options: Dict[str, Any]) -> Optional[DiffFilter]:
+    """
+    Builds a diff filter from the "include", "exclude", "max_blob_size" and
+    "presets" command line options, removing them from the options. The diff
+    is only filtered when filters were requested.
+    """
+    include, exclude, max_blob_size, presets = (
+        options.pop(name, None)
+        for name in ("include", "exclude", "max_blob_size", "presets")
+    )
+    if all(option is None for option in (include, exclude, max_blob_size, presets)):
+        return None
+    return DiffFilter(
+        include=_as_list(include),
+        exclude=_as_list(exclude),
+        max_blob_size=max_blob_size,
+        presets=_as_list(presets),
+    )
+
+
+def _diff_options_from_options(
+    options: Dict[str, Any], stack: contextlib.ExitStack
+) -> DiffOptions:
+    """
+    Builds diff options from the diff filter, "diff_profile", "backend",
+    "diff_workers" and "diff_cache" command line options, removing them from
+    the options. A diff statistics cache is opened within the stack.
+    """
+    diff_filter = _diff_filter_from_options(options)
+    diff_cache = options.pop("diff_cache", None)
+    return DiffOptions(
+        diff_filter=diff_filter,
+        diff_profile=options.pop("diff_profile", None),
+        backend=options.pop("backend", None),
+        workers=options.pop("diff_workers", None),
+        cache=(
+            None
+            if diff_cache is None
+            else stack.enter_context(DiffStatsCache(diff_cache))
+        ),
+    )
+
+
+def _budget_from_options(options: Dict[str, Any]) -> Optional[AnalysisBudget]:
+    """
+    Builds an analysis budget from the "max_files", "max_blob_bytes",
+    "max_seconds" and "max_commits" command line options, removing them from
+    the options. The analysis is only bounded when limits were requested.
+    """
+    limits = [
+        options.pop(name, None)
+        for name in ("max_files", "max_blob_bytes", "max_seconds", "max_commits")
+    ]
+    if all(limit is None for limit in limits):
+        return None
+    return AnalysisBudget(*limits)
+
+
+def _pop_options(options: Dict[str, Any], names: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Removes the named command line options which were given from the
+    options, leaving the defaults of the others to the object built from them.
+    """
+    return {name: options.pop(name) for name in names if name in options}
+
+
+def _check_no_options(options: Dict[str, Any]) -> None:
+    """
+    Rejects command line options which no builder recognized.
+    """
+    if options:
+        raise TypeError(f"Unknown options: {sorted(options)}.")
+
+
+def process_repo_entropy(
+    repo_path: str, report_depth: int = 2, profile: bool = False, **options: Any
+) -> None:
     """
     Processes GitHub repository data to calculate a report.
 
     Args:
         repo_path (str): The local path to the Git repository.
+        report_depth (int): Deepest directories shown in the report's directory
+            tree. The JSON output includes every directory.
+        profile (bool): Whether to report the wall and CPU time of each stage of
+            the analysis, along with counters of the work done.
+        **options (Any): Options of the diff and of the analysis budget:
+
+            - include, exclude: Pathspecs to include in or exclude from the
+              analysis, as a list or a comma-separated string.
+            - max_blob_size: Files larger than this many bytes are skipped.
+            - presets: Built-in exclude presets ("vendored", "generated",
+              "binary"), as a list or a comma-separated string.
+            - diff_profile: Name of a built-in diff options profile ("default",
+              "fast", "ignore-whitespace", "renames" or "thorough").
+            - backend: Name of the diff backend used to count changed lines
+              ("pygit2", "git-cli" or "gitpython").
+            - diff_workers: Number of shards of the diff to run concurrently
+              with the git-cli backend.
+            - diff_cache: Path to a persistent diff statistics cache, which is
+              created when it does not exist.
+            - max_files: Maximum number of changed files diffed, beyond which
+              files are sampled.
+            - max_blob_bytes: Maximum bytes of blobs loaded to count lines.
+            - max_seconds: Maximum seconds spent on the analysis.
+            - max_commits: Maximum number of recent commits walked.
 
     Returns:
         str: A JSON string containing the repository data and entropy metrics.
 
     Raises:
         FileNotFoundError: If the specified directory does not contain a valid Git repository.
+        TypeError: If an option is not one of the options above.
     """
 
-    repo_path = pathlib.Path(repo_path)
-
-    # Check if the directory contains a Git repository
-    if not repo_path.exists() or not (repo_path / ".git").exists():
-        raise FileNotFoundError(f"The directory {repo_path} is not a repository")
+    repo_path = _check_repository(repo_path)
 
     # Process the repository and get the dictionary
-    entropy_data = compute_repo_data(str(repo_path))
+    with contextlib.ExitStack() as stack:
+        diff_options = _diff_options_from_options(options, stack)
+        budget = _budget_from_options(options)
+        _check_no_options(options)
+        entropy_data = compute_repo_data(
+            str(repo_path), diff_options, profile=profile, budget=budget
+        )
 
     # Generate and print the report from the dictionary
-    report_content = repo_report(entropy_data)
+    report_content = repo_report(entropy_data, max_depth=report_depth)
 
     # Convert the dictionary to a JSON string
     json_string = json.dumps(entropy_data)
@@ -42,3 +177,161 @@ def process_repo_entropy(repo_path: str) -> None:
 
     # Return the JSON string and report content
     return json_string
+
+
+def process_repo_entropy_series(
+    repo_path: str,
+    window: str = "month",
+    churn_index: Optional[str] = None,
+    **options: Any,
+) -> str:
+    """
+    Processes a repository's history to calculate an entropy time series report,
+    walking the history once.
+
+    Args:
+        repo_path (str): The local path to the Git repository.
+        window (str): How to split the history: "commits", "month" or "release".
+        churn_index (Optional[str]): Path to a persistent churn index of the
+            repository, which is created or updated with the new commits.
+        **options (Any): Options of the windows and of the diff:
+
+            - size: Number of commits in each "commits" window.
+            - step: Number of commits between the starts of "commits" windows,
+              for rolling windows. Defaults to size.
+            - tag_pattern: Glob pattern selecting release tags, such as "v*".
+            - include, exclude, max_blob_size, presets, diff_profile, backend,
+              diff_workers and diff_cache, as for process_repo_entropy.
+
+    Returns:
+        str: A JSON string containing the entropy of each window.
+
+    Raises:
+        FileNotFoundError: If the specified directory does not contain a valid Git repository.
+        TypeError: If an option is not one of the options above.
+    """
+    repo_path = _check_repository(repo_path)
+
+    with contextlib.ExitStack() as stack:
+        window_spec = WindowSpec(
+            window, **_pop_options(options, ("size", "step", "tag_pattern"))
+        )
+        diff_options = _diff_options_from_options(options, stack)
+        _check_no_options(options)
+        session = stack.enter_context(
+            RepoSession(repo_path, diff_cache=diff_options.cache)
+        )
+        index = (
+            None
+            if churn_index is None
+            else stack.enter_context(ChurnIndex(churn_index))
+        )
+        series = calculate_entropy_series(
+            session, window_spec, diff_options, churn_index=index
+        )
+
+    print(series_report(str(repo_path), window, series))
+
+    return json.dumps(series)
+
+
+def process_churn_index(repo_path: str, index_path: str, **options: Any) -> str:
+    """
+    Creates or refreshes the persistent churn index of a repository, diffing
+    only the commits which are not indexed yet, and summarizes its
+    cumulative churn.
+
+    Args:
+        repo_path (str): The local path to the Git repository.
+        index_path (str): Path to the churn index of the repository.
+        **options (Any): Options of the diff: include, exclude, max_blob_size,
+            presets, diff_profile, backend, diff_workers and diff_cache, as for
+            process_repo_entropy.
+
+    Returns:
+        str: A JSON string with the number of commits indexed by this update and in
+        total, and the number of files, lines changed and normalized entropy of the
+        cumulative churn.
+
+    Raises:
+        TypeError: If an option is not one of the options above.
+    """
+    repo_path = _check_repository(repo_path)
+
+    with contextlib.ExitStack() as stack:
+        diff_options = _diff_options_from_options(options, stack)
+        _check_no_options(options)
+        index = stack.enter_context(ChurnIndex(index_path))
+        new_commits = index.update(repo_path, diff_options)
+        profile = index.entropy_profile()
+        return json.dumps(
+            {
+                "repo_path": str(repo_path),
+                "new_commits": new_commits,
+                "number_of_commits": index.count_commits(),
+                "number_of_files": profile.number_of_files,
+                "total_lines_changed": profile.total_lines_changed,
+                "normalized_entropy": profile.aggregate_entropy,
+            }
+        )
+
+
+def process_corpus(
+    url_file: str,
+    output_dir: str,
+    clone_workers: int = 4,
+    analysis_workers: Optional[int] = None,
+    output_format: str = "jsonl",
+    **options: Any,
+) -> str:
+    """
+    Clones and analyzes every repository listed in a file, resuming
+    from the manifest of an earlier run in the same output directory.
+
+    Args:
+        url_file (str): Path to a text file with one repository URL per line.
+        output_dir (str): The directory holding the manifest and result files.
+        clone_workers (int): Number of repositories cloned concurrently.
+        analysis_workers (Optional[int]): Number of analysis processes.
+        output_format (str): The format of result files, "jsonl" for JSON Lines
+            files of flush_every results or "parquet" for Parquet part files,
+            which requires pyarrow.
+        **options (Any): Options of the run:
+
+            - flush_every: Number of results written to each result file.
+              Defaults to 100.
+            - retry_failed: Whether to retry repositories which failed in
+              earlier runs. Defaults to True.
+
+    Returns:
+        str: A JSON string with the number of repositories skipped, completed and failed.
+
+    Raises:
+        TypeError: If an option is not one of the options above.
+    """
+    if output_format not in ("jsonl", "parquet"):
+        raise ValueError(
+            f"Unknown output format {output_format!r}. "
+            "Available formats are: ['jsonl', 'parquet']."
+        )
+    corpus_options = CorpusOptions(
+        **_pop_options(options, ("flush_every", "retry_failed"))
+    )
+    _check_no_options(options)
+    with open(url_file) as urls:
+        repo_urls = [line.strip() for line in urls if line.strip()]
+
+    with RepoPipeline(CloneOptions(clone_workers), analysis_workers) as pipeline:
+        summary = run_corpus(
+            repo_urls,
+            output_dir,
+            corpus_options,
+            pipeline=pipeline,
+            sink=ParquetSink(output_dir) if output_format == "parquet" else None,
+        )
+
+    print(
+        f"Skipped {summary['skipped']}, completed {summary['completed']} "
+        f"and failed {summary['failed']} repositories."
+    )
+    return json.dumps(summary)
@@ -0,0 +1,113 @@
+"""
+This module measures the time spent in each stage of an analysis
+"""
+
+import contextlib
+import resource
+import time
+from typing import Any, Dict, Iterator
+
+
+def _cpu_seconds() -> float:
+    """
+    Returns the CPU time used by this process and its finished child processes,
+    which includes the git processes run by the git-cli backend.
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class StageProfiler:
+    """
+    Records the wall and CPU time of named stages of an analysis, along with
+    counters of the work done, such as the number of files diffed.
+
+    Stages may repeat, in which case their times and calls accumulate. CPU
+    time is measured for the whole process, so stages which overlap with
+    other threads include the CPU time of those threads.
+
+    Example:
+        >>> profiler = StageProfiler()
+        >>> with profiler.stage("diff"):
+        ...     profiler.count("files_diffed", 3)
+        >>> profiler.summary()
+    """
+
+    # whether measurements are recorded, so callers can skip work only
+    # needed to feed counters
+    enabled = True
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._start = time.perf_counter()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures the time spent within the block as part of a stage.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+        try:
+            yield
+        finally:
+            stats = self.stages.setdefault(
+                name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0}
+            )
+            stats["wall_seconds"] += time.perf_counter() - wall_start
+            stats["cpu_seconds"] += _cpu_seconds() - cpu_start
+            stats["calls"] += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (int): The amount added.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns the measurements as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, Any]: The "stages" with their "wall_seconds", "cpu_seconds"
+            and "calls", the "counters", and the "wall_seconds" since the
+            profiler was created.
+        """
+        return {
+            "stages": {name: dict(stats) for name, stats in self.stages.items()},
+            "counters": dict(self.counters),
+            "wall_seconds": time.perf_counter() - self._start,
+        }
+
+
+class NullProfiler(StageProfiler):
+    """
+    A profiler which records nothing, used when profiling is disabled so
+    that instrumented code costs a method call per stage.
+    """
+
+    enabled = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._null_stage = contextlib.nullcontext()
+
+    def stage(self, name: str) -> contextlib.nullcontext:
+        return self._null_stage
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+
+# shared profiler of sessions which are not profiled
+NULL_PROFILER = NullProfiler()
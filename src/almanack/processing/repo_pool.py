@@ -0,0 +1,545 @@
+"""
+This module computes data for many repositories with a pool of worker processes
+"""
+
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import pathlib
+import queue
+import resource
+import sys
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .compute_data import compute_repo_data
+
+# seconds between checks of running tasks for timeouts and memory use
+POLL_INTERVAL = 0.2
+
+
+class WorkerOptions(NamedTuple):
+    """
+    Limits and the start method of the worker processes of a RepoPool.
+
+    Attributes:
+        timeout (Optional[float]): Maximum seconds a single task may run.
+        max_rss (Optional[int]): Maximum resident memory of a worker in bytes.
+            Workers which exceed it are replaced after their current task,
+            and are killed during the task where /proc reports their memory use.
+        mp_context (Optional[str]): The multiprocessing start method, such as
+            "fork", "forkserver" or "spawn". Defaults to the platform default.
+    """
+
+    timeout: Optional[float] = None
+    max_rss: Optional[int] = None
+    mp_context: Optional[str] = None
+
+
+class TaskResult(NamedTuple):
+    """
+    The outcome of one task run by a RepoPool.
+
+    Attributes:
+        index (int): The position of the item among the items submitted.
+        item (Any): The item the task was run for.
+        value (Any): The value returned by the task, or None when it failed.
+        error (Optional[str]): Why the task failed, or None when it succeeded.
+        seconds (float): Time spent running the task.
+    """
+
+    index: int
+    item: Any
+    value: Any
+    error: Optional[str]
+    seconds: float
+
+
+def _peak_rss() -> int:
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes while macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss(pid: int) -> Optional[int]:
+    """
+    Returns the current resident set size of a process in bytes,
+    or None where /proc is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _pool_worker(
+    connection: multiprocessing.connection.Connection,
+    function: Callable[..., Any],
+    max_rss: Optional[int],
+) -> None:
+    """
+    Runs chunks of tasks sent by the pool until told to stop, reporting when
+    each task starts and finishes. Retires once its peak memory use exceeds
+    max_rss so that the pool replaces it with a fresh process.
+    """
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        chunk, kwargs = message
+        for index, item in chunk:
+            connection.send(("start", index))
+            start = time.perf_counter()
+            try:
+                value, error = function(item, **kwargs), None
+            except Exception as e:
+                value, error = None, f"{type(e).__name__}: {e}"
+            connection.send(("done", index, value, error, time.perf_counter() - start))
+            if max_rss is not None and _peak_rss() > max_rss:
+                # The pool requeues the rest of the chunk
+                connection.send(("retire",))
+                return
+
+
+def _feed_items(items: Iterable[Any], feed: queue.Queue, stop: threading.Event) -> None:
+    """
+    Moves items from an iterable into a bounded queue, so that items produced
+    slowly, such as repositories being cloned, are consumed as they arrive.
+    Ends with ("end",), or with ("error", exception) if the iterable raised.
+    """
+
+    def put(message: Tuple) -> bool:
+        # Wait for room in the queue while checking whether to stop
+        while not stop.is_set():
+            try:
+                feed.put(message, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for index, item in enumerate(items):
+            if not put(("item", index, item)):
+                return
+    except Exception as e:
+        put(("error", e))
+        return
+    put(("end",))
+
+
+class _PoolWorker:
+    """
+    A worker process with a pipe to the pool and the tasks assigned to it.
+    """
+
+    def __init__(
+        self,
+        context: multiprocessing.context.BaseContext,
+        function: Callable[..., Any],
+        max_rss: Optional[int],
+    ) -> None:
+        # A pipe per worker means killing a worker cannot corrupt shared queues
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_pool_worker,
+            args=(child_connection, function, max_rss),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        # Tasks sent to the worker which have not finished, in order
+        self.assigned: Dict[int, Any] = {}
+        self.current: Optional[int] = None
+        self.started = 0.0
+
+    def assign(self, chunk: List[Tuple[int, Any]], kwargs: Dict[str, Any]) -> None:
+        self.assigned.update(chunk)
+        self.connection.send((chunk, kwargs))
+
+    def stop(self, kill: bool = False) -> None:
+        """
+        Stops the worker, killing it when it may be running a task.
+        """
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join()
+        self.connection.close()
+
+
+class RepoPool:
+    """
+    A persistent pool of worker processes which run a task for each of many
+    items, such as computing the data of each of many repositories.
+
+    Workers are started on first use and kept warm across calls to
+    imap_unordered, so imports and caches within each process are reused.
+    A worker running a task for longer than timeout, or using more memory than
+    max_rss, is killed and replaced so that one pathological item cannot stall
+    or exhaust the memory of the whole batch. The time workers spend idle
+    waiting for lazily produced items is summed in idle_seconds.
+
+    Args:
+        workers (Optional[int]): Number of worker processes. Defaults to the
+            number of CPUs.
+        function (Callable[..., Any]): The task, called as function(item, **kwargs)
+            in a worker. It must be importable by worker processes.
+        worker_options (Optional[WorkerOptions]): The task timeout, memory limit
+            and start method of the workers. Defaults to no limits.
+
+    Example:
+        >>> with RepoPool(8, worker_options=WorkerOptions(timeout=600)) as pool:
+        ...     for result in pool.imap_unordered(repo_paths, chunksize=4):
+        ...         print(result.item, result.error)
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        function: Callable[..., Any] = compute_repo_data,
+        worker_options: Optional[WorkerOptions] = None,
+    ) -> None:
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        if self.workers < 1:
+            raise ValueError("A pool needs at least one worker.")
+        if worker_options is None:
+            worker_options = WorkerOptions()
+        self.function = function
+        self.timeout = worker_options.timeout
+        self.max_rss = worker_options.max_rss
+        self._context = multiprocessing.get_context(worker_options.mp_context)
+        self._workers: List[_PoolWorker] = []
+        # Number of workers replaced for each reason
+        self.timeouts = 0
+        self.recycled = 0
+        self.crashes = 0
+        # Worker time spent idle waiting for lazily produced items
+        self.idle_seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"RepoPool(workers={self.workers})"
+
+    def __enter__(self) -> "RepoPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the worker processes.
+        """
+        for worker in self._workers:
+            worker.stop(kill=bool(worker.assigned))
+        self._workers = []
+
+    def _new_worker(self) -> _PoolWorker:
+        return _PoolWorker(self._context, self.function, self.max_rss)
+
+    def _replace(
+        self, position: int, pending: Deque[Tuple[int, Any]], kill: bool
+    ) -> None:
+        """
+        Replaces a worker, requeueing its unstarted tasks at the front of the queue.
+        """
+        worker = self._workers[position]
+        pending.extendleft(reversed(list(worker.assigned.items())))
+        worker.stop(kill=kill)
+        self._workers[position] = self._new_worker()
+
+    def _fail_current(self, worker: _PoolWorker, error: str) -> TaskResult:
+        """
+        Removes the running task of a worker which is being replaced,
+        recording why it failed.
+        """
+        index = worker.current
+        item = worker.assigned.pop(index)
+        return TaskResult(index, item, None, error, time.monotonic() - worker.started)
+
+    def imap_unordered(
+        self, items: Iterable[Any], chunksize: int = 1, **kwargs: Any
+    ) -> Iterator[TaskResult]:
+        """
+        Runs the task for each item, yielding results as they complete.
+
+        Args:
+            items (Iterable[Any]): The items to run the task for. Iterables other
+                than lists and tuples are consumed lazily as workers become free,
+                so items may be produced while earlier items run.
+            chunksize (int): Number of items sent to a worker at once. Larger
+                chunks reduce communication for many quick tasks.
+            **kwargs (Any): Keyword arguments passed to every task.
+
+        Yields:
+            TaskResult: The result of each item, in order of completion.
+        """
+        if chunksize < 1:
+            raise ValueError("Chunk size must be positive.")
+        while len(self._workers) < self.workers:
+            self._workers.append(self._new_worker())
+
+        pending: Deque[Tuple[int, Any]] = collections.deque()
+        stop = threading.Event()
+        feed, feeder = None, None
+        if isinstance(items, (list, tuple)):
+            pending.extend(enumerate(items))
+        else:
+            feed, feeder = self._start_feeder(items, chunksize, stop)
+        # Poll periodically only when running tasks must be checked
+        # or new items may arrive
+        poll_interval = (
+            POLL_INTERVAL
+            if self.timeout is not None
+            or self.max_rss is not None
+            or feeder is not None
+            else None
+        )
+        # Workers left without tasks while more items may arrive, and when
+        idle, since = 0, time.monotonic()
+        try:
+            while (
+                pending
+                or feeder is not None
+                or any(worker.assigned for worker in self._workers)
+            ):
+                if feeder is not None:
+                    feeder = self._pull_items(feed, feeder, pending, chunksize)
+                now = time.monotonic()
+                self.idle_seconds += idle * (now - since)
+                self._send_tasks(pending, chunksize, kwargs)
+                idle = (
+                    sum(not worker.assigned for worker in self._workers)
+                    if feeder is not None
+                    else 0
+                )
+                since = now
+                yield from self._read_results(pending, poll_interval)
+                yield from self._check_running(pending)
+
+        finally:
+            stop.set()
+            # Stop workers still running tasks when the results are abandoned
+            for position, worker in enumerate(self._workers):
+                if worker.assigned:
+                    worker.stop(kill=True)
+                    self._workers[position] = self._new_worker()
+
+    def _start_feeder(
+        self, items: Iterable[Any], chunksize: int, stop: threading.Event
+    ) -> Tuple[queue.Queue, threading.Thread]:
+        """
+        Pulls items lazily in a thread, buffering only enough items to keep
+        every worker busy.
+        """
+        feed: queue.Queue = queue.Queue(maxsize=self.workers * chunksize)
+        feeder = threading.Thread(
+            target=_feed_items, args=(items, feed, stop), daemon=True
+        )
+        feeder.start()
+        return feed, feeder
+
+    def _send_tasks(
+        self,
+        pending: Deque[Tuple[int, Any]],
+        chunksize: int,
+        kwargs: Dict[str, Any],
+    ) -> None:
+        """
+        Sends the next chunk of pending tasks to each idle worker.
+        """
+        for worker in self._workers:
+            if not worker.assigned and pending:
+                worker.assign(
+                    [pending.popleft() for _ in range(min(chunksize, len(pending)))],
+                    kwargs,
+                )
+
+    def _read_results(
+        self, pending: Deque[Tuple[int, Any]], poll_interval: Optional[float]
+    ) -> List[TaskResult]:
+        """
+        Waits for messages from the busy workers, returning the finished tasks.
+        """
+        busy = {
+            worker.connection: position
+            for position, worker in enumerate(self._workers)
+            if worker.assigned
+        }
+        if not busy:
+            # Only waiting for new items
+            return []
+        results = []
+        for connection in multiprocessing.connection.wait(
+            list(busy), timeout=poll_interval
+        ):
+            result = self._read_result(busy[connection], pending)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def _read_result(
+        self, position: int, pending: Deque[Tuple[int, Any]]
+    ) -> Optional[TaskResult]:
+        """
+        Reads one message from a worker, returning the task it finished or
+        failed, if any. Workers which died or retired are replaced.
+        """
+        worker = self._workers[position]
+        try:
+            message = worker.connection.recv()
+        except (EOFError, OSError):
+            # The worker died, for example killed by the OOM killer
+            self.crashes += 1
+            worker.process.join()
+            failed = None
+            if worker.current is not None:
+                failed = self._fail_current(
+                    worker,
+                    f"Worker exited unexpectedly with code {worker.process.exitcode}.",
+                )
+            self._replace(position, pending, kill=True)
+            return failed
+
+        if message[0] == "start":
+            worker.current = message[1]
+            worker.started = time.monotonic()
+        elif message[0] == "done":
+            _, index, value, error, seconds = message
+            worker.current = None
+            return TaskResult(index, worker.assigned.pop(index), value, error, seconds)
+        elif message[0] == "retire":
+            self.recycled += 1
+            self._replace(position, pending, kill=False)
+        return None
+
+    def _pull_items(
+        self,
+        feed: queue.Queue,
+        feeder: threading.Thread,
+        pending: Deque[Tuple[int, Any]],
+        chunksize: int,
+    ) -> Optional[threading.Thread]:
+        """
+        Moves items which have arrived from the feeder thread into the pending
+        queue, waiting briefly when there is nothing else to do.
+
+        Returns:
+            Optional[threading.Thread]: The feeder, or None once the items are exhausted.
+        """
+        while len(pending) < self.workers * chunksize:
+            idle = not pending and not any(worker.assigned for worker in self._workers)
+            try:
+                message = feed.get(block=idle, timeout=POLL_INTERVAL)
+            except queue.Empty:
+                return feeder
+            if message[0] == "item":
+                pending.append(message[1:])
+            elif message[0] == "error":
+                raise message[1]
+            else:
+                feeder.join()
+                return None
+        return feeder
+
+    def _check_running(self, pending: Deque[Tuple[int, Any]]) -> List[TaskResult]:
+        """
+        Kills and replaces workers whose running task exceeded the timeout or
+        whose memory use exceeded max_rss, returning the failed tasks.
+        """
+        failed = []
+        now = time.monotonic()
+        for position, worker in enumerate(self._workers):
+            if worker.current is None:
+                continue
+            if self.timeout is not None and now - worker.started > self.timeout:
+                self.timeouts += 1
+                error = f"Timed out after {self.timeout} seconds."
+            elif (
+                self.max_rss is not None
+                and (_current_rss(worker.process.pid) or 0) > self.max_rss
+            ):
+                self.recycled += 1
+                error = f"Exceeded the maximum RSS of {self.max_rss} bytes."
+            else:
+                continue
+            failed.append(self._fail_current(worker, error))
+            self._replace(position, pending, kill=True)
+        return failed
+
+
+def compute_repos_data(
+    paths: Iterable[Union[str, pathlib.Path]],
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+    worker_options: Optional[WorkerOptions] = None,
+    pool: Optional[RepoPool] = None,
+    **kwargs: Any,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Computes the data of many local repositories in parallel, yielding the
+    data of each repository as it completes.
+
+    Args:
+        paths (Iterable[Union[str, pathlib.Path]]): The local paths to the repositories.
+        workers (Optional[int]): Number of worker processes. Defaults to the
+            number of CPUs.
+        chunksize (int): Number of repositories sent to a worker at once.
+        worker_options (Optional[WorkerOptions]): The maximum seconds spent on a
+            single repository, the maximum resident memory of a worker and the
+            start method of the workers.
+        pool (Optional[RepoPool]): An existing pool of compute_repo_data workers
+            to reuse across batches. workers and worker_options are ignored
+            when a pool is given.
+        **kwargs (Any): Keyword arguments passed to compute_repo_data for every
+            repository, such as diff_options or budget. A diff cache is shared
+            with workers through the ALMANACK_DIFF_CACHE environment variable,
+            since open caches cannot be sent between processes.
+
+    Yields:
+        Dict[str, Any]: The data of each repository as returned by compute_repo_data,
+        or a dictionary with "repo_path" and "error" when the repository failed,
+        timed out or exceeded the memory limit.
+    """
+    owned_pool = pool is None
+    if owned_pool:
+        pool = RepoPool(workers=workers, worker_options=worker_options)
+    try:
+        for result in pool.imap_unordered(
+            [str(path) for path in paths], chunksize=chunksize, **kwargs
+        ):
+            if result.error is not None:
+                yield {
+                    "repo_path": str(pathlib.Path(result.item).resolve()),
+                    "error": result.error,
+                }
+            else:
+                yield result.value
+    finally:
+        if owned_pool:
+            pool.close()
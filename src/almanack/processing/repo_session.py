@@ -0,0 +1,487 @@
+"""
+This module provides a session which caches git work for a repository
+"""
+
+import pathlib
+import shutil
+import subprocess  # nosec B404
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import pygit2
+
+from .budget import AnalysisBudget
+from .diff_backends import DiffRequest
+from .diff_cache import DiffStatsCache, get_default_diff_cache
+from .diff_options import DiffOptions, get_diff_options
+from .diff_profiles import DiffProfile, get_diff_profile
+from .profiling import NULL_PROFILER, StageProfiler
+
+
+def has_commit_graph(repo: pygit2.Repository) -> bool:
+    """
+    Checks whether the repository contains commit-graph files, which
+    allow git to walk history without parsing each commit object.
+
+    Args:
+        repo (pygit2.Repository): The Git repository.
+
+    Returns:
+        bool: True if a single commit-graph file or a split commit-graph chain exists.
+    """
+    objects_info = pathlib.Path(repo.path) / "objects" / "info"
+    return (objects_info / "commit-graph").is_file() or (
+        objects_info / "commit-graphs" / "commit-graph-chain"
+    ).is_file()
+
+
+def _git_rev_list(repo: pygit2.Repository, *args: str) -> Optional[List[str]]:
+    """
+    Runs `git rev-list` against the repository, which reads commit-graph
+    files when they exist.
+
+    Args:
+        repo (pygit2.Repository): The Git repository.
+        *args (str): Arguments passed to `git rev-list`.
+
+    Returns:
+        Optional[List[str]]: The output lines, or None when the git command line
+        is unavailable or fails.
+    """
+    git_executable = shutil.which("git")
+    if git_executable is None:
+        return None
+    result = subprocess.run(  # nosec B603
+        [git_executable, "--git-dir", repo.path, "rev-list", *args, "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    return result.stdout.split()
+
+
+def _oldest_root(
+    roots: List[pygit2.Commit], last_commit: Optional[pygit2.Commit]
+) -> Optional[pygit2.Commit]:
+    """
+    Picks the first commit of a history from its root commits: the root with
+    the earliest commit time, ties broken by OID, so that walks in any order
+    and `git rev-list` agree. Histories without roots, such as shallow clones,
+    fall back to the last commit reached.
+    """
+    if not roots:
+        return last_commit
+    return min(roots, key=lambda root: (root.commit_time, str(root.id)))
+
+
+class RepoSession:
+    """
+    Opens a Git repository once and memoizes the git work performed against it,
+    so that a metrics run over a repository performs each piece of work once.
+
+    Resolved commits are cached by revision, while diffs and per-file
+    diff statistics are cached by the (source, target) commit OID pair
+    along with the diff options profile, diff filter and diff backend.
+    With a diff cache, diff statistics also persist across sessions keyed
+    by tree and blob OIDs.
+
+    Args:
+        repo (Union[str, pathlib.Path, pygit2.Repository]): The local path to the
+            Git repository or an already opened repository.
+        diff_cache (Optional[DiffStatsCache]): A persistent cache of diff statistics.
+            Defaults to the cache named by the ALMANACK_DIFF_CACHE environment
+            variable, if any.
+        profiler (Optional[StageProfiler]): Records stage timings and counters of
+            the git work. Defaults to a profiler which records nothing.
+        budget (Optional[AnalysisBudget]): Limits on the git work, which history
+            walks and diff backends check cooperatively. Defaults to no limits.
+
+    Example:
+        >>> with RepoSession("path/to/repo") as session:
+        ...     commits = session.get_commits()
+        ...     stats = session.get_diff_stats(commits[-1], commits[0])
+    """
+
+    def __init__(
+        self,
+        repo: Union[str, pathlib.Path, pygit2.Repository],
+        diff_cache: Optional[DiffStatsCache] = None,
+        profiler: Optional[StageProfiler] = None,
+        budget: Optional[AnalysisBudget] = None,
+    ) -> None:
+        # Reuse an already opened repository or open the repository once
+        self._owns_repo = not isinstance(repo, pygit2.Repository)
+        self.repo = pygit2.Repository(str(repo)) if self._owns_repo else repo
+        self._resolved: Dict[str, pygit2.Commit] = {}
+        self._commits: Optional[List[pygit2.Commit]] = None
+        self._commit_count: Optional[int] = None
+        self._root_commits: Optional[List[pygit2.Commit]] = None
+        self._first_commit: Optional[pygit2.Commit] = None
+        self._diffs: Dict[Tuple[pygit2.Oid, pygit2.Oid, Tuple], pygit2.Diff] = {}
+        self._diff_stats: Dict[
+            Tuple[pygit2.Oid, pygit2.Oid, Optional[Tuple], Tuple, str],
+            Dict[str, Dict[str, int]],
+        ] = {}
+        self.diff_cache = (
+            diff_cache if diff_cache is not None else get_default_diff_cache()
+        )
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.budget = budget
+
+    def __enter__(self) -> "RepoSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Clears the caches and releases the handles to the Git database
+        when the repository was opened by the session.
+        """
+        self._resolved.clear()
+        self._commits = None
+        self._commit_count = None
+        self._root_commits = None
+        self._first_commit = None
+        self._diffs.clear()
+        self._diff_stats.clear()
+        if self._owns_repo:
+            self.repo.free()
+
+    def resolve(self, revision: Union[str, pygit2.Oid, pygit2.Commit]) -> pygit2.Commit:
+        """
+        Resolves a revision to a commit, reusing previous resolutions.
+
+        Args:
+            revision (Union[str, pygit2.Oid, pygit2.Commit]): A revision string
+                (for example, a commit hash or "HEAD"), an OID or a commit.
+
+        Returns:
+            pygit2.Commit: The resolved commit.
+        """
+        # Commits are already resolved
+        if isinstance(revision, pygit2.Commit):
+            return revision
+
+        key = str(revision)
+        if key not in self._resolved:
+            self._resolved[key] = self.repo.revparse_single(key).peel(pygit2.Commit)
+        return self._resolved[key]
+
+    def iter_commits(self) -> Iterator[pygit2.Commit]:
+        """
+        Lazily yields the commits reachable from HEAD, most recent first,
+        without holding the history in memory.
+
+        Yields:
+            pygit2.Commit: Commits in the repository.
+        """
+        # Reuse the list of commits when it was already collected
+        if self._commits is not None:
+            yield from self._commits
+            return
+        # Create a walker to iterate over commits starting from the HEAD
+        yield from self.repo.walk(
+            self.get_head_commit().id, pygit2.enums.SortMode.NONE
+        )  #  SortMode.NONE traverses commits in natural order; no sorting applied.
+
+    def get_commits(self) -> List[pygit2.Commit]:
+        """
+        Retrieves the list of commits reachable from HEAD, walking history once.
+
+        Note: this holds every commit in memory. Prefer iter_commits,
+        get_head_commit, get_first_commit and count_commits for large histories.
+
+        Returns:
+            List[pygit2.Commit]: List of commits in the repository.
+        """
+        if self._commits is None:
+            self._commits = list(self.iter_commits())
+        return self._commits
+
+    def get_head_commit(self) -> pygit2.Commit:
+        """
+        Retrieves the most recent commit (HEAD) without walking history.
+
+        Returns:
+            pygit2.Commit: The HEAD commit.
+        """
+        return self.resolve("HEAD")
+
+    def _scan_history(self) -> None:
+        """
+        Streams history once to record the commit count, the root commits
+        and the last commit reached, keeping memory flat.
+        """
+        count = 0
+        roots = []
+        commit = None
+        for commit in self.iter_commits():
+            count += 1
+            if not commit.parent_ids:
+                roots.append(commit)
+        self._commit_count = count
+        self._root_commits = roots
+        self._first_commit = _oldest_root(roots, commit)
+
+    def walk_history(
+        self, on_commit: Optional[Callable[[pygit2.Commit], None]] = None
+    ) -> Tuple[int, pygit2.Commit]:
+        """
+        Streams history from HEAD within the session's budget, stopping after
+        the budget's maximum commits or once its time is up.
+
+        Without a budget, or when the whole history was walked, the results
+        match count_commits and get_first_commit.
+
+        Args:
+            on_commit (Optional[Callable[[pygit2.Commit], None]]): Called with
+                each commit walked, most recent first. Visiting every commit
+                streams the history even without a budget.
+
+        Returns:
+            Tuple[int, pygit2.Commit]: The number of commits walked and the
+            last commit reached, or the first commit when the whole history
+            was walked.
+        """
+        if self.budget is None and on_commit is None:
+            return self.count_commits(), self.get_first_commit()
+
+        count = 0
+        roots = []
+        commit = None
+        commits = self.iter_commits()
+        for commit in commits:
+            count += 1
+            if on_commit is not None:
+                on_commit(commit)
+            if not commit.parent_ids:
+                roots.append(commit)
+            if self.budget is None:
+                continue
+            # Checking the clock every commit would slow the walk down
+            if count % 1000 == 0 and self.budget.stop_requested():
+                return count, commit
+            # Only a walk which leaves commits behind is partial
+            if count == self.budget.max_commits and next(commits, None) is not None:
+                self.budget.exceed("max_commits")
+                return count, commit
+        self._commit_count = count
+        self._root_commits = roots
+        self._first_commit = _oldest_root(roots, commit)
+        return count, self._first_commit
+
+    def count_commits(self) -> int:
+        """
+        Counts the commits reachable from HEAD, using commit-graph
+        files through `git rev-list --count` when they exist.
+
+        Returns:
+            int: The number of commits.
+        """
+        if self._commit_count is None:
+            if self._commits is not None:
+                self._commit_count = len(self._commits)
+            elif has_commit_graph(self.repo) and (
+                output := _git_rev_list(self.repo, "--count")
+            ):
+                self._commit_count = int(output[0])
+            else:
+                self._scan_history()
+        return self._commit_count
+
+    def get_root_commits(self) -> List[pygit2.Commit]:
+        """
+        Retrieves the commits reachable from HEAD which have no parents, using
+        commit-graph files through `git rev-list --max-parents=0` when they exist.
+
+        Returns:
+            List[pygit2.Commit]: The root commits, most recent first.
+        """
+        if self._root_commits is None:
+            if has_commit_graph(self.repo) and (
+                output := _git_rev_list(self.repo, "--max-parents=0")
+            ):
+                self._root_commits = [self.resolve(oid) for oid in output]
+            else:
+                self._scan_history()
+        return self._root_commits
+
+    def get_first_commit(self) -> pygit2.Commit:
+        """
+        Retrieves the first commit of the repository history: the oldest root
+        commit reachable from HEAD by commit time, with ties broken by OID.
+        Histories with several roots give the same commit whether or not
+        commit-graph files are used.
+
+        Returns:
+            pygit2.Commit: The first commit.
+        """
+        if self._first_commit is None:
+            if self._commits is not None:
+                self._first_commit = _oldest_root(
+                    [commit for commit in self._commits if not commit.parent_ids],
+                    self._commits[-1],
+                )
+            elif has_commit_graph(self.repo):
+                roots = self.get_root_commits()
+                # A fallback history scan may already have found the first commit
+                if self._first_commit is None:
+                    self._first_commit = _oldest_root(roots, None)
+            else:
+                self._scan_history()
+        return self._first_commit
+
+    def get_diff(
+        self,
+        source: Union[str, pygit2.Oid, pygit2.Commit],
+        target: Union[str, pygit2.Oid, pygit2.Commit],
+        diff_profile: Optional[Union[str, DiffProfile]] = None,
+    ) -> pygit2.Diff:
+        """
+        Computes the diff between two commits, reusing previous results.
+
+        Args:
+            source (Union[str, pygit2.Oid, pygit2.Commit]): The source commit.
+            target (Union[str, pygit2.Oid, pygit2.Commit]): The target commit.
+            diff_profile (Optional[Union[str, DiffProfile]]): The diff options profile
+                or the name of a built-in profile. Defaults to libgit2 defaults.
+
+        Returns:
+            pygit2.Diff: The diff between the source and target commits.
+        """
+        source_commit, target_commit = self.resolve(source), self.resolve(target)
+        diff_profile = get_diff_profile(diff_profile)
+        key = (source_commit.id, target_commit.id, diff_profile.key)
+        if key not in self._diffs:
+            self._diffs[key] = diff_profile.diff(
+                self.repo, source_commit, target_commit
+            )
+        return self._diffs[key]
+
+    def get_edited_files(
+        self,
+        source: Union[str, pygit2.Oid, pygit2.Commit],
+        target: Union[str, pygit2.Oid, pygit2.Commit],
+        diff_options: Optional[DiffOptions] = None,
+    ) -> List[str]:
+        """
+        Finds the files edited, added, or deleted between two commits.
+        The pygit2 backend reads the diff deltas without generating patches.
+
+        Args:
+            source (Union[str, pygit2.Oid, pygit2.Commit]): The source commit.
+            target (Union[str, pygit2.Oid, pygit2.Commit]): The target commit.
+            diff_options (Optional[DiffOptions]): The diff filter, profile and
+                backend. Defaults to the whole diff with the default profile and
+                the pygit2 backend.
+
+        Returns:
+            List[str]: List of file names that have been edited, added, or deleted.
+        """
+        diff_options = get_diff_options(diff_options)
+        return diff_options.get_backend().edited_files(
+            self,
+            DiffRequest(
+                self.resolve(source),
+                self.resolve(target),
+                diff_options.get_profile(),
+                diff_options.diff_filter,
+            ),
+        )
+
+    def get_diff_stats(
+        self,
+        source: Union[str, pygit2.Oid, pygit2.Commit],
+        target: Union[str, pygit2.Oid, pygit2.Commit],
+        diff_options: Optional[DiffOptions] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Computes the added and deleted line counts for each file edited
+        between two commits, reusing previous results.
+
+        Args:
+            source (Union[str, pygit2.Oid, pygit2.Commit]): The source commit.
+            target (Union[str, pygit2.Oid, pygit2.Commit]): The target commit.
+            diff_options (Optional[DiffOptions]): The diff filter, profile and
+                backend. Patches are only generated for files which pass the
+                filter, and with rename detection, renamed files are reported
+                under their new path. All backends return identical results.
+
+        Returns:
+            Dict[str, Dict[str, int]]: A dictionary where the key is the filename and
+            the value is a dictionary with the "additions" and "deletions" for that file.
+        """
+        source_commit, target_commit = self.resolve(source), self.resolve(target)
+        diff_options = get_diff_options(diff_options)
+        diff_filter = diff_options.diff_filter
+        diff_profile = diff_options.get_profile()
+        backend = diff_options.get_backend()
+        key = (
+            source_commit.id,
+            target_commit.id,
+            None if diff_filter is None else diff_filter.key,
+            diff_profile.key,
+            backend.name,
+        )
+        if key in self._diff_stats:
+            return self._diff_stats[key]
+
+        # Statistics depend only on the trees, so the persistent cache
+        # is keyed by tree OIDs and shared by commits with identical trees.
+        # It holds complete statistics, so it is skipped when the budget
+        # may cut the diff short.
+        cache_key = (str(source_commit.tree_id), str(target_commit.tree_id), *key[2:])
+        diff_stats = (
+            None
+            if self.diff_cache is None
+            or (self.budget is not None and self.budget.limits_diffs())
+            else self.diff_cache.get_tree_stats(cache_key)
+        )
+        if diff_stats is None:
+            diff_stats = backend.diff_stats(
+                self,
+                DiffRequest(source_commit, target_commit, diff_profile, diff_filter),
+            )
+            if self.profiler.enabled:
+                self.profiler.count("files_diffed", len(diff_stats))
+                self.profiler.count(
+                    "lines",
+                    sum(
+                        file_stats["additions"] + file_stats["deletions"]
+                        for file_stats in diff_stats.values()
+                    ),
+                )
+            # Statistics cut short by the budget are not persisted. Only a
+            # walk stopped at max_commits leaves the diff of its trees whole.
+            if self.diff_cache is not None and (
+                self.budget is None or set(self.budget.exceeded) <= {"max_commits"}
+            ):
+                self.diff_cache.put_tree_stats(cache_key, diff_stats)
+        self._diff_stats[key] = diff_stats
+        return diff_stats
+
+
+def open_session(
+    repo: Union[str, pathlib.Path, pygit2.Repository, RepoSession],
+    diff_cache: Optional[DiffStatsCache] = None,
+) -> RepoSession:
+    """
+    Returns a session for the given repository reference, reusing
+    the session when one is provided.
+
+    Args:
+        repo (Union[str, pathlib.Path, pygit2.Repository, RepoSession]): A path to
+            the Git repository, an opened repository or an existing session.
+        diff_cache (Optional[DiffStatsCache]): A persistent cache of diff
+            statistics for new sessions. Existing sessions keep their own cache.
+
+    Returns:
+        RepoSession: A session for the repository.
+    """
+    if isinstance(repo, RepoSession):
+        return repo
+    return RepoSession(repo, diff_cache=diff_cache)
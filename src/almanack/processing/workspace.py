@@ -0,0 +1,276 @@
+"""
+This module manages the directories which hold cloned repositories
+"""
+
+import atexit
+import contextlib
+import fcntl
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+from typing import Iterator, List, Optional, Union
+
+from .git_operations import clone_repository
+
+# prefix for workspace directories, used to find workspaces left behind by crashes
+WORKSPACE_PREFIX = "almanack-workspace-"
+# file within a workspace or clone directory recording the owning process id
+OWNER_FILE = "owner.pid"
+# file within a clone directory recording the disk space reserved for a clone
+# which is still being written, counted until the clone has been measured
+RESERVATION_FILE = "reserved.bytes"
+# environment variables configuring the workspace shared within a process
+WORKSPACE_DIR_ENV = "ALMANACK_WORKSPACE_DIR"
+WORKSPACE_MAX_BYTES_ENV = "ALMANACK_WORKSPACE_MAX_BYTES"
+# seconds between disk usage checks while a clone waits for space
+POLL_INTERVAL = 1.0
+
+# the workspace shared by analyses in this process, see get_default_workspace
+_default_workspace = None
+_default_workspace_lock = threading.Lock()
+
+
+def _pid_is_alive(pid: int) -> bool:
+    """
+    Checks whether a process with the given id is running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+
+def _owner_is_alive(path: pathlib.Path) -> bool:
+    """
+    Checks whether the process recorded as the owner of a directory is running.
+    Directories without a readable owner are treated as owned by a running process.
+    """
+    try:
+        return _pid_is_alive(int((path / OWNER_FILE).read_text()))
+    except (OSError, ValueError):
+        return True
+
+
+def _directory_size(path: pathlib.Path) -> int:
+    """
+    Computes the size of the files within a directory in bytes.
+    """
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            with contextlib.suppress(OSError):
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+    return size
+
+
+def _clone_usage(clone_dir: pathlib.Path) -> int:
+    """
+    Computes the disk space counted for a clone: its size, or the space
+    reserved for it while it is still being written, whichever is larger.
+    """
+    size = _directory_size(clone_dir)
+    try:
+        return max(size, int((clone_dir / RESERVATION_FILE).read_text()))
+    except (OSError, ValueError):
+        return size
+
+
+def sweep_stale_workspaces(base_dir: Union[str, pathlib.Path]) -> List[pathlib.Path]:
+    """
+    Removes workspaces whose owning process is no longer running,
+    such as those left behind when a worker crashed.
+
+    Args:
+        base_dir (Union[str, pathlib.Path]): The directory which holds workspaces.
+
+    Returns:
+        List[pathlib.Path]: Paths to the removed workspaces.
+    """
+    removed = []
+    for path in pathlib.Path(base_dir).glob(f"{WORKSPACE_PREFIX}*"):
+        if path.is_dir() and not _owner_is_alive(path):
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+class Workspace:
+    """
+    Owns the directories which hold cloned repositories and enforces
+    a total disk budget across them.
+
+    Every clone is removed once its analysis completes, whether it succeeded
+    or raised, and the workspace directory itself is removed on exit. Workspaces
+    and clones record the id of the process which created them, so those left
+    behind by a crashed worker are removed by later workspaces. When the clones
+    held in the workspace reach max_bytes, new clones wait until space is freed.
+
+    A clone's size is unknown until it has been written, so each new clone
+    reserves reserve_bytes of the budget until it is measured. The reservation
+    is recorded in the clone directory under the same lock as the budget check,
+    so concurrent workers, in threads or processes sharing the workspace, see
+    each other's clones in flight.
+
+    Args:
+        base_dir (Optional[Union[str, pathlib.Path]]): The directory in which the
+            workspace is created. Defaults to the system temporary directory.
+        max_bytes (Optional[int]): Total disk budget for clones in bytes.
+            When None, clones never wait.
+        timeout (Optional[float]): Maximum seconds to wait for disk space before
+            raising TimeoutError. When None, clones wait indefinitely.
+        reserve_bytes (Optional[int]): Disk space counted for each clone until it
+            has been written and measured, such as the expected size of a clone.
+            Defaults to max_bytes, which admits one clone at a time while cloning.
+
+    Example:
+        >>> with Workspace(max_bytes=20 * 1024**3) as workspace:
+        ...     with workspace.clone("https://github.com/owner/repo") as repo_path:
+        ...         data = compute_repo_data(repo_path)
+    """
+
+    def __init__(
+        self,
+        base_dir: Optional[Union[str, pathlib.Path]] = None,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        reserve_bytes: Optional[int] = None,
+    ) -> None:
+        self.base_dir = pathlib.Path(base_dir or tempfile.gettempdir())
+        self.max_bytes = max_bytes
+        self.reserve_bytes = max_bytes if reserve_bytes is None else reserve_bytes
+        self.timeout = timeout
+        self.path: Optional[pathlib.Path] = None
+
+    def __enter__(self) -> "Workspace":
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        # Remove workspaces left behind by processes which crashed
+        sweep_stale_workspaces(self.base_dir)
+        self.path = pathlib.Path(
+            tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=self.base_dir)
+        )
+        (self.path / OWNER_FILE).write_text(str(os.getpid()))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Removes the workspace and every clone within it.
+        """
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+    def usage(self) -> int:
+        """
+        Computes the disk space used by clones in the workspace, counting the
+        space reserved for clones which are still being written, and removing
+        clones left behind by crashed workers first.
+
+        Returns:
+            int: The disk usage in bytes.
+        """
+        usage = 0
+        for clone_dir in self.path.glob("clone-*"):
+            if not _owner_is_alive(clone_dir):
+                shutil.rmtree(clone_dir, ignore_errors=True)
+            else:
+                usage += _clone_usage(clone_dir)
+        return usage
+
+    def _reserve_clone_dir(self) -> pathlib.Path:
+        """
+        Waits until the disk budget allows a new clone, then creates its directory.
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with open(self.path / "budget.lock", "a") as lock_file:
+            while True:
+                # Check usage and reserve the directory under a lock so that
+                # concurrent workers do not all start cloning at once
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if (
+                        self.max_bytes is None
+                        or self.usage() < self.max_bytes
+                        # Avoid waiting forever when no other clone may free space
+                        or not any(self.path.glob("clone-*"))
+                    ):
+                        clone_dir = pathlib.Path(
+                            tempfile.mkdtemp(prefix="clone-", dir=self.path)
+                        )
+                        (clone_dir / OWNER_FILE).write_text(str(os.getpid()))
+                        if self.max_bytes is not None:
+                            (clone_dir / RESERVATION_FILE).write_text(
+                                str(self.reserve_bytes)
+                            )
+                        return clone_dir
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+                if deadline is None:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Timed out waiting for disk space in workspace {self.path}"
+                    )
+                time.sleep(min(POLL_INTERVAL, remaining))
+
+    @contextlib.contextmanager
+    def clone(self, repo_url: str, bare: bool = True) -> Iterator[pathlib.Path]:
+        """
+        Clones a repository into the workspace once the disk budget allows,
+        and removes the clone when the context exits.
+
+        Args:
+            repo_url (str): The URL of the repository.
+            bare (bool): Whether to clone without checking out a working tree.
+
+        Yields:
+            pathlib.Path: Path to the cloned repository.
+        """
+        if self.path is None:
+            raise RuntimeError("The workspace must be entered before cloning.")
+
+        clone_dir = self._reserve_clone_dir()
+        try:
+            repo_path = clone_repository(
+                repo_url, bare=bare, directory=clone_dir / "repo"
+            )
+            # The clone is written, so its measured size replaces the reservation
+            (clone_dir / RESERVATION_FILE).unlink(missing_ok=True)
+            yield repo_path
+        finally:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+
+
+def get_default_workspace() -> Workspace:
+    """
+    Returns the workspace shared by analyses in this process, so that
+    concurrent analyses clone within one disk budget. The workspace is created
+    on first use in the directory named by the ALMANACK_WORKSPACE_DIR environment
+    variable, limited to ALMANACK_WORKSPACE_MAX_BYTES when set, and removed
+    when the process exits.
+
+    Returns:
+        Workspace: The entered default workspace.
+    """
+    global _default_workspace  # noqa: PLW0603
+    with _default_workspace_lock:
+        if _default_workspace is None:
+            max_bytes = os.environ.get(WORKSPACE_MAX_BYTES_ENV)
+            _default_workspace = Workspace(
+                base_dir=os.environ.get(WORKSPACE_DIR_ENV),
+                max_bytes=int(max_bytes) if max_bytes else None,
+            ).__enter__()
+            atexit.register(_default_workspace.close)
+        return _default_workspace
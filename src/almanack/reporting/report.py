@@ -2,23 +2,115 @@
 This module creates entropy reports
 """
 
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from tabulate import tabulate
 
 
-def repo_report(data: Dict[str, Any]) -> str:
+def directory_tree_report(
+    directory_entropy: Dict[str, Dict[str, Any]], max_depth: int = 2
+) -> str:
+    """
+    Returns a table of directory entropy as an indented tree.
+
+    Args:
+        directory_entropy (Dict[str, Dict[str, Any]]): The statistics of each
+            directory in tree order, as calculated by calculate_directory_entropy.
+        max_depth (int): Deepest directories to show, where the root has depth 0.
+
+    Returns:
+        str: Formatted directory entropy table.
+    """
+    directories_info = [
+        [
+            "  " * stats["depth"] + f"{path.rsplit('/', 1)[-1]}/",
+            stats["number_of_files"],
+            stats["lines_changed"],
+            f"{stats['entropy']:.4f}",
+            f"{stats['normalized_entropy']:.4f}",
+        ]
+        for path, stats in directory_entropy.items()
+        if stats["depth"] <= max_depth
+    ]
+    return tabulate(
+        directories_info,
+        headers=[
+            "Directory",
+            "Files",
+            "Lines Changed",
+            "Entropy",
+            "Normalized Entropy",
+        ],
+        tablefmt="simple_grid",
+    )
+
+
+def timings_report(timings: Dict[str, Any]) -> str:
+    """
+    Returns tables of the time spent in each stage of an analysis and of
+    the work counters.
+
+    Args:
+        timings (Dict[str, Any]): The stage timings and counters, as
+            summarized by StageProfiler.
+
+    Returns:
+        str: Formatted timings tables.
+    """
+    stages_info = [
+        [
+            name,
+            f"{stats['wall_seconds']:.3f}",
+            f"{stats['cpu_seconds']:.3f}",
+            stats["calls"],
+        ]
+        for name, stats in timings["stages"].items()
+    ]
+    stages_info.append(["total", f"{timings['wall_seconds']:.3f}", "", ""])
+    counters_info = [[name, value] for name, value in timings["counters"].items()]
+    return (
+        tabulate(
+            stages_info,
+            headers=["Stage", "Wall Seconds", "CPU Seconds", "Calls"],
+            tablefmt="simple_grid",
+        )
+        + "\n"
+        + tabulate(counters_info, headers=["Counter", "Value"], tablefmt="simple_grid")
+    )
+
+
+def repo_report(data: Dict[str, Any], max_depth: int = 2) -> str:
     """
     Returns the formatted entropy report as a string.
 
     Args:
         data (Dict[str, Any]): Dictionary with the entropy data.
+        max_depth (int): Deepest directories to show in the directory tree,
+            where the repository root has depth 0.
 
     Returns:
         str: Formatted entropy report.
     """
     title = "Software Information Entropy Report"
 
+    # Failed analyses report their error and the timings of the stages reached
+    if "error" in data:
+        report_content = f"""
+{'=' * 80}
+{title:^80}
+{'=' * 80}
+
+Repository information:
+{tabulate([["Repository Path", data["repo_path"]], ["Error", data["error"]]], tablefmt="simple_grid")}
+
+"""
+        if "timings" in data:
+            report_content += f"""Timings:
+{timings_report(data["timings"])}
+
+"""
+        return report_content
+
     # Extract details from data
     repo_path = data["repo_path"]
     total_normalized_entropy = data["total_normalized_entropy"]
@@ -39,11 +131,24 @@ def repo_report(data: Dict[str, Any]) -> str:
         ["Total Normalized Entropy", f"{total_normalized_entropy:.4f}"],
         ["Number of Commits Analyzed", number_of_commits],
         ["Files Analyzed", number_of_files],
+    ]
+    # Data computed before line totals were added has no line counts
+    if "total_lines_added" in data:
+        repo_info += [
+            ["Lines Added", data["total_lines_added"]],
+            ["Lines Deleted", data["total_lines_deleted"]],
+        ]
+    repo_info.append(
         [
             "Time Range of Commits",
             f"{time_range_of_commits[0]} to {time_range_of_commits[1]}",
-        ],
-    ]
+        ]
+    )
+    # Results cut short by a budget say which limits were reached
+    if data.get("partial"):
+        repo_info.append(
+            ["Partial Results", f"limited by {', '.join(data['budgets_exceeded'])}"]
+        )
 
     top_files_info = [
         [file_name, f"{normalized_entropy:.4f}"]
@@ -61,5 +166,56 @@ Repository information:
 Top 5 files with the most entropy:
 {tabulate(top_files_info, headers=["File Name", "Normalized Entropy"], tablefmt="simple_grid")}
 
+"""
+    # Reports from data computed before directory entropy was added have no tree
+    if "directory_entropy" in data:
+        report_content += f"""Directory entropy (to depth {max_depth}):
+{directory_tree_report(data["directory_entropy"], max_depth)}
+
+"""
+    if "timings" in data:
+        report_content += f"""Timings:
+{timings_report(data["timings"])}
+
+"""
+    return report_content
+
+
+def series_report(repo_path: str, window: str, series: List[Dict[str, Any]]) -> str:
+    """
+    Returns the formatted entropy time series report as a string.
+
+    Args:
+        repo_path (str): The path of the repository.
+        window (str): The kind of window the history was split into.
+        series (List[Dict[str, Any]]): The entropy of each window.
+
+    Returns:
+        str: Formatted entropy time series report.
+    """
+    title = "Software Information Entropy Time Series"
+
+    windows_info = [
+        [
+            entry["window"],
+            f"{entry['start_date']} to {entry['end_date']}",
+            entry["number_of_commits"],
+            entry["number_of_files"],
+            entry["total_lines_changed"],
+            f"{entry['normalized_entropy']:.4f}",
+        ]
+        for entry in series
+    ]
+
+    report_content = f"""
+{'=' * 80}
+{title:^80}
+{'=' * 80}
+
+Repository Path: {repo_path}
+Window: {window}
+
+{tabulate(windows_info, headers=["Window", "Dates", "Commits", "Files", "Lines Changed", "Normalized Entropy"], tablefmt="simple_grid")}
+
 """
     return report_content
@@ -7,6 +7,7 @@ import pathlib
 import shutil
 import subprocess
 
+import git
 import pytest
 
 
@@ -112,3 +113,57 @@ def repo_file_sets():
         "3_file_repo": ["file_1.md", "file_2.md", "file_3.md"],
         "1_file_repo": ["file_1.md"],
     }
+
+
+@pytest.fixture
+def filtered_repo_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Creates a repository with source, vendored, minified and large files.
+    """
+    repo_path = tmp_path / "filtered_repo"
+    repo = git.Repo.init(repo_path)
+
+    files = {
+        "src/a.py": "print('a')\n",
+        "src/pkg/b.py": "print('b')\n",
+        "vendor/lib.js": "var lib;\n",
+        "app.min.js": "var app;\n",
+        "data.txt": "line\n",
+    }
+    for commit_number in range(2):
+        for file_name, content in files.items():
+            file_path = repo_path / file_name
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            # The data file is large in both commits
+            file_path.write_text(
+                content * (commit_number + 1) * (1000 if file_name == "data.txt" else 1)
+            )
+        repo.git.add(A=True)
+        repo.index.commit(f"Commit {commit_number}")
+
+    return repo_path
+
+
+@pytest.fixture
+def renamed_repo_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Creates a repository where a file is renamed with a small edit
+    and another file only changes in whitespace.
+    """
+    repo_path = tmp_path / "renamed_repo"
+    repo = git.Repo.init(repo_path)
+    (repo_path / "src").mkdir()
+
+    module_lines = [f"value_{number} = {number}\n" for number in range(50)]
+    (repo_path / "src" / "old.py").write_text("".join(module_lines))
+    (repo_path / "spacing.py").write_text("a = 1\nb = 2\n")
+    repo.git.add(A=True)
+    repo.index.commit("Baseline")
+
+    (repo_path / "src" / "old.py").unlink()
+    (repo_path / "src" / "new.py").write_text("".join(module_lines) + "extra = 1\n")
+    (repo_path / "spacing.py").write_text("a  =  1\nb = 2\n")
+    repo.git.add(A=True)
+    repo.index.commit("Rename and reformat")
+
+    return repo_path
@@ -0,0 +1,102 @@
+"""
+Testing blame_cache functionality
+"""
+
+import pathlib
+
+import git
+import pytest
+
+from almanack.processing.blame_cache import BlameCache
+from almanack.processing.calculate_entropy import (
+    calculate_author_entropy,
+    calculate_ownership_entropy,
+)
+from almanack.processing.git_operations import get_line_ownership
+
+
+@pytest.fixture
+def authors_repo_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Creates a repository where one file has a single author and
+    another file is shared equally by two authors.
+    """
+    repo_path = tmp_path / "authors_repo"
+    repo = git.Repo.init(repo_path)
+    alice = git.Actor("Alice", "alice@example.com")
+    bob = git.Actor("Bob", "Bob@Example.com")
+
+    (repo_path / "solo.txt").write_text("a\n" * 4)
+    (repo_path / "shared.txt").write_text("a\n" * 3)
+    repo.index.add(["solo.txt", "shared.txt"])
+    repo.index.commit("Alice's files", author=alice, committer=alice)
+
+    (repo_path / "shared.txt").write_text("a\n" * 3 + "b\n" * 3)
+    repo.index.add(["shared.txt"])
+    repo.index.commit("Bob's lines", author=bob, committer=bob)
+    return repo_path
+
+
+def test_get_line_ownership(
+    authors_repo_path: pathlib.Path, tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that blame results are cached by blob and reused on later runs.
+    """
+    expected = {
+        "solo.txt": {"alice@example.com": 4},
+        "shared.txt": {"alice@example.com": 3, "bob@example.com": 3},
+    }
+    file_names = ["solo.txt", "shared.txt", "deleted.txt"]
+    assert get_line_ownership(authors_repo_path, "HEAD", file_names) == expected
+
+    with BlameCache(tmp_path / "blame.sqlite") as cache:
+        assert (
+            get_line_ownership(authors_repo_path, "HEAD", file_names, cache) == expected
+        )
+        assert (cache.hits, cache.misses) == (0, 2)
+        # Unchanged blobs are not blamed again
+        assert (
+            get_line_ownership(authors_repo_path, "HEAD", file_names, cache) == expected
+        )
+        assert (cache.hits, cache.misses) == (2, 2)
+
+        # An unrelated commit leaves the blame of untouched files cached
+        repo = git.Repo(authors_repo_path)
+        (authors_repo_path / "other.txt").write_text("a\n")
+        repo.index.add(["other.txt"])
+        repo.index.commit("Unrelated file")
+        assert (
+            get_line_ownership(authors_repo_path, "HEAD", file_names, cache) == expected
+        )
+        assert (cache.hits, cache.misses) == (4, 2)
+
+        # Only the files edited by a new commit are blamed again
+        (authors_repo_path / "shared.txt").write_text("a\n" * 3 + "b\n" * 3 + "c\n")
+        repo.index.add(["shared.txt"])
+        repo.index.commit("Another line")
+        get_line_ownership(authors_repo_path, "HEAD", file_names, cache)
+        assert (cache.hits, cache.misses) == (5, 3)
+
+        # Editing .mailmap invalidates the cached authors
+        (authors_repo_path / ".mailmap").write_text(
+            "Alice <alice@example.org> <alice@example.com>\n"
+        )
+        assert get_line_ownership(authors_repo_path, "HEAD", ["solo.txt"], cache) == {
+            "solo.txt": {"alice@example.org": 4}
+        }
+        assert (cache.hits, cache.misses) == (5, 4)
+
+
+def test_ownership_entropy(authors_repo_path: pathlib.Path) -> None:
+    """
+    Test ownership entropy of files and authors.
+    """
+    assert calculate_ownership_entropy(
+        authors_repo_path, "HEAD", ["solo.txt", "shared.txt"]
+    ) == {"solo.txt": 0.0, "shared.txt": 1.0}
+
+    # Alice owns 7 of 10 lines
+    assert calculate_author_entropy(
+        authors_repo_path, "HEAD", ["solo.txt", "shared.txt"]
+    ) == pytest.approx(0.8812908992306927)
@@ -0,0 +1,139 @@
+"""
+Testing budget functionality
+"""
+
+import pathlib
+
+import git
+import pytest
+
+from almanack.processing.budget import AnalysisBudget
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.diff_cache import DiffStatsCache
+from almanack.processing.diff_options import DiffOptions
+
+# commits of the wide repository, and the most recent of them walked with a budget
+WIDE_REPO_COMMITS = 5
+RECENT_COMMITS = 2
+
+
+@pytest.fixture
+def wide_repo_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Creates a repository with ten files of growing size changed over five commits.
+    """
+    repo_path = tmp_path / "wide_repo"
+    repo = git.Repo.init(repo_path)
+    for commit_number in range(WIDE_REPO_COMMITS):
+        for file_number in range(10):
+            (repo_path / f"file_{file_number}.txt").write_text(
+                "line\n" * (file_number + 1) * (commit_number + 1)
+            )
+        repo.index.add([f"file_{file_number}.txt" for file_number in range(10)])
+        repo.index.commit(f"Commit {commit_number}")
+    return repo_path
+
+
+def test_analysis_budget() -> None:
+    """
+    Test sampling files and charging blobs against a budget.
+    """
+    with pytest.raises(ValueError):
+        AnalysisBudget(max_files=0)
+
+    budget = AnalysisBudget(max_files=3).start()
+    assert budget.sample(list(range(3))) == list(range(3))
+    assert not budget.partial
+    assert budget.sample(list(range(9))) == [0, 3, 6]
+    assert budget.exceeded == ["max_files"]
+
+    # Starting the budget of a new analysis resets its usage, but not cancellation
+    budget.cancel()
+    assert budget.start().exceeded == []
+    assert budget.stop_requested()
+    assert budget.exceeded == ["cancelled"]
+
+
+def test_compute_repo_data_budget(
+    wide_repo_path: pathlib.Path, tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that budgets return partial results which match across backends
+    and are not stored in the diff cache.
+    """
+    full = compute_repo_data(str(wide_repo_path), budget=AnalysisBudget())
+    assert (full["partial"], full["budgets_exceeded"]) == (False, [])
+    assert full["number_of_commits"] == WIDE_REPO_COMMITS
+
+    sampled = [
+        compute_repo_data(
+            str(wide_repo_path),
+            DiffOptions(backend=backend),
+            budget=AnalysisBudget(max_files=4),
+        )
+        for backend in ("pygit2", "git-cli", "gitpython")
+    ]
+    assert sampled[0]["budgets_exceeded"] == ["max_files"]
+    assert sorted(sampled[0]["file_level_entropy"]) == [
+        "file_0.txt",
+        "file_2.txt",
+        "file_5.txt",
+        "file_7.txt",
+    ]
+    assert all(data == sampled[0] for data in sampled[1:])
+
+    # Only the most recent commits are walked
+    recent = compute_repo_data(
+        str(wide_repo_path), budget=AnalysisBudget(max_commits=RECENT_COMMITS)
+    )
+    assert recent["number_of_commits"] == RECENT_COMMITS
+    assert recent["budgets_exceeded"] == ["max_commits"]
+    assert recent["total_lines_added"] < full["total_lines_added"]
+    assert not compute_repo_data(
+        str(wide_repo_path), budget=AnalysisBudget(max_commits=WIDE_REPO_COMMITS)
+    )["partial"]
+
+    # Files whose blobs do not fit are skipped
+    small = compute_repo_data(
+        str(wide_repo_path), budget=AnalysisBudget(max_blob_bytes=200)
+    )
+    assert small["budgets_exceeded"] == ["max_blob_bytes"]
+    assert 0 < small["number_of_files"] < full["number_of_files"]
+
+    # A cancelled analysis stops before diffing any file
+    budget = AnalysisBudget()
+    budget.cancel()
+    cancelled = compute_repo_data(str(wide_repo_path), budget=budget)
+    assert cancelled["budgets_exceeded"] == ["cancelled"]
+    assert cancelled["number_of_files"] == 0
+
+    # Partial statistics are not persisted
+    with DiffStatsCache(tmp_path / "diff_cache.sqlite") as cache:
+        cached = DiffOptions(cache=cache)
+        compute_repo_data(
+            str(wide_repo_path), cached, budget=AnalysisBudget(max_files=4)
+        )
+        data = compute_repo_data(str(wide_repo_path), cached)
+        assert data["number_of_files"] == full["number_of_files"]
+
+        # A warm cache does not bypass the budget
+        for warm_budget, expected in (
+            (AnalysisBudget(max_files=4), sampled[0]),
+            (AnalysisBudget(max_blob_bytes=200), small),
+            (budget, cancelled),
+        ):
+            assert (
+                compute_repo_data(str(wide_repo_path), cached, budget=warm_budget)
+                == expected
+            )
+        # Budgets which cannot cut the diff short still use the cache
+        hits = cache.hits
+        assert (
+            compute_repo_data(
+                str(wide_repo_path),
+                cached,
+                budget=AnalysisBudget(max_seconds=60),
+            )
+            == full
+        )
+        assert cache.hits == hits + 1
@@ -2,13 +2,20 @@
 Testing entropy functionality
 """
 
+import math
 import pathlib
 
+import numpy as np
+import pytest
 from test_git_operations import get_most_recent_commits
 
 from almanack.processing.calculate_entropy import (
+    EntropyProfile,
     calculate_aggregate_entropy,
+    calculate_batch_entropy,
+    calculate_entropy_arrays,
     calculate_normalized_entropy,
+    pack_loc_changes,
 )
 
 
@@ -54,3 +61,92 @@ def test_calculate_aggregate_entropy(
 
     # Ensure that repositories with different entropy levels have different aggregated scores
     assert repo_entropies["3_file_repo"] > repo_entropies["1_file_repo"]
+
+
+def test_calculate_batch_entropy() -> None:
+    """
+    Test that the array entropy kernels match the Shannon entropy formula
+    across a ragged batch of repositories.
+    """
+    repos_loc_changes = [
+        {"a.py": 10, "b.py": 30, "c.py": 0},
+        {},
+        {"d.py": 0, "e.py": 0},
+        {"f.py": 7},
+        {f"file_{number}.py": number * 3 + 1 for number in range(100)},
+    ]
+    changes, offsets = pack_loc_changes(repos_loc_changes)
+    assert offsets.tolist() == [0, 3, 3, 5, 6, 106]
+
+    entropy, aggregate_entropy = calculate_batch_entropy(changes, offsets)
+    for number, loc_changes in enumerate(repos_loc_changes):
+        # Reference values computed one file at a time
+        total_changes = sum(loc_changes.values())
+        expected = [
+            (
+                -(changed / total_changes) * math.log2(changed / total_changes)
+                if changed and total_changes
+                else 0.0
+            )
+            for changed in loc_changes.values()
+        ]
+        assert entropy[offsets[number] : offsets[number + 1]].tolist() == (
+            pytest.approx(expected, rel=1e-12, abs=0)
+        )
+        assert aggregate_entropy[number] == pytest.approx(
+            sum(expected) / len(expected) if expected else 0.0, rel=1e-12, abs=0
+        )
+
+    # A single repository normalized by a different number of files
+    single_entropy, single_aggregate = calculate_entropy_arrays(
+        np.array([10, 30, 0]), number_of_files=4
+    )
+    assert single_entropy.tolist() == entropy[:3].tolist()
+    assert single_aggregate == pytest.approx(entropy[:3].sum() / 4)
+
+    with pytest.raises(ValueError):
+        calculate_batch_entropy(changes, np.array([0, 5, 3, 106]))
+    with pytest.raises(ValueError):
+        calculate_batch_entropy(changes, np.array([0, 3]))
+
+
+def test_entropy_profile(
+    repository_paths: dict[str, pathlib.Path], repo_file_sets: dict[str, list[str]]
+) -> None:
+    """
+    Test that an entropy profile derives consistent statistics from
+    one calculation of the per-file entropies.
+    """
+    lines_changed = [10, 30, 0, 10]
+    profile = EntropyProfile(dict(zip(["a.py", "b.py", "c.py", "d.py"], lines_changed)))
+    entropy, aggregate_entropy = calculate_entropy_arrays(np.array(lines_changed))
+
+    assert profile.file_level_entropy == dict(
+        zip(["a.py", "b.py", "c.py", "d.py"], entropy.tolist())
+    )
+    assert profile.aggregate_entropy == aggregate_entropy
+    assert profile.total_entropy == pytest.approx(entropy.sum())
+    assert profile.total_lines_changed == sum(lines_changed)
+    # Ties keep file order
+    assert [name for name, _ in profile.top_files(1)] == ["a.py"]
+    assert [name for name, _ in profile.top_files(3)] == ["a.py", "d.py", "b.py"]
+    assert profile.top_files(10) == sorted(
+        profile.file_level_entropy.items(), key=lambda item: -item[1]
+    )
+    assert profile.distribution["max"] == entropy.max()
+    assert profile.distribution["min"] == 0.0
+    assert EntropyProfile({}).distribution["mean"] == 0.0
+    assert EntropyProfile({}).top_files() == []
+
+    # The existing functions are views of a profile
+    for label, repo_path in repository_paths.items():
+        source_commit, target_commit = get_most_recent_commits(repo_path)
+        profile = EntropyProfile.from_commits(
+            repo_path, source_commit, target_commit, repo_file_sets[label]
+        )
+        assert profile.file_level_entropy == calculate_normalized_entropy(
+            repo_path, source_commit, target_commit, repo_file_sets[label]
+        )
+        assert profile.aggregate_entropy == calculate_aggregate_entropy(
+            repo_path, source_commit, target_commit, repo_file_sets[label]
+        )
@@ -0,0 +1,126 @@
+"""
+Testing churn_index functionality
+"""
+
+import json
+import pathlib
+
+import git
+import pytest
+
+from almanack.processing.churn_index import ChurnIndex
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.entropy_series import (
+    WindowSpec,
+    calculate_entropy_series,
+    iter_commit_churn,
+)
+from almanack.processing.processing_repositories import process_churn_index
+from almanack.processing.repo_session import RepoSession
+
+# commits of the history repository and the lines they change
+HISTORY_COMMITS = 4
+HISTORY_LINES_CHANGED = 7
+# lines changed once two more commits add c.txt and d.txt
+UPDATED_LINES_CHANGED = 10
+
+
+def _commit(repo: git.Repo, repo_path: pathlib.Path, files: dict) -> None:
+    """
+    Writes files and commits them.
+    """
+    for file_name, content in files.items():
+        (repo_path / file_name).write_text(content)
+    repo.index.add(list(files))
+    repo.index.commit(f"Change {', '.join(files)}")
+
+
+@pytest.fixture
+def history_repo(tmp_path: pathlib.Path) -> git.Repo:
+    """
+    Creates a repository with four commits changing three files.
+    """
+    repo_path = tmp_path / "history_repo"
+    repo = git.Repo.init(repo_path)
+    _commit(repo, repo_path, {"a.txt": "a\n", "b.txt": "b\n"})
+    _commit(repo, repo_path, {"a.txt": "a\na\n"})
+    _commit(repo, repo_path, {"b.txt": "c\n", "c.txt": "c\nc\nc\n"})
+    _commit(repo, repo_path, {"a.txt": "a\n"})
+    return repo
+
+
+def _churn(repo_path: pathlib.Path) -> list:
+    """
+    Returns the churn of each commit computed by diffing.
+    """
+    with RepoSession(repo_path) as session:
+        return [
+            (str(commit.id), changes) for commit, changes in iter_commit_churn(session)
+        ]
+
+
+def test_churn_index_update(history_repo: git.Repo, tmp_path: pathlib.Path) -> None:
+    """
+    Test that updates index only new commits and match the churn found by diffing.
+    """
+    repo_path = pathlib.Path(history_repo.working_dir)
+    with ChurnIndex(tmp_path / "churn.sqlite") as index:
+        assert index.update(repo_path) == HISTORY_COMMITS
+        assert index.update(repo_path) == 0
+        assert index.head == history_repo.head.commit.hexsha
+        assert index.count_commits() == HISTORY_COMMITS
+
+        # Only new commits are diffed
+        new_files = [{"c.txt": "c\n"}, {"d.txt": "d\n"}]
+        for files in new_files:
+            _commit(history_repo, repo_path, files)
+        assert index.update(repo_path) == len(new_files)
+
+        with RepoSession(repo_path) as session:
+            assert [
+                (str(commit.id), changes)
+                for commit, changes in index.iter_commit_churn(session.repo)
+            ] == _churn(repo_path)
+
+        # Cumulative and windowed churn are read from the index
+        assert index.loc_changes() == {"a.txt": 2, "b.txt": 2, "c.txt": 5, "d.txt": 1}
+        assert index.loc_changes(2, 4) == {"a.txt": 1, "b.txt": 2, "c.txt": 3}
+        assert index.entropy_profile().total_lines_changed == UPDATED_LINES_CHANGED
+
+        # Commits dropped by rewriting history are replaced, here three
+        # commits by one, which leaves as many commits as the original history
+        history_repo.git.reset("--hard", "HEAD~3")
+        _commit(history_repo, repo_path, {"e.txt": "e\n"})
+        assert index.update(repo_path) == 1
+        assert index.count_commits() == HISTORY_COMMITS
+        assert "e.txt" in index.loc_changes()
+        assert "d.txt" not in index.loc_changes()
+
+        with pytest.raises(ValueError):
+            index.update(repo_path, DiffOptions(diff_profile="ignore-whitespace"))
+
+    # The index persists across connections
+    with ChurnIndex(tmp_path / "churn.sqlite") as index:
+        assert index.update(repo_path) == 0
+        assert index.count_commits() == HISTORY_COMMITS
+
+
+def test_entropy_series_churn_index(
+    history_repo: git.Repo, tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that entropy series read from an index match series computed by diffing.
+    """
+    repo_path = pathlib.Path(history_repo.working_dir)
+    with ChurnIndex(tmp_path / "churn.sqlite") as index:
+        window = WindowSpec("commits", size=2, step=1)
+        assert calculate_entropy_series(
+            repo_path, window, churn_index=index
+        ) == calculate_entropy_series(repo_path, window)
+
+    summary = json.loads(process_churn_index(str(repo_path), tmp_path / "churn.sqlite"))
+    assert (summary["new_commits"], summary["number_of_commits"]) == (
+        0,
+        HISTORY_COMMITS,
+    )
+    assert summary["total_lines_changed"] == HISTORY_LINES_CHANGED
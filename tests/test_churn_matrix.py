@@ -0,0 +1,125 @@
+"""
+Testing churn_matrix functionality
+"""
+
+import pathlib
+
+import git
+import numpy as np
+import pytest
+
+from almanack.processing.churn_matrix import ChurnEntries, ChurnMatrix
+from almanack.processing.entropy_series import (
+    WindowSpec,
+    calculate_entropy_series,
+    iter_commit_churn,
+)
+from almanack.processing.repo_session import RepoSession
+
+
+@pytest.fixture
+def matrix_repo_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Creates a repository with seven commits changing four files.
+    """
+    repo_path = tmp_path / "matrix_repo"
+    repo = git.Repo.init(repo_path)
+    for number, files in enumerate(
+        [
+            ["a.txt", "b.txt"],
+            ["a.txt"],
+            ["b.txt", "c.txt"],
+            ["a.txt", "c.txt", "d.txt"],
+            ["d.txt"],
+            ["a.txt", "b.txt"],
+            ["c.txt"],
+        ]
+    ):
+        for file_name in files:
+            (repo_path / file_name).write_text(f"{file_name}\n" * (number + 1))
+        repo.index.add(files)
+        repo.index.commit(f"Commit {number}")
+    return repo_path
+
+
+def test_churn_matrix(matrix_repo_path: pathlib.Path, tmp_path: pathlib.Path) -> None:
+    """
+    Test that the matrix holds each commit's churn and survives saving and loading.
+    """
+    matrix = ChurnMatrix.from_repo(matrix_repo_path)
+    assert matrix.shape == (7, 4)
+
+    with RepoSession(matrix_repo_path) as session:
+        churn = list(iter_commit_churn(session))
+    assert matrix.commits == [str(commit.id) for commit, _ in churn]
+    assert [matrix.row(row) for row in range(7)] == [changes for _, changes in churn]
+
+    # Hotspots and cumulative churn from vectorized reductions
+    assert matrix.file_commit_counts().tolist() == [3, 2, 3, 2]
+    for start in (0, 5):
+        expected = {}
+        for _, changes in churn[start:]:
+            for file_name, changed in changes.items():
+                expected[file_name] = expected.get(file_name, 0) + changed
+        assert {
+            path: matrix.file_churn(start)[matrix.path_index(path)] for path in expected
+        } == expected
+        assert matrix.entropy_profile(start).file_names == sorted(expected)
+
+    for mmap in (True, False):
+        matrix.save(tmp_path / "matrix.churn")
+        loaded = ChurnMatrix.load(tmp_path / "matrix.churn", mmap=mmap)
+        assert isinstance(loaded.indices, np.memmap) == mmap
+        assert (loaded.commits, loaded.paths) == (matrix.commits, matrix.paths)
+        for name in ("indptr", "indices", "additions", "deletions", "commit_times"):
+            assert np.array_equal(getattr(loaded, name), getattr(matrix, name))
+
+    with pytest.raises(ValueError):
+        (tmp_path / "other").write_bytes(b"not a matrix")
+        ChurnMatrix.load(tmp_path / "other")
+
+    # The CSR arrays must have a row per commit and align with each other
+    entries = ChurnEntries(
+        matrix.indptr, matrix.indices, matrix.additions, matrix.deletions
+    )
+    assert ChurnMatrix(matrix.commits, matrix.commit_times, matrix.paths, entries).row(
+        6
+    ) == matrix.row(6)
+    with pytest.raises(ValueError):
+        ChurnMatrix(
+            matrix.commits,
+            matrix.commit_times,
+            matrix.paths,
+            entries._replace(deletions=matrix.deletions[1:]),
+        )
+
+
+def test_churn_matrix_window_entropy(matrix_repo_path: pathlib.Path) -> None:
+    """
+    Test that vectorized window entropy matches the entropy series.
+    """
+    matrix = ChurnMatrix.from_repo(matrix_repo_path)
+    for size, step in ((3, 1), (3, 3), (2, 3), (10, 1)):
+        starts, ends = matrix.commit_windows(size, step)
+        windows = matrix.window_entropy(starts, ends)
+        series = calculate_entropy_series(
+            matrix_repo_path, WindowSpec("commits", size=size, step=step)
+        )
+        assert [f"{start + 1}-{end}" for start, end in zip(starts, ends)] == [
+            window["window"] for window in series
+        ]
+        assert windows["number_of_files"].tolist() == [
+            window["number_of_files"] for window in series
+        ]
+        assert windows["total_lines_changed"].tolist() == [
+            window["total_lines_changed"] for window in series
+        ]
+        assert windows["normalized_entropy"] == pytest.approx(
+            [window["normalized_entropy"] for window in series]
+        )
+
+    # A whole-history window matches the entropy profile
+    windows = matrix.window_entropy([0], [7])
+    assert windows["normalized_entropy"][0] == pytest.approx(
+        matrix.entropy_profile().aggregate_entropy
+    )
@@ -5,6 +5,8 @@ Testing generate_data functionality
 import pathlib
 
 from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.git_operations import clone_repository
 
 
 def test_generate_whole_repo_data(repository_paths: dict[str, pathlib.Path]) -> None:
@@ -27,8 +29,58 @@ def test_generate_whole_repo_data(repository_paths: dict[str, pathlib.Path]) ->
             "number_of_files",
             "time_range_of_commits",
             "file_level_entropy",
+            "directory_entropy",
+            "total_lines_added",
+            "total_lines_deleted",
         ]
         assert all(key in data for key in expected_keys)
 
         # Check that repo_path in the output is the same as the input
         assert data["repo_path"] == str(repo_path)
+
+
+def test_compute_repo_data_bare(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Testing compute_repo_data produces the same output for bare repositories.
+    """
+    for label, repo_path in repository_paths.items():
+        bare_path = clone_repository(str(repo_path), bare=True)
+
+        data = compute_repo_data(str(bare_path))
+
+        assert "error" not in data
+        # Check that all values other than the path match the non-bare repository
+        assert {key: value for key, value in data.items() if key != "repo_path"} == {
+            key: value
+            for key, value in compute_repo_data(str(repo_path)).items()
+            if key != "repo_path"
+        }
+
+
+def test_compute_repo_data_profile(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Testing compute_repo_data adds stage timings and counters when profiling.
+    """
+    repo_path = repository_paths["3_file_repo"]
+    assert "timings" not in compute_repo_data(str(repo_path))
+
+    for backend in ("pygit2", "git-cli"):
+        data = compute_repo_data(
+            str(repo_path), DiffOptions(backend=backend), profile=True
+        )
+        timings = data.pop("timings")
+        assert list(timings["stages"]) == ["open", "history", "diff", "metrics"]
+        assert all(stats["calls"] == 1 for stats in timings["stages"].values())
+        assert timings["counters"]["files_diffed"] == data["number_of_files"]
+        assert (
+            timings["counters"]["lines"]
+            == data["total_lines_added"] + data["total_lines_deleted"]
+        )
+        if backend == "pygit2":
+            assert timings["counters"]["hunks"] > 0
+            assert timings["counters"]["blob_bytes"] > 0
+
+    # Failed runs report the stages reached
+    data = compute_repo_data(str(repo_path / "missing"), profile=True)
+    assert "error" in data
+    assert list(data["timings"]["stages"]) == ["open"]
@@ -0,0 +1,99 @@
+"""
+Testing corpus functionality
+"""
+
+import json
+import pathlib
+
+import pytest
+
+from almanack.processing.corpus import (
+    MANIFEST_FILE,
+    CorpusManifest,
+    CorpusOptions,
+    read_corpus_results,
+    run_corpus,
+)
+from almanack.processing.pipeline import CloneOptions, RepoPipeline
+from almanack.processing.processing_repositories import process_corpus
+
+# the interrupted run and the resumed run each write a result file
+RESULT_FILES = 2
+
+
+class _InterruptedPipeline(RepoPipeline):
+    """
+    A pipeline which is interrupted after a number of results.
+    """
+
+    def __init__(self, results_before_interrupt: int) -> None:
+        super().__init__(CloneOptions(workers=1), analysis_workers=1)
+        self.results_before_interrupt = results_before_interrupt
+
+    def run(self, repo_urls, **kwargs):
+        for number, data in enumerate(super().run(repo_urls, **kwargs)):
+            if number == self.results_before_interrupt:
+                raise KeyboardInterrupt
+            yield data
+
+
+def test_run_corpus_resumes(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that an interrupted corpus run keeps its finished results and that
+    later runs skip completed repositories and retry failures.
+    """
+    output_dir = tmp_path / "corpus"
+    repo_urls = [path.as_uri() for path in repository_paths.values()]
+    missing_url = (tmp_path / "missing").as_uri()
+
+    # The first result is flushed when the run is interrupted
+    with _InterruptedPipeline(1) as pipeline, pytest.raises(KeyboardInterrupt):
+        run_corpus(repo_urls, output_dir, pipeline=pipeline)
+    assert len(CorpusManifest(output_dir / MANIFEST_FILE).completed()) == 1
+
+    # A crash mid-write leaves an incomplete line which is ignored
+    with open(output_dir / MANIFEST_FILE, "a") as manifest_file:
+        manifest_file.write('{"repo_url": "trunc')
+
+    summary = run_corpus(
+        [*repo_urls, missing_url], output_dir, CorpusOptions(flush_every=1)
+    )
+    assert summary == {"skipped": 1, "completed": 1, "failed": 1}
+
+    manifest = CorpusManifest(output_dir / MANIFEST_FILE)
+    assert manifest.completed() == set(repo_urls)
+    assert list(manifest.failed()) == [missing_url]
+
+    # Only the failure is retried, unless retries are disabled
+    assert run_corpus([*repo_urls, missing_url], output_dir) == {
+        "skipped": 2,
+        "completed": 0,
+        "failed": 1,
+    }
+    assert run_corpus(
+        [*repo_urls, missing_url], output_dir, CorpusOptions(retry_failed=False)
+    ) == {
+        "skipped": 2,
+        "completed": 0,
+        "failed": 0,
+    }
+
+    results = list(read_corpus_results(output_dir))
+    assert sorted(result["repo_url"] for result in results) == sorted(repo_urls)
+    assert len(list(output_dir.glob("results-*.jsonl"))) == RESULT_FILES
+
+
+def test_process_corpus(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test running a corpus from a file of URLs.
+    """
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text(
+        "\n".join(path.as_uri() for path in repository_paths.values()) + "\n"
+    )
+    summary = json.loads(process_corpus(str(url_file), str(tmp_path / "corpus")))
+    assert summary == {"skipped": 0, "completed": len(repository_paths), "failed": 0}
@@ -0,0 +1,175 @@
+"""
+Testing diff_backends functionality
+"""
+
+import pathlib
+
+import pygit2
+import pytest
+
+from almanack.processing.diff_backends import (
+    DIFF_BACKENDS,
+    DiffRequest,
+    GitCliBackend,
+    Pygit2Backend,
+    get_diff_backend,
+    plan_diff_shards,
+)
+from almanack.processing.diff_filters import DiffFilter
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.diff_profiles import get_diff_profile
+from almanack.processing.git_operations import get_diff_stats, get_edited_files
+from almanack.processing.repo_session import RepoSession
+
+# the processes running parallel diffs and the shards planned for them
+WORKERS = 4
+SHARDS = 3
+
+
+def test_get_diff_backend() -> None:
+    """
+    Test looking up built-in backends.
+    """
+    assert isinstance(get_diff_backend(None), Pygit2Backend)
+    custom_backend = GitCliBackend(git_executable="git")
+    assert get_diff_backend(custom_backend) is custom_backend
+    assert sorted(DIFF_BACKENDS) == ["git-cli", "gitpython", "pygit2"]
+
+    with pytest.raises(ValueError):
+        get_diff_backend("unknown")
+
+    # Parallel diffing uses the git-cli backend
+    assert get_diff_backend(None, workers=WORKERS).workers == WORKERS
+    with pytest.raises(ValueError):
+        get_diff_backend("pygit2", workers=WORKERS)
+
+
+@pytest.mark.parametrize(
+    "diff_filter",
+    [
+        None,
+        DiffFilter(include=["src"]),
+        DiffFilter(presets=["vendored", "generated"], max_blob_size=1000),
+    ],
+)
+@pytest.mark.parametrize("diff_profile", ["default", "renames", "thorough"])
+def test_diff_backends_match(
+    filtered_repo_path: pathlib.Path,
+    renamed_repo_path: pathlib.Path,
+    diff_filter: DiffFilter,
+    diff_profile: str,
+) -> None:
+    """
+    Test that every backend returns identical diff stats and edited files.
+    """
+    for repo_path in (filtered_repo_path, renamed_repo_path):
+        repo = pygit2.Repository(str(repo_path))
+        target_commit = repo.revparse_single("HEAD")
+        source_commit = target_commit.parents[0]
+
+        diff_options = DiffOptions(diff_filter, diff_profile)
+        expected_stats = get_diff_stats(
+            repo, source_commit, target_commit, diff_options
+        )
+        expected_files = sorted(
+            get_edited_files(repo, source_commit, target_commit, diff_options)
+        )
+        assert expected_stats
+
+        for backend in DIFF_BACKENDS:
+            backend_options = diff_options._replace(backend=backend)
+            assert (
+                get_diff_stats(repo, source_commit, target_commit, backend_options)
+                == expected_stats
+            )
+            assert (
+                sorted(
+                    get_edited_files(
+                        repo, source_commit, target_commit, backend_options
+                    )
+                )
+                == expected_files
+            )
+
+
+def test_diff_backends_on_history(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that backends match across the full history of the test repositories,
+    including diffs against root commits.
+    """
+    for repo_path in repository_paths.values():
+        with RepoSession(repo_path) as session:
+            head_commit = session.get_head_commit()
+            first_commit = session.get_first_commit()
+            results = [
+                session.get_diff_stats(
+                    first_commit, head_commit, DiffOptions(backend=backend)
+                )
+                for backend in DIFF_BACKENDS
+            ]
+            assert all(result == results[0] for result in results)
+
+
+def test_plan_diff_shards(filtered_repo_path: pathlib.Path) -> None:
+    """
+    Test that shards cover each changed path exactly once.
+    """
+    repo = pygit2.Repository(str(filtered_repo_path))
+    target_commit = repo.revparse_single("HEAD")
+    source_commit = target_commit.parents[0]
+
+    shards = plan_diff_shards(repo, source_commit, target_commit, SHARDS)
+    assert len(shards) == SHARDS
+    pathspecs = sorted(path for shard in shards for path in shard)
+    assert pathspecs == sorted(set(pathspecs))
+    # Every changed file falls under exactly one pathspec
+    for file_name in get_edited_files(repo, source_commit, target_commit):
+        assert (
+            sum(
+                file_name == path or file_name.startswith(f"{path}/")
+                for path in pathspecs
+            )
+            == 1
+        )
+
+    # Shards are limited to the given prefixes and skip unchanged trees
+    shards = plan_diff_shards(repo, source_commit, target_commit, 2, ["src"])
+    assert sorted(path for shard in shards for path in shard) == [
+        "src/a.py",
+        "src/pkg",
+    ]
+    assert plan_diff_shards(repo, target_commit, target_commit, 2) == []
+
+
+@pytest.mark.parametrize(
+    "diff_filter",
+    [None, DiffFilter(include=["src"]), DiffFilter(exclude=["vendor"])],
+)
+def test_parallel_diff_matches_serial(
+    filtered_repo_path: pathlib.Path,
+    repository_paths: dict[str, pathlib.Path],
+    diff_filter: DiffFilter,
+) -> None:
+    """
+    Test that sharded parallel diffs are identical to a single diff.
+    """
+    for repo_path in [filtered_repo_path, *repository_paths.values()]:
+        with RepoSession(repo_path) as session:
+            head_commit = session.get_head_commit()
+            first_commit = session.get_first_commit()
+            diff_options = DiffOptions(diff_filter)
+            expected_stats = session.get_diff_stats(
+                first_commit, head_commit, diff_options
+            )
+            expected_files = sorted(
+                session.get_edited_files(first_commit, head_commit, diff_options)
+            )
+            request = DiffRequest(
+                first_commit, head_commit, get_diff_profile(None), diff_filter
+            )
+
+            for workers in (2, 8):
+                # Call the backend directly since sessions cache results per backend
+                backend = get_diff_backend(None, workers=workers)
+                assert backend.diff_stats(session, request) == expected_stats
+                assert sorted(backend.edited_files(session, request)) == expected_files
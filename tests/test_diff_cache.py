@@ -0,0 +1,144 @@
+"""
+Testing diff_cache functionality
+"""
+
+import pathlib
+
+import pygit2
+import pytest
+
+from almanack.processing import diff_cache
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.diff_backends import DIFF_BACKENDS
+from almanack.processing.diff_cache import (
+    DIFF_CACHE_ENV,
+    DiffStatsCache,
+    get_default_diff_cache,
+)
+from almanack.processing.diff_filters import DiffFilter
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.repo_session import RepoSession
+
+
+def test_diff_stats_cache_entries(tmp_path: pathlib.Path) -> None:
+    """
+    Test storing and looking up tree and blob entries with hit and miss counters.
+    """
+    with DiffStatsCache(tmp_path / "cache" / "diff-stats.sqlite") as cache:
+        assert cache.get_tree_stats(("a", "b")) is None
+        cache.put_tree_stats(("a", "b"), {"file.py": {"additions": 1, "deletions": 2}})
+        assert cache.get_tree_stats(("a", "b")) == {
+            "file.py": {"additions": 1, "deletions": 2}
+        }
+        # Options are part of the key
+        assert cache.get_tree_stats(("a", "b", "all")) is None
+
+        cache.put_blob_stats([(("x", "y"), (3, 4))])
+        assert cache.get_blob_stats([("x", "y"), ("y", "x")]) == [(3, 4), None]
+
+        stats = cache.stats()
+        assert {key: stats[key] for key in ("hits", "misses", "entries")} == {
+            "hits": 2,
+            "misses": 3,
+            "entries": 2,
+        }
+
+    # Entries persist across instances
+    with DiffStatsCache(tmp_path / "cache" / "diff-stats.sqlite") as cache:
+        assert cache.get_blob_stats([("x", "y")]) == [(3, 4)]
+
+
+def test_diff_stats_cache_eviction(tmp_path: pathlib.Path) -> None:
+    """
+    Test that the least recently used entries are evicted beyond max_bytes.
+    """
+    with DiffStatsCache(tmp_path / "diff-stats.sqlite", max_bytes=64 * 1024) as cache:
+        cache.put_blob_stats([(("first", "pair"), (1, 1))])
+        for batch in range(20):
+            cache.put_blob_stats(
+                [((str(batch), str(number)), (batch, number)) for number in range(200)]
+            )
+        assert cache.evictions > 0
+        assert cache.size() <= 64 * 1024
+        # The oldest entry was evicted
+        assert cache.get_blob_stats([("first", "pair")]) == [None]
+
+
+@pytest.mark.parametrize("backend", sorted(DIFF_BACKENDS))
+@pytest.mark.parametrize("diff_profile", ["default", "ignore-whitespace"])
+def test_cached_diff_stats_match(
+    tmp_path: pathlib.Path,
+    filtered_repo_path: pathlib.Path,
+    backend: str,
+    diff_profile: str,
+) -> None:
+    """
+    Test that cached diff stats are identical to uncached diff stats.
+    """
+    repo = pygit2.Repository(str(filtered_repo_path))
+    target_commit = repo.revparse_single("HEAD")
+    source_commit = target_commit.parents[0]
+    diff_options = DiffOptions(DiffFilter(exclude=["vendor"]), diff_profile, backend)
+
+    with RepoSession(repo) as session:
+        expected_stats = session.get_diff_stats(
+            source_commit, target_commit, diff_options
+        )
+
+    with DiffStatsCache(tmp_path / "diff-stats.sqlite") as cache:
+        for _ in range(2):
+            with RepoSession(repo, diff_cache=cache) as session:
+                assert (
+                    session.get_diff_stats(source_commit, target_commit, diff_options)
+                    == expected_stats
+                )
+        # The second run is served from the tree entry
+        assert cache.stats()["hits"] == 1
+
+
+def test_blob_stats_reused(
+    tmp_path: pathlib.Path, repository_paths: dict[str, pathlib.Path]
+) -> None:
+    """
+    Test that blob pairs are reused by diffs of different trees and
+    that compute_repo_data results are unchanged by the cache.
+    """
+    repo_path = repository_paths["3_file_repo"]
+    expected_data = compute_repo_data(str(repo_path))
+
+    with DiffStatsCache(tmp_path / "diff-stats.sqlite") as cache:
+        diff_options = DiffOptions(cache=cache)
+        assert compute_repo_data(str(repo_path), diff_options) == expected_data
+        assert compute_repo_data(str(repo_path), diff_options) == expected_data
+        assert cache.hits == 1
+
+        # A different filter diffs the same trees with the cached blob pairs
+        with RepoSession(repo_path, diff_cache=cache) as session:
+            hits = cache.hits
+            diff_stats = session.get_diff_stats(
+                session.get_first_commit(),
+                session.get_head_commit(),
+                DiffOptions(DiffFilter(max_blob_size=10**9)),
+            )
+        assert diff_stats
+        assert cache.hits - hits == len(diff_stats)
+
+
+def test_get_default_diff_cache(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test that the environment variable enables a cache for every session.
+    """
+    monkeypatch.delenv(DIFF_CACHE_ENV, raising=False)
+    monkeypatch.setattr(diff_cache, "_default_cache", None)
+    assert get_default_diff_cache() is None
+
+    monkeypatch.setenv(DIFF_CACHE_ENV, str(tmp_path / "diff-stats.sqlite"))
+    cache = get_default_diff_cache()
+    assert cache is not None
+    assert get_default_diff_cache() is cache
+    repo = pygit2.init_repository(str(tmp_path / "repo"))
+    with RepoSession(repo) as session:
+        assert session.diff_cache is cache
+    cache.close()
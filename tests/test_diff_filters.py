@@ -0,0 +1,116 @@
+"""
+Testing diff_filters functionality
+"""
+
+import json
+import pathlib
+
+import pygit2
+import pytest
+
+from almanack.processing.diff_filters import DiffFilter
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.git_operations import get_diff_stats, get_edited_files
+from almanack.processing.processing_repositories import process_repo_entropy
+
+
+def test_diff_filter_matches() -> None:
+    """
+    Test that pathspecs follow git diff pathspec semantics.
+    """
+    diff_filter = DiffFilter(include=["src"], exclude=["*.min.js", "src/pkg/*"])
+
+    assert diff_filter.matches("src/a.py")
+    assert not diff_filter.matches("src/pkg/b.py")
+    assert not diff_filter.matches("src/app.min.js")
+    assert not diff_filter.matches("srcfile.py")
+    assert not diff_filter.matches("vendor/lib.js")
+
+    presets_filter = DiffFilter(presets=["vendored", "generated"])
+    assert not presets_filter.matches("vendor/lib.js")
+    assert not presets_filter.matches("web/node_modules/pkg/index.js")
+    assert not presets_filter.matches("app.min.js")
+    assert presets_filter.matches("src/a.py")
+
+    with pytest.raises(ValueError):
+        DiffFilter(presets=["unknown"])
+
+
+def test_diff_filter_tree_prefixes() -> None:
+    """
+    Test that only literal include pathspecs are pushed down to subtrees.
+    """
+    assert DiffFilter(include=["src/", "src/pkg", "docs"]).tree_prefixes() == [
+        "docs",
+        "src",
+    ]
+    assert DiffFilter(include=["src", "*.py"]).tree_prefixes() is None
+    assert DiffFilter(exclude=["vendor"]).tree_prefixes() is None
+
+    # Pathspecs are normalized, and the root includes the whole tree
+    assert DiffFilter(include=["./src/", "docs/../src/pkg"]).tree_prefixes() == ["src"]
+    for root in (".", "./", "/"):
+        assert DiffFilter(include=[root, "src"]).tree_prefixes() is None
+        assert DiffFilter(include=[root]).matches("vendor/lib.js")
+    assert DiffFilter(include=["./src"]).matches("src/a.py")
+    assert DiffFilter(include=["./src/*.py"]).matches("src/a.py")
+    assert not DiffFilter(include=["./src"]).matches("docs/index.md")
+
+
+def test_get_diff_stats_with_filter(filtered_repo_path: pathlib.Path) -> None:
+    """
+    Test that filters are applied to diff stats and edited files.
+    """
+    repo = pygit2.Repository(str(filtered_repo_path))
+    target_commit = repo.revparse_single("HEAD")
+    source_commit = target_commit.parents[0]
+
+    unfiltered = get_diff_stats(repo, source_commit, target_commit)
+    assert sorted(unfiltered) == [
+        "app.min.js",
+        "data.txt",
+        "src/a.py",
+        "src/pkg/b.py",
+        "vendor/lib.js",
+    ]
+
+    # Subtree pushdown through a literal include pathspec
+    diff_options = DiffOptions(DiffFilter(include=["src"]))
+    filtered = get_diff_stats(repo, source_commit, target_commit, diff_options)
+    assert filtered == {path: unfiltered[path] for path in ["src/a.py", "src/pkg/b.py"]}
+    assert sorted(
+        get_edited_files(repo, source_commit, target_commit, diff_options)
+    ) == ["src/a.py", "src/pkg/b.py"]
+
+    # The root and "./" prefixes match git diff -- . semantics
+    assert (
+        get_diff_stats(
+            repo, source_commit, target_commit, DiffOptions(DiffFilter(include=["."]))
+        )
+        == unfiltered
+    )
+    assert get_diff_stats(
+        repo, source_commit, target_commit, DiffOptions(DiffFilter(include=["./src"]))
+    ) == {path: unfiltered[path] for path in ["src/a.py", "src/pkg/b.py"]}
+
+    # Presets and blob size limits
+    filtered = get_diff_stats(
+        repo,
+        source_commit,
+        target_commit,
+        DiffOptions(DiffFilter(presets=["vendored", "generated"], max_blob_size=1000)),
+    )
+    assert sorted(filtered) == ["src/a.py", "src/pkg/b.py"]
+
+
+def test_process_repo_entropy_with_filter(filtered_repo_path: pathlib.Path) -> None:
+    """
+    Test that filters are available through the command line entry point.
+    """
+    entropy_data = json.loads(
+        process_repo_entropy(
+            str(filtered_repo_path), exclude="vendor,*.min.js", max_blob_size=1000
+        )
+    )
+
+    assert sorted(entropy_data["file_level_entropy"]) == ["src/a.py", "src/pkg/b.py"]
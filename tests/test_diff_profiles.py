@@ -0,0 +1,90 @@
+"""
+Testing diff_profiles functionality
+"""
+
+import pathlib
+
+import pygit2
+import pytest
+
+from almanack.processing.diff_filters import DiffFilter
+from almanack.processing.diff_options import DiffOptions
+from almanack.processing.diff_profiles import (
+    DIFF_PROFILES,
+    DiffProfile,
+    get_diff_profile,
+)
+from almanack.processing.git_operations import (
+    get_diff_stats,
+    get_edited_files,
+    get_loc_changed,
+)
+
+
+def test_get_diff_profile() -> None:
+    """
+    Test looking up built-in profiles and validating options.
+    """
+    assert get_diff_profile(None) is DIFF_PROFILES["default"]
+    assert get_diff_profile("renames").detect_renames
+    custom_profile = DiffProfile("custom", context_lines=1)
+    assert get_diff_profile(custom_profile) is custom_profile
+
+    with pytest.raises(ValueError):
+        get_diff_profile("unknown")
+    with pytest.raises(ValueError):
+        DiffProfile("invalid", whitespace="unknown")
+
+
+def test_diff_profiles(renamed_repo_path: pathlib.Path) -> None:
+    """
+    Test that profiles control rename detection and whitespace handling
+    consistently across git operations.
+    """
+    repo = pygit2.Repository(str(renamed_repo_path))
+    target_commit = repo.revparse_single("HEAD")
+    source_commit = target_commit.parents[0]
+
+    # Without rename detection the rename counts as a full delete plus a full add
+    default_stats = get_diff_stats(repo, source_commit, target_commit)
+    assert default_stats["src/old.py"] == {"additions": 0, "deletions": 50}
+    assert default_stats["src/new.py"] == {"additions": 51, "deletions": 0}
+
+    # Context lines do not change line counts
+    assert get_diff_stats(
+        repo, source_commit, target_commit, DiffOptions(diff_profile="fast")
+    ) == (default_stats)
+
+    # With rename detection only the edit is counted, under the new path
+    rename_stats = get_diff_stats(
+        repo, source_commit, target_commit, DiffOptions(diff_profile="renames")
+    )
+    assert rename_stats["src/new.py"] == {"additions": 1, "deletions": 0}
+    assert "src/old.py" not in rename_stats
+    assert sorted(
+        get_edited_files(
+            repo, source_commit, target_commit, DiffOptions(diff_profile="renames")
+        )
+    ) == ["spacing.py", "src/new.py", "src/old.py"]
+    assert get_loc_changed(
+        renamed_repo_path,
+        str(source_commit.id),
+        str(target_commit.id),
+        ["src/new.py"],
+        DiffOptions(diff_profile="renames"),
+    ) == {"src/new.py": 1}
+
+    # Rename detection also applies to filtered subtree diffs
+    assert get_diff_stats(
+        repo,
+        source_commit,
+        target_commit,
+        DiffOptions(DiffFilter(include=["src"]), "renames"),
+    ) == {"src/new.py": rename_stats["src/new.py"]}
+
+    # Ignoring whitespace changes removes the reformatted file, as in git
+    assert default_stats["spacing.py"] == {"additions": 1, "deletions": 1}
+    thorough_stats = get_diff_stats(
+        repo, source_commit, target_commit, DiffOptions(diff_profile="thorough")
+    )
+    assert "spacing.py" not in thorough_stats
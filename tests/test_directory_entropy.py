@@ -0,0 +1,96 @@
+"""
+Testing directory_entropy functionality
+"""
+
+import pathlib
+
+import numpy as np
+import pytest
+
+from almanack.processing.calculate_entropy import calculate_entropy_arrays
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.directory_entropy import (
+    build_directory_tree,
+    calculate_directory_entropy,
+)
+from almanack.reporting.report import repo_report
+
+LOC_CHANGES = {
+    "README.md": 4,
+    "src/a.py": 10,
+    "src/pkg/b.py": 6,
+    "src/pkg/c.py": 0,
+    "src/pkg/deep/d.py": 20,
+    "docs/index.md": 8,
+}
+
+
+def test_calculate_directory_entropy() -> None:
+    """
+    Test that directory statistics match statistics calculated
+    directly from the files within each directory.
+    """
+    file_names = list(LOC_CHANGES)
+    file_entropy = dict(
+        zip(
+            file_names,
+            calculate_entropy_arrays(np.array(list(LOC_CHANGES.values())))[0].tolist(),
+        )
+    )
+    directory_entropy = calculate_directory_entropy(LOC_CHANGES, file_entropy)
+
+    assert list(directory_entropy) == [
+        ".",
+        "src",
+        "src/pkg",
+        "src/pkg/deep",
+        "docs",
+    ]
+    for path, stats in directory_entropy.items():
+        files = [
+            file_name
+            for file_name in file_names
+            if path == "." or file_name.startswith(f"{path}/")
+        ]
+        assert stats["depth"] == (0 if path == "." else path.count("/") + 1)
+        assert stats["number_of_files"] == len(files)
+        assert stats["lines_changed"] == sum(LOC_CHANGES[name] for name in files)
+        assert stats["entropy"] == pytest.approx(
+            sum(file_entropy[name] for name in files)
+        )
+        assert stats["normalized_entropy"] == pytest.approx(
+            calculate_entropy_arrays(np.array([LOC_CHANGES[name] for name in files]))[1]
+        )
+
+    # Depth limits the directories returned
+    assert list(calculate_directory_entropy(LOC_CHANGES, file_entropy, 1)) == [
+        ".",
+        "src",
+        "docs",
+    ]
+
+
+def test_build_directory_tree_empty() -> None:
+    """
+    Test the tree of a diff without changes.
+    """
+    root = build_directory_tree({}, {})
+    assert root.number_of_files == 0
+    assert root.normalized_entropy == 0.0
+    assert list(root.iter_nodes()) == [root]
+
+
+def test_directory_entropy_report(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that compute_repo_data reports directory entropy and the
+    report shows it as a tree.
+    """
+    data = compute_repo_data(str(repository_paths["3_file_repo"]))
+
+    root = data["directory_entropy"]["."]
+    assert root["number_of_files"] == data["number_of_files"]
+    assert root["lines_changed"] == (
+        data["total_lines_added"] + data["total_lines_deleted"]
+    )
+    assert root["normalized_entropy"] == pytest.approx(data["total_normalized_entropy"])
+    assert "Directory entropy (to depth 1)" in repo_report(data, max_depth=1)
@@ -0,0 +1,198 @@
+"""
+Testing entropy_series functionality
+"""
+
+import json
+import pathlib
+
+import git
+import numpy as np
+import pygit2
+import pytest
+
+from almanack.processing.calculate_entropy import calculate_entropy_arrays
+from almanack.processing.entropy_series import (
+    WindowSpec,
+    _WindowChurn,
+    calculate_entropy_series,
+    iter_commit_churn,
+)
+from almanack.processing.git_operations import get_diff_stats
+from almanack.processing.processing_repositories import process_repo_entropy_series
+from almanack.processing.repo_session import RepoSession
+
+# the commit of the history repository tagged as a release, the last in January
+RELEASE_COMMIT = 3
+
+
+@pytest.fixture
+def history_repo_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Creates a repository with seven commits across two months,
+    with a release tag on the fourth commit.
+    """
+    repo_path = tmp_path / "history_repo"
+    repo = git.Repo.init(repo_path)
+
+    for commit_number in range(7):
+        # Edit a varying subset of files in each commit
+        for file_number in range(commit_number % 3 + 1):
+            file_path = repo_path / f"file_{file_number}.txt"
+            file_path.write_text("line\n" * (commit_number + file_number + 1))
+        repo.git.add(A=True)
+        month = 1 if commit_number <= RELEASE_COMMIT else 2
+        commit_date = f"2024-0{month}-1{commit_number}T12:00:00"
+        repo.index.commit(
+            f"Commit {commit_number}",
+            author_date=commit_date,
+            commit_date=commit_date,
+        )
+        if commit_number == RELEASE_COMMIT:
+            repo.create_tag("v1.0")
+
+    return repo_path
+
+
+def _expected_entropy(repo_path: pathlib.Path, commit_numbers: range) -> float:
+    """
+    Calculates the entropy of the summed churn of commits, diffing each
+    commit against its parent.
+    """
+    repo = pygit2.Repository(str(repo_path))
+    commits = list(
+        repo.walk(
+            repo.head.target,
+            pygit2.enums.SortMode.TOPOLOGICAL | pygit2.enums.SortMode.REVERSE,
+        )
+    )
+    loc_changes = {}
+    for number in commit_numbers:
+        if not commits[number].parents:
+            continue
+        for file_name, stats in get_diff_stats(
+            repo, commits[number].parents[0], commits[number]
+        ).items():
+            loc_changes[file_name] = (
+                loc_changes.get(file_name, 0) + stats["additions"] + stats["deletions"]
+            )
+    return calculate_entropy_arrays(np.array(list(loc_changes.values()), dtype=int))[1]
+
+
+def test_iter_commit_churn(history_repo_path: pathlib.Path) -> None:
+    """
+    Test that history is walked once, oldest first, with churn per commit.
+    """
+    with RepoSession(history_repo_path) as session:
+        churn = list(iter_commit_churn(session))
+
+    assert [commit.message for commit, _ in churn] == [
+        f"Commit {number}" for number in range(7)
+    ]
+    # The root commit is the baseline
+    assert churn[0][1] == {}
+    assert churn[1][1] == {"file_0.txt": 1, "file_1.txt": 3}
+
+
+def test_calculate_entropy_series_commits(history_repo_path: pathlib.Path) -> None:
+    """
+    Test non-overlapping and rolling windows of commits.
+    """
+    series = calculate_entropy_series(history_repo_path, WindowSpec("commits", size=3))
+    assert [entry["window"] for entry in series] == ["1-3", "4-6", "7-7"]
+    assert [entry["number_of_commits"] for entry in series] == [3, 3, 1]
+    for entry, commit_numbers in zip(series, [range(0, 3), range(3, 6), range(6, 7)]):
+        assert entry["normalized_entropy"] == pytest.approx(
+            _expected_entropy(history_repo_path, commit_numbers)
+        )
+
+    rolling = calculate_entropy_series(
+        history_repo_path, WindowSpec("commits", size=3, step=1), include_files=True
+    )
+    assert [entry["window"] for entry in rolling] == [
+        "1-3",
+        "2-4",
+        "3-5",
+        "4-6",
+        "5-7",
+    ]
+    for number, entry in enumerate(rolling):
+        assert entry["normalized_entropy"] == pytest.approx(
+            _expected_entropy(history_repo_path, range(number, number + 3))
+        )
+        assert entry["number_of_files"] == len(entry["file_level_entropy"])
+
+    # Rolling windows which do not end on the last commit are followed by a tail
+    assert [
+        entry["window"]
+        for entry in calculate_entropy_series(
+            history_repo_path, WindowSpec("commits", size=4, step=2)
+        )
+    ] == ["1-4", "3-6", "5-7"]
+
+    with pytest.raises(ValueError):
+        calculate_entropy_series(history_repo_path, window="weekly")
+    with pytest.raises(ValueError):
+        calculate_entropy_series(history_repo_path, WindowSpec("commits", size=0))
+
+
+def test_calculate_entropy_series_month_and_release(
+    history_repo_path: pathlib.Path,
+) -> None:
+    """
+    Test calendar month and release windows.
+    """
+    months = calculate_entropy_series(history_repo_path, window="month")
+    assert [entry["window"] for entry in months] == ["2024-01", "2024-02"]
+    assert [entry["number_of_commits"] for entry in months] == [4, 3]
+    assert months[1]["normalized_entropy"] == pytest.approx(
+        _expected_entropy(history_repo_path, range(4, 7))
+    )
+
+    releases = calculate_entropy_series(history_repo_path, window="release")
+    assert [entry["window"] for entry in releases] == ["v1.0", "HEAD"]
+    # The release tag falls on the last commit of January
+    assert [
+        {key: value for key, value in entry.items() if key != "window"}
+        for entry in releases
+    ] == [
+        {key: value for key, value in entry.items() if key != "window"}
+        for entry in months
+    ]
+    assert [
+        entry["window"]
+        for entry in calculate_entropy_series(
+            history_repo_path, WindowSpec("release", tag_pattern="v2*")
+        )
+    ] == ["HEAD"]
+
+
+def test_window_churn_totals(history_repo_path: pathlib.Path) -> None:
+    """
+    Test that month and release windows keep running totals instead of
+    the churn of each commit, which rolling windows keep to drop it again.
+    """
+    with RepoSession(history_repo_path) as session:
+        commit_churn = list(iter_commit_churn(session))
+
+    totals, rolling = _WindowChurn(), _WindowChurn(rolling=True)
+    for commit, loc_changes in commit_churn:
+        totals.add(commit, loc_changes)
+        rolling.add(commit, loc_changes)
+    assert not totals.commits
+    assert not totals.edits
+    assert totals.loc_changes == rolling.loc_changes
+    assert totals.summarize("all", True) == rolling.summarize("all", True)
+
+    rolling.pop_oldest()
+    assert rolling.start_commit == commit_churn[1][0]
+    assert rolling.number_of_commits == len(commit_churn) - 1
+
+
+def test_process_repo_entropy_series(history_repo_path: pathlib.Path) -> None:
+    """
+    Test the command line entry point for entropy series.
+    """
+    series = json.loads(
+        process_repo_entropy_series(str(history_repo_path), window="commits", size=4)
+    )
+    assert [entry["window"] for entry in series] == ["1-4", "5-7"]
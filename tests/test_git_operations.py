@@ -3,17 +3,28 @@ Test git operations functionality
 """
 
 import pathlib
+import shutil
 from typing import Any
 
+import git
 import pygit2
 
+from almanack.processing.budget import AnalysisBudget
 from almanack.processing.git_operations import (
     clone_repository,
+    count_commits,
     get_commits,
+    get_diff_stats,
     get_edited_files,
+    get_first_commit,
+    get_head_commit,
     get_loc_changed,
     get_most_recent_commits,
+    get_root_commits,
+    is_repository,
+    iter_commits,
 )
+from almanack.processing.repo_session import RepoSession
 
 
 def test_clone_repository(repository_paths: dict[str, Any]):
@@ -26,6 +37,23 @@ def test_clone_repository(repository_paths: dict[str, Any]):
     assert cloned_path.exists()
 
 
+def test_clone_repository_bare(repository_paths: dict[str, Any]):
+    repo_path = repository_paths["3_file_repo"]
+
+    # Call the function without checking out a working tree
+    cloned_path = clone_repository(str(repo_path), bare=True)
+
+    # Assert that the clone is bare and contains no checked out files
+    assert pygit2.Repository(str(cloned_path)).is_bare
+    assert not (cloned_path / "file_1.md").exists()
+    assert is_repository(cloned_path)
+
+
+def test_is_repository(repository_paths: dict[str, Any], tmp_path: pathlib.Path):
+    assert is_repository(repository_paths["3_file_repo"])
+    assert not is_repository(tmp_path)
+
+
 def test_get_commits(repository_paths: dict[str, Any]):
     # Open the repo
     repo_path = repository_paths["3_file_repo"]
@@ -40,6 +68,82 @@ def test_get_commits(repository_paths: dict[str, Any]):
     assert len(commits) > 0
 
 
+def test_streaming_commits(
+    repository_paths: dict[str, Any], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that the streaming history helpers match the list of commits,
+    with and without commit-graph files.
+    """
+    # Copy the repo so that a commit-graph may be written without affecting other tests
+    repo_path = tmp_path / "3_file_repo"
+    shutil.copytree(repository_paths["3_file_repo"], repo_path)
+
+    for write_commit_graph in (False, True):
+        if write_commit_graph:
+            git.Repo(repo_path).git.commit_graph("write", "--reachable")
+
+        repo = pygit2.Repository(str(repo_path))
+        commits = get_commits(repo)
+
+        assert [commit.id for commit in iter_commits(repo)] == [
+            commit.id for commit in commits
+        ]
+        assert get_head_commit(repo).id == commits[0].id
+        assert get_first_commit(repo).id == commits[-1].id
+        assert [commit.id for commit in get_root_commits(repo)] == [
+            commit.id for commit in commits if not commit.parent_ids
+        ]
+        assert count_commits(repo) == len(commits)
+
+
+def test_first_commit_with_several_roots(tmp_path: pathlib.Path) -> None:
+    """
+    Test that the first commit of a history with two root commits is the
+    same root with and without commit-graph files.
+    """
+    repo_path = tmp_path / "two_roots"
+    repo = git.Repo.init(repo_path)
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Almanack")
+        config.set_value("user", "email", "almanack@example.com")
+    repo.git.checkout("-b", "main")
+
+    def commit(file_name: str, date: str) -> None:
+        (repo_path / file_name).write_text(file_name)
+        repo.index.add([file_name])
+        repo.index.commit(file_name, author_date=date, commit_date=date)
+
+    # Two roots made at the same time, so the tie is broken by OID
+    commit("main.txt", "2020-01-01T00:00:00")
+    repo.git.checkout("--orphan", "other")
+    repo.git.rm("-rf", "--cached", ".")
+    (repo_path / "main.txt").unlink()
+    commit("other.txt", "2020-01-01T00:00:00")
+    repo.git.checkout("-f", "main")
+    repo.git.merge("other", "--allow-unrelated-histories", "-m", "Merge")
+    roots = (repo.commit("main~1"), repo.commit("other"))
+    oldest_root = min(
+        roots,
+        key=lambda root: (root.committed_date, root.hexsha),
+    )
+
+    for write_commit_graph in (False, True):
+        if write_commit_graph:
+            repo.git.commit_graph("write", "--reachable")
+        assert {
+            str(root.id) for root in get_root_commits(pygit2.Repository(str(repo_path)))
+        } == {root.hexsha for root in roots}
+        assert get_first_commit(pygit2.Repository(str(repo_path))).id == pygit2.Oid(
+            hex=oldest_root.hexsha
+        )
+        with RepoSession(repo_path) as session:
+            session.get_commits()
+            assert str(session.get_first_commit().id) == oldest_root.hexsha
+        with RepoSession(repo_path, budget=AnalysisBudget()) as session:
+            assert str(session.walk_history()[1].id) == oldest_root.hexsha
+
+
 def test_get_edited_files(repository_paths: dict[str, Any]):
     # Open the repo
     repo_path = repository_paths["3_file_repo"]
@@ -57,6 +161,39 @@ def test_get_edited_files(repository_paths: dict[str, Any]):
     assert len(edited_files) >= 0
 
 
+def test_get_diff_stats(
+    repository_paths: dict[str, pathlib.Path], repo_file_sets: dict[str, list[str]]
+) -> None:
+    """
+    Test that get_diff_stats agrees with get_edited_files and get_loc_changed.
+    """
+    for label, repo_path in repository_paths.items():
+        repo = pygit2.Repository(str(repo_path))
+        source_commit, target_commit = get_most_recent_commits(repo_path)
+
+        diff_stats = get_diff_stats(
+            repo,
+            repo.revparse_single(source_commit),
+            repo.revparse_single(target_commit),
+        )
+
+        # Check that the edited files match the files returned by get_edited_files
+        assert sorted(diff_stats) == sorted(
+            get_edited_files(
+                repo,
+                repo.revparse_single(source_commit),
+                repo.revparse_single(target_commit),
+            )
+        )
+        # Check that the line counts match the output from get_loc_changed
+        assert {
+            file_name: file_stats["additions"] + file_stats["deletions"]
+            for file_name, file_stats in diff_stats.items()
+        } == get_loc_changed(
+            repo_path, source_commit, target_commit, repo_file_sets[label]
+        )
+
+
 def test_get_loc_changed(
     repository_paths: dict[str, pathlib.Path], repo_file_sets: dict[str, list[str]]
 ) -> None:
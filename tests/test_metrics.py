@@ -0,0 +1,102 @@
+"""
+Testing metrics functionality
+"""
+
+import pathlib
+from typing import Any, Dict
+
+import pytest
+
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.metrics import DEFAULT_METRICS, Metric, MetricEngine, Traversal
+from almanack.processing.profiling import StageProfiler
+from almanack.processing.repo_session import RepoSession
+
+
+class LargestChangeMetric(Metric):
+    """
+    The file with the most lines changed and the number of commits walked.
+    """
+
+    name = "largest_change"
+    requires = ("entropy",)
+
+    def __init__(self) -> None:
+        self.commits = 0
+        self.largest = (0, None)
+
+    def on_commit(self, commit) -> None:
+        self.commits += 1
+
+    def on_delta(self, file_name: str, additions: int, deletions: int) -> None:
+        self.largest = max(self.largest, (additions + deletions, file_name))
+
+    def result(self, traversal: Traversal) -> Dict[str, Any]:
+        return {
+            "largest_change": self.largest[1],
+            "commits_seen": self.commits,
+            "largest_change_entropy": traversal.results["entropy"][
+                "file_level_entropy"
+            ][self.largest[1]],
+        }
+
+
+def test_metric_engine(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that extra metrics are fed from the same traversal without more git work.
+    """
+    repo_path = repository_paths["3_file_repo"]
+    default = compute_repo_data(str(repo_path), profile=True)
+    data = compute_repo_data(
+        str(repo_path),
+        profile=True,
+        metrics=[*DEFAULT_METRICS, "authors", LargestChangeMetric],
+    )
+
+    # The extra metrics add fields and leave the default ones unchanged
+    assert data["number_of_authors"] == 1
+    assert data["commits_seen"] == data["number_of_commits"]
+    assert data["largest_change"] in data["file_level_entropy"]
+    extra = {
+        "number_of_authors",
+        "largest_change",
+        "commits_seen",
+        "largest_change_entropy",
+        "timings",
+    }
+    assert {key: value for key, value in data.items() if key not in extra} == {
+        key: value for key, value in default.items() if key != "timings"
+    }
+    assert data["timings"]["counters"] == default["timings"]["counters"]
+
+    # Required metrics are enabled before the metrics which read them
+    assert [metric.name for metric in MetricEngine(["directory_entropy"]).metrics] == [
+        "entropy",
+        "directory_entropy",
+    ]
+    with RepoSession(repo_path, profiler=StageProfiler()) as session:
+        assert set(MetricEngine(["lines"]).run(session)) == {
+            "total_lines_added",
+            "total_lines_deleted",
+        }
+        assert session.profiler.summary()["counters"]["files_diffed"] == len(
+            default["file_level_entropy"]
+        )
+
+    with pytest.raises(ValueError):
+        MetricEngine(["missing"])
+
+
+def test_metric_engine_reuse(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that an engine gives the same results each time it runs.
+    """
+    largest_change = LargestChangeMetric()
+    engine = MetricEngine([*DEFAULT_METRICS, "authors", largest_change])
+    with RepoSession(repository_paths["3_file_repo"]) as session:
+        first = engine.run(session)
+        assert engine.run(session) == first
+
+    # Metric instances passed in are templates which runs do not change
+    assert (largest_change.commits, largest_change.largest) == (0, (0, None))
+    assert first["commits_seen"] == first["number_of_commits"]
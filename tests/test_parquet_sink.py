@@ -0,0 +1,166 @@
+"""
+Testing parquet_sink functionality
+"""
+
+import json
+import math
+import pathlib
+
+import pytest
+
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.corpus import (
+    MANIFEST_FILE,
+    CorpusOptions,
+    read_corpus_results,
+    run_corpus,
+)
+from almanack.processing.processing_repositories import process_corpus
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from almanack.processing.parquet_sink import (
+    STAGING_DIR,
+    ParquetResultWriter,
+    ParquetSink,
+    read_parquet_results,
+    result_schema,
+)
+
+# the rows of each row group written by the result writer
+ROW_GROUP_SIZE = 2
+
+
+def test_parquet_result_writer(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that repository data round-trips through row groups of a fixed schema.
+    """
+    results = [compute_repo_data(str(path)) for path in repository_paths.values()]
+    results.append({"repo_path": "missing", "error": "Repository not found"})
+    for result in results:
+        if "time_range_of_commits" in result:
+            result["time_range_of_commits"] = tuple(result["time_range_of_commits"])
+
+    path = tmp_path / "results.parquet"
+    with ParquetResultWriter(path, row_group_size=ROW_GROUP_SIZE) as writer:
+        writer.write_many(results)
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.schema_arrow == result_schema()
+    assert parquet_file.num_row_groups == math.ceil(len(results) / ROW_GROUP_SIZE)
+    assert list(read_parquet_results(path)) == results
+
+
+def test_parquet_sink_run_corpus(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that a corpus run appends its batches to part files of rows_per_file
+    repositories, and that repositories in a part file which is later lost
+    are analyzed again.
+    """
+    output_dir = tmp_path / "corpus"
+    repo_urls = [path.as_uri() for path in repository_paths.values()]
+
+    summary = run_corpus(
+        repo_urls,
+        output_dir,
+        CorpusOptions(flush_every=1),
+        sink=ParquetSink(output_dir),
+    )
+    assert summary == {"skipped": 0, "completed": len(repo_urls), "failed": 0}
+    # Every batch went into one part file, whose staged batches were removed
+    assert [path.name for path in output_dir.glob("results-*")] == [
+        "results-000001.parquet"
+    ]
+    assert pq.ParquetFile(output_dir / "results-000001.parquet").metadata.num_rows == (
+        len(repo_urls)
+    )
+    assert not any((output_dir / STAGING_DIR).iterdir())
+
+    summary = run_corpus(
+        repo_urls,
+        output_dir,
+        CorpusOptions(flush_every=1),
+        sink=ParquetSink(output_dir, rows_per_file=1),
+    )
+    assert summary == {"skipped": len(repo_urls), "completed": 0, "failed": 0}
+
+    # Truncate the part file, as if it was damaged after it was closed
+    result_file = output_dir / "results-000001.parquet"
+    result_file.write_bytes(result_file.read_bytes()[:-16])
+    summary = run_corpus(
+        repo_urls,
+        output_dir,
+        CorpusOptions(flush_every=1),
+        sink=ParquetSink(output_dir, 1, 1),
+    )
+    assert summary == {"skipped": 0, "completed": len(repo_urls), "failed": 0}
+    # With a row per file, each batch was written to its own part file
+    assert len(list(output_dir.glob("results-*"))) == len(repo_urls) + 1
+
+    results = list(read_corpus_results(output_dir, sink=ParquetSink(output_dir)))
+    assert sorted(result["repo_url"] for result in results) == sorted(repo_urls)
+    assert (output_dir / MANIFEST_FILE).exists()
+
+
+@pytest.mark.parametrize("rows_per_file", [1, 100])
+def test_parquet_sink_crash(
+    repository_paths: dict[str, pathlib.Path],
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    rows_per_file: int,
+) -> None:
+    """
+    Test resuming a corpus run which crashed before closing its sink.
+    """
+    output_dir = tmp_path / "corpus"
+    repo_urls = [path.as_uri() for path in repository_paths.values()]
+
+    # The sink is never closed, as when the process is killed
+    sink = ParquetSink(output_dir, rows_per_file=rows_per_file)
+    monkeypatch.setattr(sink, "close", lambda: None)
+    run_corpus(repo_urls, output_dir, CorpusOptions(flush_every=1), sink=sink)
+
+    # Every flushed batch was staged, so no work is repeated
+    summary = run_corpus(repo_urls, output_dir, sink=ParquetSink(output_dir))
+    assert summary == {"skipped": len(repo_urls), "completed": 0, "failed": 0}
+    results = list(read_corpus_results(output_dir, sink=ParquetSink(output_dir)))
+    assert sorted(result["repo_url"] for result in results) == sorted(repo_urls)
+
+    # The next batch written rewrites the open part file from its staged batches
+    with ParquetSink(output_dir) as new_sink:
+        new_sink.write_batch(
+            len(repo_urls) + 1, [{"repo_url": "extra", "error": "Not analyzed"}]
+        )
+    assert not any((output_dir / STAGING_DIR).iterdir())
+    for path in output_dir.glob("results-*"):
+        # Raises for files without a footer
+        pq.ParquetFile(path)
+    results = list(read_corpus_results(output_dir, sink=ParquetSink(output_dir)))
+    assert sorted(result["repo_url"] for result in results) == sorted(repo_urls)
+
+
+def test_process_corpus_parquet(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test writing the results of a corpus from a file of URLs as Parquet.
+    """
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text(
+        "\n".join(path.as_uri() for path in repository_paths.values()) + "\n"
+    )
+    output_dir = tmp_path / "corpus"
+    summary = json.loads(
+        process_corpus(str(url_file), str(output_dir), output_format="parquet")
+    )
+    assert summary == {"skipped": 0, "completed": len(repository_paths), "failed": 0}
+    assert [path.name for path in output_dir.glob("results-*")] == [
+        "results-000001.parquet"
+    ]
+
+    with pytest.raises(ValueError):
+        process_corpus(str(url_file), str(output_dir), output_format="csv")
@@ -0,0 +1,107 @@
+"""
+Testing pipeline functionality
+"""
+
+import contextlib
+import pathlib
+import threading
+import time
+from typing import Iterator
+
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.pipeline import (
+    CloneOptions,
+    RepoPipeline,
+    analyze_repositories,
+)
+
+# the local remotes cloned and the missing remote, run twice
+RUNS = 2
+
+
+class CountingWorkspace:
+    """
+    A workspace which hands out local repositories as clones, recording
+    the most clones held at once.
+    """
+
+    def __init__(self) -> None:
+        self.held = 0
+        self.most_held = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def clone(self, repo_url: str, bare: bool = True) -> Iterator[pathlib.Path]:
+        with self._lock:
+            self.held += 1
+            self.most_held = max(self.most_held, self.held)
+        try:
+            # Give the other clone threads time to run ahead
+            time.sleep(0.01)
+            yield pathlib.Path(repo_url)
+        finally:
+            with self._lock:
+                self.held -= 1
+
+
+def test_repo_pipeline(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test cloning and analyzing local remotes through the pipeline.
+    """
+    repo_urls = {path.as_uri(): path for path in repository_paths.values()}
+    missing_url = (tmp_path / "missing").as_uri()
+
+    with RepoPipeline(CloneOptions(workers=2), 2, queue_size=1) as pipeline:
+        results = list(pipeline.run([*repo_urls, missing_url] * RUNS))
+        stats = pipeline.stats()
+
+    assert len(results) == RUNS * (len(repo_urls) + 1)
+    for data in results:
+        if data["repo_url"] == missing_url:
+            assert data["error"].startswith("Clone failed")
+            continue
+        expected = compute_repo_data(str(repo_urls[data["repo_url"]]))
+        # Everything other than the temporary clone path matches
+        assert {
+            key: value
+            for key, value in data.items()
+            if key not in ("repo_path", "repo_url")
+        } == {key: value for key, value in expected.items() if key != "repo_path"}
+
+    assert stats["clone"]["completed"] == len(results)
+    assert stats["clone"]["failed"] == RUNS
+    assert stats["analysis"]["completed"] == len(results)
+    assert stats["analysis"]["failed"] == 0
+    assert stats["analysis"]["repos_per_second"] > 0
+
+
+def test_analyze_repositories(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test the pipeline with default settings.
+    """
+    repo_urls = [path.as_uri() for path in repository_paths.values()]
+    results = list(analyze_repositories(repo_urls, clone_workers=1))
+    assert sorted(data["repo_url"] for data in results) == sorted(repo_urls)
+    assert all("error" not in data for data in results)
+
+
+def test_repo_pipeline_backpressure(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that clones held on disk are bounded by the queue size
+    and the number of analysis workers.
+    """
+    workspace = CountingWorkspace()
+    repo_paths = [str(path) for path in repository_paths.values()] * 3
+    with RepoPipeline(
+        CloneOptions(workers=4, workspace=workspace), 1, queue_size=1
+    ) as pipeline:
+        results = list(pipeline.run(repo_paths))
+        stats = pipeline.stats()
+
+    assert len(results) == len(repo_paths)
+    assert all("error" not in data for data in results)
+    assert workspace.held == 0
+    assert workspace.most_held <= pipeline.queue_size + pipeline.pool.workers
+    assert stats["analysis"]["blocked_seconds"] >= 0
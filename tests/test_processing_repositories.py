@@ -5,8 +5,15 @@ Testing processing_repositories.py functionality
 import json
 import pathlib
 
+import git
+import pytest
+
+from almanack.processing.git_operations import clone_repository
 from almanack.processing.processing_repositories import process_repo_entropy
 
+# the files edited in the 3_file_repo fixture
+THREE_FILE_REPO_FILES = 3
+
 
 def test_process_repo_entropy(repository_paths: dict[str, pathlib.Path]) -> None:
     """
@@ -30,7 +37,55 @@ def test_process_repo_entropy(repository_paths: dict[str, pathlib.Path]) -> None
             "number_of_files",
             "time_range_of_commits",
             "file_level_entropy",
+            "total_lines_added",
+            "total_lines_deleted",
         ]
 
         # Check if all expected keys are present in the entropy_data
         assert all(key in entropy_data for key in expected_keys)
+
+
+def test_process_repo_entropy_bare(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Testing process_repo_entropy accepts bare repositories and rejects other directories.
+    """
+    bare_path = clone_repository(str(repository_paths["3_file_repo"]), bare=True)
+
+    entropy_data = json.loads(process_repo_entropy(str(bare_path)))
+    assert "error" not in entropy_data
+    assert entropy_data["number_of_files"] == THREE_FILE_REPO_FILES
+
+    with pytest.raises(FileNotFoundError):
+        process_repo_entropy(str(tmp_path))
+
+
+def test_process_repo_entropy_profile(
+    repository_paths: dict[str, pathlib.Path], capsys: pytest.CaptureFixture
+) -> None:
+    """
+    Testing process_repo_entropy reports stage timings when profiling.
+    """
+    entropy_data = json.loads(
+        process_repo_entropy(str(repository_paths["3_file_repo"]), profile=True)
+    )
+    assert "diff" in entropy_data["timings"]["stages"]
+    assert "Timings:" in capsys.readouterr().out
+
+
+def test_process_repo_entropy_error(
+    tmp_path: pathlib.Path, capsys: pytest.CaptureFixture
+) -> None:
+    """
+    Testing process_repo_entropy reports the error and timings of a failed analysis.
+    """
+    # A repository without commits has no HEAD to analyze
+    git.Repo.init(tmp_path / "empty_repo")
+    entropy_data = json.loads(
+        process_repo_entropy(str(tmp_path / "empty_repo"), profile=True)
+    )
+    assert "error" in entropy_data
+    report = capsys.readouterr().out
+    assert entropy_data["error"] in report
+    assert "Timings:" in report
@@ -0,0 +1,87 @@
+"""
+Testing repo_pool functionality
+"""
+
+import os
+import pathlib
+import time
+
+import pytest
+
+from almanack.processing.compute_data import compute_repo_data
+from almanack.processing.repo_pool import (
+    RepoPool,
+    WorkerOptions,
+    _current_rss,
+    compute_repos_data,
+)
+
+
+def _task(item: str) -> int:
+    """
+    A task which misbehaves depending on the item.
+    """
+    if item == "slow":
+        time.sleep(60)
+    elif item == "crash":
+        os._exit(1)
+    elif item == "memory":
+        # Hold 300 MB until the pool kills the worker
+        memory = bytearray(300 * 1024 * 1024)
+        time.sleep(60)
+        return len(memory)
+    elif item == "error":
+        raise ValueError("Bad item.")
+    return os.getpid()
+
+
+def test_compute_repos_data(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that batch results match computing each repository alone.
+    """
+    paths = list(repository_paths.values())
+    expected = {str(path): compute_repo_data(str(path)) for path in paths}
+
+    results = list(compute_repos_data(paths, workers=2))
+    assert len(results) == len(paths)
+    for result in results:
+        assert result == expected[result["repo_path"]]
+
+    # Missing repositories are reported without stopping the batch
+    results = list(
+        compute_repos_data([*paths, "does/not/exist"], workers=2, chunksize=2)
+    )
+    assert sum("error" in result for result in results) == 1
+
+
+def test_repo_pool_failures() -> None:
+    """
+    Test that timeouts, crashes, memory limits and errors fail only
+    their own item while the pool keeps working.
+    """
+    max_rss = (_current_rss(os.getpid()) or 0) + 150 * 1024 * 1024
+    with RepoPool(
+        workers=2,
+        function=_task,
+        worker_options=WorkerOptions(timeout=5, max_rss=max_rss),
+    ) as pool:
+        items = ["ok", "slow", "crash", "ok", "memory", "error", "ok"]
+        results = {
+            result.index: result for result in pool.imap_unordered(items, chunksize=2)
+        }
+        assert sorted(results) == list(range(len(items)))
+
+        assert "Timed out" in results[1].error
+        assert "exited unexpectedly" in results[2].error
+        assert "maximum RSS" in results[4].error
+        assert results[5].error == "ValueError: Bad item."
+        for index in (0, 3, 6):
+            assert results[index].error is None
+        assert (pool.timeouts, pool.crashes, pool.recycled) == (1, 1, 1)
+
+        # Workers stay warm across batches
+        pids = {result.value for result in pool.imap_unordered(["ok"] * 20)}
+        assert pids <= {worker.process.pid for worker in pool._workers}
+
+    with pytest.raises(ValueError):
+        RepoPool(workers=0)
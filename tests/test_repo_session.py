@@ -0,0 +1,58 @@
+"""
+Testing repo_session functionality
+"""
+
+import pathlib
+
+from almanack.processing.git_operations import (
+    get_commits,
+    get_diff_stats,
+    get_loc_changed,
+    get_most_recent_commits,
+)
+from almanack.processing.repo_session import RepoSession, open_session
+
+
+def test_repo_session_memoizes(repository_paths: dict[str, pathlib.Path]) -> None:
+    """
+    Test that RepoSession performs each piece of git work once.
+    """
+    repo_path = repository_paths["3_file_repo"]
+
+    with RepoSession(repo_path) as session:
+        # Commits are resolved and walked once
+        assert session.resolve("HEAD") is session.resolve("HEAD")
+        assert session.get_commits() is get_commits(session)
+
+        source_commit, target_commit = get_most_recent_commits(session)
+
+        # Diffs and diff statistics are cached by commit OID pair
+        assert session.get_diff(source_commit, target_commit) is session.get_diff(
+            session.resolve(source_commit), session.resolve(target_commit)
+        )
+        assert session.get_diff_stats(source_commit, target_commit) is get_diff_stats(
+            session,
+            session.resolve(source_commit),
+            session.resolve(target_commit),
+        )
+
+
+def test_repo_session_matches_path(
+    repository_paths: dict[str, pathlib.Path], repo_file_sets: dict[str, list[str]]
+) -> None:
+    """
+    Test that git operations return the same results for a session and a path.
+    """
+    for label, repo_path in repository_paths.items():
+        source_commit, target_commit = get_most_recent_commits(repo_path)
+        session = open_session(repo_path)
+
+        # open_session reuses existing sessions
+        assert open_session(session) is session
+
+        assert get_most_recent_commits(session) == (source_commit, target_commit)
+        assert get_loc_changed(
+            session, source_commit, target_commit, repo_file_sets[label]
+        ) == get_loc_changed(
+            repo_path, source_commit, target_commit, repo_file_sets[label]
+        )
@@ -0,0 +1,163 @@
+"""
+Testing workspace functionality
+"""
+
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from almanack.processing import workspace as workspace_module
+from almanack.processing.compute_data import process_repo_for_analysis
+from almanack.processing.workspace import (
+    OWNER_FILE,
+    RESERVATION_FILE,
+    WORKSPACE_DIR_ENV,
+    WORKSPACE_MAX_BYTES_ENV,
+    WORKSPACE_PREFIX,
+    Workspace,
+    get_default_workspace,
+    sweep_stale_workspaces,
+)
+
+
+def test_workspace_cleanup(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that clones and workspaces are removed on success and on error.
+    """
+    repo_url = str(repository_paths["3_file_repo"])
+
+    with Workspace(base_dir=tmp_path) as workspace:
+        with workspace.clone(repo_url) as repo_path:
+            assert repo_path.exists()
+        # The clone is removed once its context exits
+        assert not repo_path.exists()
+
+        with pytest.raises(ValueError):
+            with workspace.clone(repo_url) as repo_path:
+                raise ValueError("analysis failed")
+        # The clone is removed when analysis raises
+        assert not repo_path.exists()
+
+        workspace_path = workspace.path
+
+    # The workspace is removed on exit
+    assert not workspace_path.exists()
+
+
+def test_sweep_stale_workspaces(tmp_path: pathlib.Path) -> None:
+    """
+    Test that workspaces left behind by crashed processes are removed.
+    """
+    # Use the id of a process which has already exited
+    finished = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    stale_path = tmp_path / f"{WORKSPACE_PREFIX}stale"
+    stale_path.mkdir()
+    (stale_path / OWNER_FILE).write_text(finished.stdout.strip())
+
+    with Workspace(base_dir=tmp_path) as workspace:
+        # The stale workspace was removed while the current one remains
+        assert not stale_path.exists()
+        assert sweep_stale_workspaces(tmp_path) == []
+        assert workspace.path.exists()
+
+
+def test_workspace_disk_budget(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that new clones wait while the disk budget is exhausted.
+    """
+    repo_url = str(repository_paths["3_file_repo"])
+
+    with Workspace(base_dir=tmp_path, max_bytes=1, timeout=0.1) as workspace:
+        with workspace.clone(repo_url):
+            assert workspace.usage() > 1
+            # A second clone waits for space and times out
+            with pytest.raises(TimeoutError):
+                with workspace.clone(repo_url):
+                    pass
+
+        # Space was freed, so cloning proceeds
+        with workspace.clone(repo_url) as repo_path:
+            assert repo_path.exists()
+
+
+def test_workspace_reserves_clones_in_flight(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that clones which are still being written count against the budget.
+    """
+    repo_url = str(repository_paths["3_file_repo"])
+
+    with Workspace(base_dir=tmp_path, max_bytes=10**9, timeout=0.1) as workspace:
+        # A clone in flight reserves the whole budget by default
+        in_flight = workspace._reserve_clone_dir()
+        assert workspace.usage() == 10**9
+        with pytest.raises(TimeoutError):
+            with workspace.clone(repo_url):
+                pass
+
+        # Once measured, the clone counts its size and others proceed
+        (in_flight / RESERVATION_FILE).unlink()
+        with workspace.clone(repo_url) as repo_path:
+            assert not (repo_path.parent / RESERVATION_FILE).exists()
+            assert 0 < workspace.usage() < 10**9
+
+    with Workspace(
+        base_dir=tmp_path,
+        max_bytes=10**6,
+        reserve_bytes=4 * 10**5,
+        timeout=0.1,
+    ) as workspace:
+        # Reservations which fit the budget are admitted together
+        workspace._reserve_clone_dir()
+        workspace._reserve_clone_dir()
+        assert workspace.usage() == 8 * 10**5
+        workspace._reserve_clone_dir()
+        with pytest.raises(TimeoutError):
+            workspace._reserve_clone_dir()
+
+
+def test_default_workspace(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test that analyses in a process share one default workspace.
+    """
+    monkeypatch.setattr(workspace_module, "_default_workspace", None)
+    monkeypatch.setenv(WORKSPACE_DIR_ENV, str(tmp_path))
+    max_bytes = 1000
+    monkeypatch.setenv(WORKSPACE_MAX_BYTES_ENV, str(max_bytes))
+
+    workspace = get_default_workspace()
+    try:
+        assert get_default_workspace() is workspace
+        assert workspace.path.parent == tmp_path
+        assert workspace.max_bytes == max_bytes
+    finally:
+        workspace.close()
+
+
+def test_process_repo_for_analysis_with_workspace(
+    repository_paths: dict[str, pathlib.Path], tmp_path: pathlib.Path
+) -> None:
+    """
+    Test that process_repo_for_analysis leaves no clones behind.
+    """
+    with Workspace(base_dir=tmp_path) as workspace:
+        result = process_repo_for_analysis(
+            str(repository_paths["3_file_repo"]), workspace=workspace
+        )
+        assert result[0] is not None
+        assert not any(workspace.path.glob("clone-*"))